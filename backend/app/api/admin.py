@@ -2,47 +2,44 @@
 Admin API Endpoints
 """
 
-from fastapi import APIRouter, HTTPException
-from app.services.rag_pipeline import get_rag_pipeline
-from app.services.chroma_service import get_chroma_service
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.api.deps import get_chroma, get_compute, get_rag, get_slow_requests
+from app.services.container import get_container
+from app.utils.metrics import dashboard_summary
 from typing import List
-import uuid
 
 router = APIRouter()
 
-def get_chroma():
-    return get_chroma_service()
-
 @router.get("/dashboard")
-async def admin_dashboard():
+async def admin_dashboard(rag=Depends(get_rag)):
     """Get admin dashboard info"""
     try:
-        rag = get_rag_pipeline()
         stats = rag.get_stats()
         return {
             "overview": {
                 "total_documents": stats["chroma"]["total_documents"],
                 "active_sessions": stats["memory"]["active_sessions"]
             },
+            "latency": dashboard_summary(),
             "cost": "$0.00"
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/faqs/bulk")
-async def add_faqs(faqs: List[dict]):
+async def add_faqs(faqs: List[dict], chroma=Depends(get_chroma), compute=Depends(get_compute)):
     """Add FAQs to vector store"""
     try:
         texts = [f"Q: {f['question']}\nA: {f['answer']}" for f in faqs]
         metadatas = [{"source": "FAQ", "type": "faq"} for _ in faqs]
-        ids = [f"faq_{uuid.uuid4().hex[:8]}" for _ in faqs]
-        get_chroma().add_documents(texts, metadatas, ids)
-        return {"count": len(faqs)}
+        # Content-addressed: re-posting the same FAQ doesn't duplicate it
+        result = await compute.run(chroma.add_chunks, texts, metadatas)
+        return {"count": len(faqs), "added": result["added"], "unchanged": result["unchanged"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/seed-sample-data")
-async def seed_data():
+async def seed_data(chroma=Depends(get_chroma), compute=Depends(get_compute)):
     """Seed sample data"""
     try:
         sample = [
@@ -52,8 +49,23 @@ async def seed_data():
         ]
         texts = [i["text"] for i in sample]
         metadatas = [{"source": i["source"], "category": i["category"]} for i in sample]
-        ids = [f"sample_{i}_{uuid.uuid4().hex[:4]}" for i in range(len(sample))]
-        get_chroma().add_documents(texts, metadatas, ids)
-        return {"items_added": len(sample)}
+        result = await compute.run(chroma.add_chunks, texts, metadatas)
+        return {"items_added": len(sample), "added": result["added"], "unchanged": result["unchanged"]}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/memory")
+async def memory_report():
+    """Per-service memory cost (embedder, Chroma client, Gemini, sessions)"""
+    try:
+        return get_container().memory_report()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/slow-requests")
+async def slow_requests(
+    limit: int = Query(20, ge=1, le=500),
+    log=Depends(get_slow_requests)
+):
+    """Slowest recent /api/chat requests with stage timings and the Gemini fallback path"""
+    return {**log.get_stats(), "requests": log.slowest(limit)}
@@ -2,9 +2,17 @@
 Chat API Endpoints
 """
 
-from fastapi import APIRouter, HTTPException
-from app.models.schemas import ChatRequest, ChatResponse, HealthResponse
-from app.services.rag_pipeline import get_rag_pipeline
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.models.schemas import ChatRequest, ChatResponse, HealthResponse, SearchRequest, SearchResponse
+from app.api.deps import get_chroma, get_gemini, get_rag, get_slow_requests
+from app.config import settings
+from app.services.container import get_container
+from app.services.compute_executor import ExecutorSaturated
+from app.services.rate_scheduler import GeminiOverloaded
+from app.utils.metrics import REQUEST_SECONDS
+from app.utils.request_trace import traced
+import json
 import uuid
 import logging
 
@@ -12,26 +20,127 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    """Process user message through FREE RAG pipeline"""
+async def chat(
+    request: ChatRequest,
+    response: Response,
+    rag=Depends(get_rag),
+    slow_requests=Depends(get_slow_requests)
+):
+    """
+    Process user message through FREE RAG pipeline.
+    
+    The `Server-Timing` header breaks the request down into retrieve,
+    rerank, history and llm time plus the model that answered; slow
+    requests are kept for /api/admin/slow-requests.
+    """
+    session_id = request.session_id or str(uuid.uuid4())
+    status = "error"
     try:
-        rag = get_rag_pipeline()
-        session_id = request.session_id or str(uuid.uuid4())
-        
-        result = await rag.process_query(
-            query=request.message,
-            session_id=session_id
-        )
+        with traced("chat") as trace, REQUEST_SECONDS.time(endpoint="chat"):
+            try:
+                result = await rag.process_query(
+                    query=request.message,
+                    session_id=session_id,
+                    fetch_k=request.fetch_k,
+                    mmr_lambda=request.mmr_lambda,
+                    filters=request.filters.to_dict() if request.filters else None
+                )
+                status = "ok"
+            except (GeminiOverloaded, ExecutorSaturated):
+                status = "rejected"
+                raise
+            finally:
+                slow_requests.record(trace, request.message, session_id, status)
         
+        response.headers["Server-Timing"] = trace.server_timing()
         return ChatResponse(
             answer=result["answer"],
             sources=result["sources"],
-            session_id=result["session_id"]
+            session_id=result["session_id"],
+            context_tokens=result.get("context_tokens")
         )
+    except GeminiOverloaded as e:
+        logger.warning(f"Chat rejected: {str(e)} (retry after {e.retry_after}s)")
+        raise HTTPException(
+            status_code=429,
+            detail="The AI is busy right now. Please try again shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except ExecutorSaturated as e:
+        logger.warning(f"Chat rejected: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Chat error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, rag=Depends(get_rag)):
+    """
+    Stream the answer as Server-Sent Events.
+    
+    Events: `sources` (right after retrieval), `token` (answer text
+    chunks), then `done`; `error` replaces the rest if something fails.
+    """
+    session_id = request.session_id or str(uuid.uuid4())
+    
+    async def event_stream():
+        try:
+            with REQUEST_SECONDS.time(endpoint="stream"):
+                async for event in rag.stream_query(
+                    query=request.message, session_id=session_id,
+                    fetch_k=request.fetch_k, mmr_lambda=request.mmr_lambda,
+                    filters=request.filters.to_dict() if request.filters else None
+                ):
+                    yield _sse(event["event"], event["data"])
+        except GeminiOverloaded as e:
+            logger.warning(f"Stream rejected: {str(e)} (retry after {e.retry_after}s)")
+            yield _sse("error", {
+                "status": 429,
+                "detail": "The AI is busy right now. Please try again shortly.",
+                "retry_after": e.retry_after
+            })
+        except ExecutorSaturated as e:
+            yield _sse("error", {"status": 503, "detail": str(e), "retry_after": 1})
+        except Exception as e:
+            logger.error(f"Stream error: {str(e)}")
+            yield _sse("error", {"status": 500, "detail": str(e)})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # disable proxy buffering
+        }
+    )
+
+@router.post("/search", response_model=SearchResponse)
+async def search(request: SearchRequest, rag=Depends(get_rag)):
+    """Ranked chunks for a query, optionally scoped by category/source/type"""
+    try:
+        with REQUEST_SECONDS.time(endpoint="search"):
+            results = await rag.search(
+                query=request.query,
+                top_k=request.top_k,
+                filters=request.filters.to_dict() if request.filters else None
+            )
+        return SearchResponse(query=request.query, results=results)
+    except ExecutorSaturated as e:
+        logger.warning(f"Search rejected: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        logger.error(f"Search error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/search/facets")
+async def search_facets(chroma=Depends(get_chroma)):
+    """Filterable values (category/source/type) with their chunk counts"""
+    return chroma.metadata_index.facets()
+
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
@@ -40,40 +149,41 @@ async def health_check():
         services={
             "llm": "Google Gemini 1.5 Flash (FREE)",
             "vector_db": "ChromaDB (FREE)",
-            "memory": "In-Memory (FREE)"
+            "memory": "In-Memory (FREE)" if settings.SESSION_STORE == "memory" else "SQLite (FREE)"
         }
     )
 
+@router.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once the critical services are warm (or at once in lazy mode)"""
+    report = get_container().readiness()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
 @router.get("/stats")
-async def get_pipeline_stats():
+async def get_pipeline_stats(rag=Depends(get_rag)):
     """Get statistics about the RAG pipeline"""
     try:
-        rag = get_rag_pipeline()
         return rag.get_stats()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/session/{session_id}")
-async def clear_session(session_id: str):
+async def clear_session(session_id: str, rag=Depends(get_rag)):
     """Clear session memory"""
     try:
-        rag = get_rag_pipeline()
-        cleared = rag.clear_memory(session_id)
+        cleared = await rag.clear_memory(session_id)
         return {"message": "Session cleared" if cleared else "Session not found", "session_id": session_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/test-gemini")
-async def test_gemini():
+async def test_gemini(svc=Depends(get_gemini)):
     """Debug endpoint: test Gemini API directly"""
     import os
-    from app.services.gemini_service import GeminiService
     
     api_key = os.getenv("GOOGLE_API_KEY", "NOT_SET")
     key_preview = f"{api_key[:10]}...{api_key[-4:]}" if len(api_key) > 14 else "TOO_SHORT"
     
-    svc = GeminiService()
-    
     results = []
     for model_name, model in svc.models:
         try:
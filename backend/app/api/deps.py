@@ -0,0 +1,34 @@
+"""
+FastAPI Dependencies
+Resolve shared services from the process-wide ServiceContainer
+"""
+
+from app.services.container import get_container
+
+def get_chroma():
+    """Shared ChromaDB service (one embedder, one PersistentClient)"""
+    return get_container().chroma
+
+def get_compute():
+    """Shared bounded executor for embedding / vector search"""
+    return get_container().compute
+
+def get_gemini():
+    """Shared Gemini service"""
+    return get_container().gemini
+
+def get_memory():
+    """Shared session memory service"""
+    return get_container().memory
+
+def get_rag():
+    """Shared RAG pipeline wired to the services above"""
+    return get_container().rag
+
+def get_ingestion():
+    """Shared background ingestion job manager"""
+    return get_container().ingestion
+
+def get_slow_requests():
+    """Shared log of the slowest recent chat requests"""
+    return get_container().get("slow_requests")
@@ -2,79 +2,83 @@
 Document Management API Endpoints
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.services.chroma_service import get_chroma_service
-from app.utils.document_processor import DocumentProcessor
-from app.models.schemas import DocumentUploadResponse, DocumentStats
-import uuid
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from app.api.deps import get_chroma, get_ingestion
+from app.config import settings
+from app.models.schemas import IngestionJobResponse, DocumentStats
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-doc_processor = DocumentProcessor(chunk_size=1000, chunk_overlap=200)
 
-def get_chroma():
-    return get_chroma_service()
-
-@router.post("/upload", response_model=DocumentUploadResponse)
-async def upload_document(file: UploadFile = File(...)):
-    """Upload and process a PDF document"""
+@router.post("/upload", response_model=IngestionJobResponse, status_code=202)
+async def upload_document(file: UploadFile = File(...), ingestion=Depends(get_ingestion)):
+    """Queue a PDF for background processing; poll /jobs/{job_id} for progress"""
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     
     content = await file.read()
-    if len(content) > 10 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File too large (max 10MB)")
+    if len(content) > settings.MAX_UPLOAD_MB * 1024 * 1024:
+        raise HTTPException(status_code=400, detail=f"File too large (max {settings.MAX_UPLOAD_MB}MB)")
     
     try:
-        chunks = doc_processor.process_pdf(content, file.filename)
-        if not chunks:
-            raise HTTPException(status_code=400, detail="Could not extract text")
-        
-        texts = [c["text"] for c in chunks]
-        metadatas = [{"source": c["source"], "page": c.get("page", 0), "chunk_index": c.get("chunk_index", 0)} for c in chunks]
-        ids = [f"{file.filename}_c{i}_{uuid.uuid4().hex[:8]}" for i in range(len(chunks))]
-        
-        get_chroma().add_documents(texts, metadatas, ids)
-        pages = len(set(c.get("page", 0) for c in chunks))
-        
-        return DocumentUploadResponse(message="Success", filename=file.filename, pages=pages, chunks=len(chunks))
+        job = await ingestion.submit(content, file.filename)
+        return IngestionJobResponse(
+            job_id=job.id,
+            filename=job.filename,
+            status=job.status,
+            status_url=f"/api/documents/jobs/{job.id}"
+        )
     except Exception as e:
         logger.error(f"Upload error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/jobs")
+async def list_jobs(ingestion=Depends(get_ingestion)):
+    """Recent ingestion jobs, newest first"""
+    jobs = await ingestion.list_jobs()
+    return {"jobs": jobs, "count": len(jobs)}
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, ingestion=Depends(get_ingestion)):
+    """Per-stage progress and throughput of an ingestion job"""
+    job = await ingestion.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @router.get("/stats", response_model=DocumentStats)
-async def get_document_stats():
+async def get_document_stats(chroma=Depends(get_chroma)):
     """Get document stats"""
     try:
-        stats = get_chroma().get_stats()
+        stats = chroma.get_stats()
         return DocumentStats(**stats)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/sources")
-async def get_sources():
+async def get_sources(chroma=Depends(get_chroma)):
     """Get all sources"""
     try:
-        sources = get_chroma().get_all_sources()
-        return {"sources": sources, "count": len(sources)}
+        counts = chroma.get_source_counts()
+        return {"sources": list(counts), "count": len(counts), "chunks": counts}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/source/{source_name}")
-async def delete_source(source_name: str):
+async def delete_source(source_name: str, chroma=Depends(get_chroma)):
     """Delete document by source"""
     try:
-        count = get_chroma().delete_by_source(source_name)
+        count = chroma.delete_by_source(source_name)
         return {"message": f"Deleted {count} chunks", "source": source_name}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/clear")
-async def clear_all():
+async def clear_all(chroma=Depends(get_chroma)):
     """Clear all documents"""
     try:
-        get_chroma().delete_all()
+        chroma.delete_all()
         return {"message": "All documents deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
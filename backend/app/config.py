@@ -3,8 +3,10 @@ Configuration module for FREE E-commerce Chatbot
 All services used are 100% FREE with no credit card required
 """
 
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+import importlib.util
 import os
 
 class Settings(BaseSettings):
@@ -24,6 +26,99 @@ class Settings(BaseSettings):
     ENVIRONMENT: str = "development"
     ALLOWED_ORIGINS: str = "*"
     
+    # Bounded thread pool for embedding + vector search (off the event loop)
+    COMPUTE_WORKERS: int = 2
+    COMPUTE_QUEUE_DEPTH: int = 32
+    
+    # Micro-batching of concurrent query embeddings
+    EMBED_BATCH_MAX_SIZE: int = 32
+    EMBED_BATCH_WINDOW_MS: float = 3.0
+    
+    # LRU cache of query text -> embedding (bounded by size)
+    QUERY_EMBEDDING_CACHE_MB: int = 8
+    
+    # Semantic answer cache in front of Gemini
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_MAX_ENTRIES: int = 512
+    ANSWER_CACHE_TTL_SECONDS: int = 900
+    ANSWER_CACHE_SIMILARITY: float = 0.95
+    
+    # Share one in-flight Gemini call among identical concurrent requests
+    COALESCE_GENERATIONS: bool = True
+    
+    # Retrieved context is merged and packed into this many (estimated) tokens
+    CONTEXT_TOKEN_BUDGET: int = 1200
+    
+    # Over-fetch candidates and diversify them with maximal marginal relevance
+    MMR_ENABLED: bool = True
+    RETRIEVAL_FETCH_K: int = 30
+    MMR_LAMBDA: float = 0.7  # 1.0 = pure relevance, lower = more diverse
+    
+    # Hybrid retrieval: BM25 keyword hits fused with vector hits (RRF)
+    HYBRID_SEARCH_ENABLED: bool = True
+    HYBRID_RRF_K: int = 60
+    
+    # Optional CPU cross-encoder reranking of the over-fetched candidates
+    RERANK_ENABLED: bool = False
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_TOP_K: int = 3            # chunks sent to Gemini when reranking finishes
+    RERANK_BATCH_SIZE: int = 8
+    RERANK_BUDGET_MS: float = 300    # past this, fall back to the bi-encoder order
+    
+    # Gemini scheduling: reject with 429 when the queue wait would exceed this
+    GEMINI_MAX_QUEUE_WAIT_SECONDS: float = 20.0
+    GEMINI_BURST: int = 2
+    
+    # Background document ingestion
+    MAX_UPLOAD_MB: int = 50
+    INGEST_PROCESS_WORKERS: int = 1
+    INGEST_EMBED_BATCH_SIZE: int = 64
+    INGEST_PAGES_PER_TASK: int = 16
+    INGEST_JOB_DB_PATH: str = "./ingestion_jobs.db"  # job progress shared by all workers ("" = per process)
+    
+    # Persistent document-embedding store (empty string disables it)
+    EMBEDDING_STORE_PATH: str = "./embedding_store"
+    EMBEDDING_STORE_DTYPE: str = "float16"
+    
+    # Embedding backend: "sentence-transformers" (PyTorch fp32) or "onnx-int8"
+    EMBEDDING_BACKEND: str = "sentence-transformers"
+    EMBEDDING_ONNX_THREADS: int = 0  # 0 = let ONNX Runtime decide
+    
+    # Conversation history: "memory" (per process) or "sqlite" (shared by
+    # all uvicorn workers, survives restarts)
+    SESSION_STORE: str = "sqlite"
+    SESSION_DB_PATH: str = "./sessions.db"
+    SESSION_WRITE_BEHIND_MS: float = 50.0
+    SESSION_SYNC_INTERVAL_MS: float = 100.0  # how often other workers' writes are picked up
+    SESSION_TIMEOUT_MINUTES: int = 60
+    MAX_SESSIONS: int = 10000  # least recently used sessions are evicted beyond this
+    SESSION_SWEEP_INTERVAL_SECONDS: int = 30
+    SESSION_MAX_MESSAGE_CHARS: int = 1000  # longer messages keep only their head
+    SESSION_MAX_KB: int = 32               # per-session history budget
+    SESSION_MEMORY_MB: int = 64            # all cached sessions together
+    
+    # Slow-request log (/api/admin/slow-requests): the N slowest chat
+    # requests of the last SLOW_REQUEST_WINDOW_MINUTES
+    SLOW_REQUEST_LOG_SIZE: int = 50
+    SLOW_REQUEST_WINDOW_MINUTES: int = 60
+    
+    # Preload models in the background at startup (see /api/ready)
+    WARMUP_ON_STARTUP: bool = True
+    
+    @field_validator("EMBEDDING_BACKEND")
+    @classmethod
+    def check_embedding_backend(cls, value: str) -> str:
+        if value not in ("sentence-transformers", "onnx-int8"):
+            raise ValueError(f"Unknown EMBEDDING_BACKEND '{value}' (choose from: sentence-transformers, onnx-int8)")
+        if value == "onnx-int8":
+            missing = [m for m in ("onnxruntime", "tokenizers") if importlib.util.find_spec(m) is None]
+            if missing:
+                raise ValueError(
+                    f"EMBEDDING_BACKEND=onnx-int8 needs {' and '.join(missing)} "
+                    "(pip install -r requirements.txt)"
+                )
+        return value
+    
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -4,25 +4,68 @@ FREE E-commerce Chatbot API
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 from app.config import settings
 from app.api import chat, documents, admin
+from app.services.container import get_container
+from app.middleware import StreamingAwareGZipMiddleware
+from app.utils.metrics import METRICS
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Failed warmup components are retried with exponential backoff
+WARMUP_RETRY_SECONDS = 5
+WARMUP_RETRY_MAX_SECONDS = 300
+
+async def _warmup_services():
+    """Preload models off the event loop so startup stays non-blocking"""
+    delay = WARMUP_RETRY_SECONDS
+    while True:
+        ok = await asyncio.to_thread(get_container().warmup)
+        if ok:
+            logger.info("✅ Warmup complete — /api/ready is green")
+            return
+        logger.warning(f"⚠️ Warmup finished with failures — see /api/ready; retrying in {delay}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+
+async def _sweep_sessions():
+    """Expire idle sessions in the background instead of on every chat request"""
+    while True:
+        await asyncio.sleep(settings.SESSION_SWEEP_INTERVAL_SECONDS)
+        container = get_container()
+        if not container.is_loaded("memory"):
+            continue
+        try:
+            expired = await asyncio.to_thread(container.memory.sweep)
+            if expired:
+                logger.info(f"Expired {expired} idle sessions")
+        except Exception as e:
+            logger.warning(f"⚠️ Session sweep failed: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting FREE RAG API (Rapid Boot)...")
-    # Lazy loading will happen on the first request to avoid blocking startup
+    # The port opens immediately; heavy services load in the background
+    # and /api/ready reports when the hot path is warm
+    warmup_task = None
+    if settings.WARMUP_ON_STARTUP:
+        warmup_task = asyncio.create_task(_warmup_services())
+    sweeper_task = asyncio.create_task(_sweep_sessions())
     yield
+    sweeper_task.cancel()
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+    get_container().shutdown()
 
 app = FastAPI(title="FREE RAG API", lifespan=lifespan)
 
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+app.add_middleware(StreamingAwareGZipMiddleware, minimum_size=1000)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -39,3 +82,8 @@ app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 @app.api_route("/", methods=["GET", "HEAD"])
 async def root():
     return {"message": "FREE RAG API Ready", "cost": "$0.00"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape: per-stage latency histograms and Gemini counters"""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
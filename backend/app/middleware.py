@@ -0,0 +1,25 @@
+"""
+Custom Middleware
+"""
+
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.datastructures import Headers
+from starlette.types import Receive, Scope, Send
+
+class StreamingAwareGZipMiddleware(GZipMiddleware):
+    """
+    GZip everything except Server-Sent Event streams.
+
+    Starlette's gzip responder holds streamed body chunks in its
+    compression buffer, which would delay SSE tokens until the buffer
+    fills. Streams are recognised by path (`.../stream`) or by an
+    `Accept: text/event-stream` request header and passed through as-is.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            accept = Headers(scope=scope).get("accept", "")
+            if scope["path"].endswith("/stream") or "text/event-stream" in accept:
+                await self.app(scope, receive, send)
+                return
+        await super().__call__(scope, receive, send)
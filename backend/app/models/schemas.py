@@ -4,23 +4,38 @@ All FREE services - no paid APIs
 """
 
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 from datetime import datetime
 
 # ============================================
 # Chat Schemas
 # ============================================
 
+class SearchFilters(BaseModel):
+    """Metadata slice to retrieve from (one value or any of several per field)"""
+    category: Optional[Union[str, List[str]]] = None
+    source: Optional[Union[str, List[str]]] = None
+    type: Optional[Union[str, List[str]]] = None
+    
+    def to_dict(self) -> Optional[Dict[str, Union[str, List[str]]]]:
+        filters = self.model_dump(exclude_none=True)
+        return filters or None
+
 class ChatRequest(BaseModel):
     """Incoming chat message request"""
     message: str = Field(..., min_length=1, max_length=2000)
     session_id: Optional[str] = None
+    # Retrieval tuning (defaults come from settings)
+    fetch_k: Optional[int] = Field(None, ge=1, le=100)
+    mmr_lambda: Optional[float] = Field(None, ge=0.0, le=1.0)
+    filters: Optional[SearchFilters] = None
     
     class Config:
         json_schema_extra = {
             "example": {
                 "message": "Do you have wireless headphones?",
-                "session_id": "user-123-session"
+                "session_id": "user-123-session",
+                "filters": {"category": "electronics"}
             }
         }
 
@@ -35,21 +50,58 @@ class ChatResponse(BaseModel):
     answer: str
     sources: List[Source]
     session_id: str
+    context_tokens: Optional[int] = None
+
+# ============================================
+# Search Schemas
+# ============================================
+
+class SearchRequest(BaseModel):
+    """Retrieval-only query (no answer generation)"""
+    query: str = Field(..., min_length=1, max_length=2000)
+    top_k: int = Field(5, ge=1, le=50)
+    filters: Optional[SearchFilters] = None
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "query": "noise cancelling headphones under $100",
+                "top_k": 5,
+                "filters": {"category": ["electronics"]}
+            }
+        }
+
+class SearchResult(BaseModel):
+    """One retrieved chunk"""
+    id: str
+    text: str
+    source: str
+    page: Optional[int] = None
+    category: Optional[str] = None
+    type: Optional[str] = None
+    relevance: float
+    rerank_score: Optional[float] = None
+
+class SearchResponse(BaseModel):
+    """Ranked chunks for a search query"""
+    query: str
+    results: List[SearchResult]
 
 # ============================================
 # Document Schemas
 # ============================================
 
-class DocumentUploadResponse(BaseModel):
-    """Response after document upload"""
-    message: str
+class IngestionJobResponse(BaseModel):
+    """Returned by upload: the document is processed in the background"""
+    job_id: str
     filename: str
-    pages: int
-    chunks: int
+    status: str
+    status_url: str
 
 class DocumentStats(BaseModel):
     """Database statistics"""
     total_documents: int
+    total_sources: int = 0
     collection_name: str
     storage_type: str
 
@@ -1,35 +1,26 @@
 """
 Service Initialization
 Lazy loading of services to avoid startup delays
-"""
 
-from typing import Optional
+All services live in a single process-wide ServiceContainer so the
+embedding model, the Chroma client and the Gemini client are each
+created exactly once, no matter which router asks for them.
+"""
 
-# Service instances (singletons)
-_gemini_service: Optional["GeminiService"] = None
-_chroma_service: Optional["ChromaDBService"] = None
-_memory_service: Optional["MemoryService"] = None
+from app.services.container import ServiceContainer, get_container
 
 def get_gemini_service():
-    """Get or create Gemini service instance"""
-    global _gemini_service
-    if _gemini_service is None:
-        from app.services.gemini_service import GeminiService
-        _gemini_service = GeminiService()
-    return _gemini_service
+    """Get the shared Gemini service instance"""
+    return get_container().gemini
 
 def get_chroma_service():
-    """Get or create ChromaDB service instance"""
-    global _chroma_service
-    if _chroma_service is None:
-        from app.services.chroma_service import ChromaDBService
-        _chroma_service = ChromaDBService()
-    return _chroma_service
+    """Get the shared ChromaDB service instance"""
+    return get_container().chroma
 
 def get_memory_service():
-    """Get or create Memory service instance"""
-    global _memory_service
-    if _memory_service is None:
-        from app.services.memory_service import MemoryService
-        _memory_service = MemoryService()
-    return _memory_service
+    """Get the shared Memory service instance"""
+    return get_container().memory
+
+def get_rag_pipeline():
+    """Get the shared RAG pipeline instance"""
+    return get_container().rag
@@ -0,0 +1,159 @@
+"""
+Semantic Answer Cache - skip Gemini for questions we just answered
+
+Gemini's free tier (15 + 10 RPM) is the bottleneck, yet shoppers ask the
+same things over and over. An answer is reused when a new query
+retrieves exactly the same chunks AND its embedding is close enough to
+the cached query's embedding. Entries expire after a TTL, the cache is
+LRU-bounded, and everything is dropped as soon as the corpus version
+changes (any add/delete in ChromaDB).
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from app.services.query_embedding_cache import normalize_query
+
+class _Entry:
+    __slots__ = ("embedding", "norm", "answer", "created")
+
+    def __init__(self, embedding: List[float], answer: str):
+        self.embedding = embedding
+        self.norm = math.sqrt(sum(x * x for x in embedding)) or 1.0
+        self.answer = answer
+        self.created = time.monotonic()
+
+class AnswerCache:
+    """
+    LRU + TTL cache of generated answers keyed by
+    (retrieved chunk-id set, normalized query), matched semantically.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: float = 900,
+        similarity_threshold: float = 0.95
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        self._entries: "OrderedDict[Tuple[FrozenSet[str], str], _Entry]" = OrderedDict()
+        # chunk-id set -> cache keys sharing it (candidates for a semantic match)
+        self._by_chunks: Dict[FrozenSet[str], set] = {}
+        self._corpus_version: Optional[int] = None
+        self._lock = threading.Lock()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(
+        self,
+        query: str,
+        embedding: List[float],
+        chunk_ids: Sequence[str],
+        corpus_version: int
+    ) -> Optional[str]:
+        chunks = frozenset(chunk_ids)
+        with self._lock:
+            self._check_version(corpus_version)
+
+            exact_key = (chunks, normalize_query(query))
+            entry = self._entries.get(exact_key)
+            key = exact_key if entry is not None else None
+
+            if entry is None:
+                key, entry = self._best_semantic_match(chunks, embedding)
+
+            if entry is None or self._expired(entry):
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.answer
+
+    def put(
+        self,
+        query: str,
+        embedding: List[float],
+        chunk_ids: Sequence[str],
+        corpus_version: int,
+        answer: str
+    ) -> None:
+        chunks = frozenset(chunk_ids)
+        key = (chunks, normalize_query(query))
+        with self._lock:
+            self._check_version(corpus_version)
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = _Entry(embedding, answer)
+            self._by_chunks.setdefault(chunks, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_chunks.clear()
+
+    # ------------------------------------------------------------------
+
+    def _check_version(self, corpus_version: int) -> None:
+        """Drop everything when documents were added or removed"""
+        if self._corpus_version != corpus_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._by_chunks.clear()
+            self._corpus_version = corpus_version
+
+    def _expired(self, entry: _Entry) -> bool:
+        return time.monotonic() - entry.created > self.ttl_seconds
+
+    def _best_semantic_match(self, chunks: FrozenSet[str], embedding: List[float]):
+        keys = self._by_chunks.get(chunks)
+        if not keys:
+            return None, None
+
+        norm = math.sqrt(sum(x * x for x in embedding)) or 1.0
+        best_key, best_entry, best_sim = None, None, self.similarity_threshold
+        for key in keys:
+            entry = self._entries[key]
+            sim = sum(a * b for a, b in zip(embedding, entry.embedding)) / (norm * entry.norm)
+            if sim >= best_sim:
+                best_key, best_entry, best_sim = key, entry, sim
+        return best_key, best_entry
+
+    def _remove(self, key) -> None:
+        self._entries.pop(key, None)
+        siblings = self._by_chunks.get(key[0])
+        if siblings is not None:
+            siblings.discard(key)
+            if not siblings:
+                del self._by_chunks[key[0]]
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "similarity_threshold": self.similarity_threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "llm_calls_saved": self.hits,
+            "invalidations": self.invalidations
+        }
@@ -6,9 +6,30 @@ Stores vectors locally with persistence
 
 import chromadb
 from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional
+import hashlib
 import os
+import threading
+
+import numpy as np
+
+from app.config import settings as app_settings
+from app.services.query_embedding_cache import QueryEmbeddingCache
+from app.services.corpus_catalog import CorpusCatalog
+from app.services.embedding_store import EmbeddingStore
+from app.services.embedding_backends import create_embedding_backend
+from app.services.lexical_index import BM25Index
+from app.services.metadata_index import FilterSpec, MetadataIndex, normalize_filters, where_clause
+from app.utils.metrics import stage_timer
+from app.utils.ranking import mmr_select, reciprocal_rank_fusion, take_results
+
+def content_chunk_id(source: str, text: str) -> str:
+    """Deterministic chunk ID: the same text from the same source always maps to the same ID"""
+    digest = hashlib.sha256(f"{source}\x00{text}".encode("utf-8")).hexdigest()
+    return f"c_{digest[:32]}"
+
+# Stay under Chroma's per-call batch limit when deleting by ID
+DELETE_BATCH_SIZE = 5000
 
 class ChromaDBService:
     """
@@ -17,7 +38,7 @@ class ChromaDBService:
     Features:
     - Local persistent storage (no cloud costs)
     - Unlimited vectors (limited by disk space)
-    - Fast semantic search
+    - Fast semantic search, fused with BM25 keyword hits (hybrid search)
     """
     
     def __init__(self):
@@ -42,20 +63,99 @@ class ChromaDBService:
         )
         
         # Initialize FREE embedding model (runs locally)
-        print("📦 Loading embedding model (this may take a minute on first run)...")
-        self.embedder = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+        print(f"📦 Loading embedding model ({app_settings.EMBEDDING_BACKEND}, this may take a minute on first run)...")
+        self.embedder = create_embedding_backend(
+            app_settings.EMBEDDING_BACKEND, onnx_threads=app_settings.EMBEDDING_ONNX_THREADS
+        )
+        
+        # Repeated storefront queries skip the forward pass entirely
+        self.query_cache = QueryEmbeddingCache(
+            max_bytes=app_settings.QUERY_EMBEDDING_CACHE_MB * 1024 * 1024
+        )
+        
+        # Persistent text-hash -> vector store so re-ingestion skips the model
+        self.embedding_store = None
+        if app_settings.EMBEDDING_STORE_PATH:
+            self.embedding_store = EmbeddingStore(
+                app_settings.EMBEDDING_STORE_PATH,
+                model_name=self.embedder.store_key,
+                dimensions=self.embedder.dimensions,
+                dtype=app_settings.EMBEDDING_STORE_DTYPE
+            )
+        
+        # Per-source chunk IDs, counts and corpus version, maintained on
+        # every write so reads never scan or count the collection
+        self._write_lock = threading.Lock()
+        self.catalog = CorpusCatalog(chroma_path)
+        if not self.catalog.loaded_from_disk or self.catalog.total != self.collection.count():
+            self._rebuild_catalog()
+        
+        # Bitmaps per category/source/type value for filtered search
+        self.metadata_index = MetadataIndex()
+        self._rebuild_metadata_index()
+        
+        # Exact-token matches (SKUs, prices, model numbers) the embeddings miss
+        self.lexical = None
+        self.rrf_k = app_settings.HYBRID_RRF_K
+        if app_settings.HYBRID_SEARCH_ENABLED:
+            self.lexical = BM25Index(os.path.join(chroma_path, "bm25"))
+            if not self.lexical.loaded_from_disk or self.lexical.total != self.catalog.total:
+                self._rebuild_lexical()
         print("✅ ChromaDB initialized (100% FREE - Local storage)")
     
+    @property
+    def corpus_version(self) -> int:
+        """Bumped on every add/delete so caches keyed on retrieval results
+        (e.g. the answer cache) know when to invalidate"""
+        return self.catalog.version
+    
+    def _rebuild_catalog(self, page_size: int = 5000) -> None:
+        """One-off paged scan to seed the catalog from an existing collection"""
+        self.catalog.clear()
+        total = self.collection.count()
+        for offset in range(0, total, page_size):
+            page = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            by_source: Dict[str, List[str]] = {}
+            for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+                by_source.setdefault((metadata or {}).get("source", "Unknown"), []).append(chunk_id)
+            for source, chunk_ids in by_source.items():
+                self.catalog.add(source, chunk_ids)
+        self.catalog.compact()
+        print(f"✅ Corpus catalog rebuilt ({self.catalog.total} chunks)")
+    
+    def _rebuild_metadata_index(self, page_size: int = 5000) -> None:
+        """Paged metadata scan; the bitmaps live in memory only"""
+        self.metadata_index.clear()
+        total = self.collection.count()
+        for offset in range(0, total, page_size):
+            page = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            self.metadata_index.add(page["ids"], page["metadatas"])
+    
+    def _rebuild_lexical(self, page_size: int = 5000) -> None:
+        """Re-tokenize every stored chunk into a fresh BM25 segment"""
+        total = self.collection.count()
+        
+        def pages():
+            for offset in range(0, total, page_size):
+                page = self.collection.get(include=["documents"], limit=page_size, offset=offset)
+                yield [(chunk_id, text or "") for chunk_id, text in zip(page["ids"], page["documents"])]
+        
+        self.lexical.rebuild(pages())
+        print(f"✅ BM25 index rebuilt ({self.lexical.total} chunks)")
+    
+    def _recover_collection(self) -> None:
+        print("⚠️ Collection stale — recreating...")
+        self.collection = self.client.get_or_create_collection(
+            name="ecommerce_docs",
+            metadata={"description": "E-commerce product documents and FAQs"}
+        )
+    
     def _ensure_collection(self):
         """Ensure collection exists — auto-recover from stale references."""
         try:
             self.collection.count()
         except Exception:
-            print("⚠️ Collection stale — recreating...")
-            self.collection = self.client.get_or_create_collection(
-                name="ecommerce_docs",
-                metadata={"description": "E-commerce product documents and FAQs"}
-            )
+            self._recover_collection()
     
     def add_documents(
         self, 
@@ -72,7 +172,7 @@ class ChromaDBService:
         
         self._ensure_collection()
         # Generate embeddings locally (no API costs!)
-        embeddings = self.embedder.encode(texts).tolist()
+        embeddings = self._embed_documents(texts)
         
         # Upsert to handle duplicates
         self.collection.upsert(
@@ -81,43 +181,320 @@ class ChromaDBService:
             metadatas=metadatas,
             ids=ids
         )
+        self.metadata_index.add(ids, metadatas)
+        if self.lexical is not None:
+            self.lexical.add(zip(ids, texts))
+        
+        by_source: Dict[str, List[str]] = {}
+        for chunk_id, metadata in zip(ids, metadatas):
+            by_source.setdefault(metadata.get("source", "Unknown"), []).append(chunk_id)
+        new = sum(self.catalog.add(source, chunk_ids) for source, chunk_ids in by_source.items())
+        if not new:
+            self.catalog.bump_version()  # upsert replaced existing chunks
         
         print(f"✅ Added {len(texts)} documents to ChromaDB")
     
-    def search(self, query: str, top_k: int = 5) -> Dict:
+    def _embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Encode document texts, reusing vectors from the embedding store"""
+        if self.embedding_store is None:
+            return self.embedder.encode(texts).tolist()
+        
+        found, missing = self.embedding_store.lookup(texts)
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            encoded = self.embedder.encode(missing_texts)
+            self.embedding_store.add(missing_texts, encoded)
+            for position, vector in zip(missing, encoded):
+                found[position] = vector
+        return [found[i].tolist() for i in range(len(texts))]
+    
+    def add_chunks(self, texts: List[str], metadatas: List[Dict]) -> Dict:
+        """
+        Content-addressed add: only chunks whose (source, text) hash is new
+        are embedded and upserted. Known chunks just get their metadata
+        refreshed (e.g. a paragraph moved to another page).
+        
+        Returns counts plus the IDs of every chunk passed in, so callers
+        streaming a document in batches can prune stale chunks at the end.
+        """
+        new_texts, new_metadatas, new_ids = [], [], []
+        known_ids, known_metadatas = [], []
+        all_ids = []
+        seen = set()
+        
+        with self._write_lock:
+            for text, metadata in zip(texts, metadatas):
+                source = metadata.get("source", "Unknown")
+                chunk_id = content_chunk_id(source, text)
+                all_ids.append(chunk_id)
+                if chunk_id in seen:
+                    continue  # duplicate text within this batch
+                seen.add(chunk_id)
+                
+                if self.catalog.contains(source, chunk_id):
+                    known_ids.append(chunk_id)
+                    known_metadatas.append(metadata)
+                else:
+                    new_texts.append(text)
+                    new_metadatas.append(metadata)
+                    new_ids.append(chunk_id)
+            
+            if new_ids:
+                self.add_documents(new_texts, new_metadatas, new_ids)
+            if known_ids:
+                self._ensure_collection()
+                self.collection.update(ids=known_ids, metadatas=known_metadatas)
+                self.metadata_index.add(known_ids, known_metadatas)
+        
+        return {"added": len(new_ids), "unchanged": len(known_ids), "ids": all_ids}
+    
+    def prune_source(self, source: str, keep_ids: Iterable[str]) -> int:
+        """Delete chunks of `source` that are not in `keep_ids`; returns how many"""
+        with self._write_lock:
+            stale = list(self.catalog.ids(source) - set(keep_ids))
+            if not stale:
+                return 0
+            self._ensure_collection()
+            self._delete_ids(stale)
+            self.catalog.remove(source, stale)
+            print(f"✅ Removed {len(stale)} stale chunks from {source}")
+            return len(stale)
+    
+    def sync_source(self, source: str, texts: List[str], metadatas: List[Dict]) -> Dict:
+        """Make `source` contain exactly these chunks (incremental re-ingestion)"""
+        result = self.add_chunks(texts, metadatas)
+        removed = self.prune_source(source, result["ids"])
+        return {"added": result["added"], "unchanged": result["unchanged"], "removed": removed}
+    
+    def get_cached_embedding(self, query: str) -> Optional[List[float]]:
+        """Cached embedding for a (normalized) query, or None on a miss"""
+        return self.query_cache.get(query)
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed a batch of query texts in a single forward pass and cache them"""
+        embeddings = self.embedder.encode(queries).tolist()
+        for query, embedding in zip(queries, embeddings):
+            self.query_cache.put(query, embedding)
+        return embeddings
+    
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        query_embedding: Optional[List[float]] = None,
+        fetch_k: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
+        include_embeddings: bool = False,
+        filters: Optional[FilterSpec] = None
+    ) -> Dict:
         """
         Semantic search in ChromaDB
         Returns top-k most similar documents
+        
+        Pass `query_embedding` when the vector was already computed
+        (e.g. by the EmbeddingBatcher) to skip the local encode.
+        
+        With `fetch_k > top_k` and an `mmr_lambda`, the top `fetch_k`
+        candidates are fetched with their stored embeddings and `top_k`
+        of them are picked by maximal marginal relevance, so near-duplicate
+        chunks of one product page don't crowd out everything else.
+        
+        `include_embeddings` returns the stored vectors with plain top-k
+        results (the reranking pipeline runs MMR itself afterwards).
+        
+        With hybrid search on, the vector candidates are fused with the
+        best BM25 hits by reciprocal rank fusion before MMR/top-k, and each
+        hit carries a `lexical_scores` entry: the share of the query's
+        SKUs/prices it contains verbatim (0 when the query has none).
+        
+        `filters` (e.g. {"category": "electronics"} or {"source": [a, b]})
+        restrict every stage to a metadata slice. The slice is sized from
+        the bitmap index first: empty returns at once, one no larger than
+        the result count is scored exactly, anything bigger is pushed into
+        the Chroma query as a `where` clause.
         """
-        self._ensure_collection()
-        # Check if collection is empty
-        if self.collection.count() == 0:
+        filters = normalize_filters(filters)
+        
+        # Empty-collection check straight from the catalog, no count() round trips
+        total = self.catalog.total
+        if filters is not None and total:
+            total = min(total, self.metadata_index.count(filters))
+            if total == 0:
+                self.metadata_index.record("empty")
+        if total == 0:
             return {
+                "ids": [[]],
                 "documents": [[]],
                 "metadatas": [[]],
                 "distances": [[]]
             }
         
         # Embed query locally (FREE)
-        query_embedding = self.embedder.encode([query]).tolist()
+        if query_embedding is None:
+            query_embedding = self.get_cached_embedding(query)
+        if query_embedding is None:
+            query_embedding = self.embed_queries([query])[0]
         
-        # Search in ChromaDB
-        results = self.collection.query(
-            query_embeddings=query_embedding,
-            n_results=min(top_k, self.collection.count()),
-            include=["documents", "metadatas", "distances"]
-        )
+        use_mmr = mmr_lambda is not None and fetch_k is not None and fetch_k > top_k
+        with_embeddings = use_mmr or include_embeddings
+        n_results = min(fetch_k if use_mmr else top_k, total)
         
+        if filters is not None and total <= n_results:
+            # The whole slice is wanted anyway: score it exactly, skip the ANN graph
+            self.metadata_index.record("exact")
+            with stage_timer("vector_query"):
+                results = self._fetch_scored(self.metadata_index.ids(filters), query_embedding)
+            order = sorted(range(len(results["ids"][0])), key=results["distances"][0].__getitem__)
+            results = self._reorder(results, order, with_embeddings)
+        else:
+            include = ["documents", "metadatas", "distances"]
+            if with_embeddings:
+                include.append("embeddings")
+            
+            # Search in ChromaDB
+            query_kwargs = dict(
+                query_embeddings=[query_embedding],
+                n_results=n_results,
+                include=include
+            )
+            if filters is not None:
+                self.metadata_index.record("pushdown")
+                query_kwargs["where"] = where_clause(filters)
+            with stage_timer("vector_query"):
+                try:
+                    results = self.collection.query(**query_kwargs)
+                except Exception:
+                    # Stale collection handle: recover once, then let errors surface
+                    self._recover_collection()
+                    results = self.collection.query(**query_kwargs)
+        
+        if self.lexical is not None:
+            results = self._fuse_lexical(
+                results, query, query_embedding, n_results,
+                with_embeddings=with_embeddings, filters=filters
+            )
+        if use_mmr:
+            results = self._select_mmr(results, query_embedding, top_k, mmr_lambda)
         return results
     
+    def _fetch_scored(self, chunk_ids: List[str], query_embedding: List[float]) -> Dict:
+        """
+        Fetch chunks by ID (in whatever order Chroma returns them) with the
+        distance the vector query would have reported (squared L2)
+        """
+        fetched = self.collection.get(ids=chunk_ids, include=["documents", "metadatas", "embeddings"])
+        vectors = np.asarray(fetched["embeddings"], dtype=np.float32).reshape(len(fetched["ids"]), -1)
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        distances = ((vectors - query_vector) ** 2).sum(axis=1) if len(vectors) else np.zeros(0)
+        return {
+            "ids": [list(fetched["ids"])],
+            "documents": [list(fetched["documents"])],
+            "metadatas": [list(fetched["metadatas"])],
+            "distances": [distances.tolist()],
+            "embeddings": [list(vectors)]
+        }
+    
+    @staticmethod
+    def _reorder(results: Dict, order: List[int], with_embeddings: bool) -> Dict:
+        return {
+            key: [[values[0][i] for i in order]]
+            for key, values in results.items()
+            if key != "embeddings" or with_embeddings
+        }
+    
+    def _fuse_lexical(
+        self,
+        results: Dict,
+        query: str,
+        query_embedding: List[float],
+        n_results: int,
+        with_embeddings: bool,
+        filters: Optional[Dict] = None
+    ) -> Dict:
+        """Merge BM25 hits into vector results by RRF; keeps the best `n_results`"""
+        allowed = None
+        if filters is not None:
+            def allowed(chunk_id: str) -> bool:
+                return self.metadata_index.matches(chunk_id, filters)
+        with stage_timer("lexical_search"):
+            lexical_hits = self.lexical.search(query, n_results, allowed=allowed)
+        if not lexical_hits:
+            return results
+        
+        pool = {key: list(results[key][0]) for key in ("ids", "documents", "metadatas", "distances")}
+        embeddings = list(results["embeddings"][0]) if with_embeddings else None
+        vector_ids = list(pool["ids"])
+        lexical_ids = [chunk_id for chunk_id, _ in lexical_hits]
+        known = set(vector_ids)
+        missing = [chunk_id for chunk_id in lexical_ids if chunk_id not in known]
+        if missing:
+            # Keyword-only hits get a real distance so thresholds still apply
+            fetched = self._fetch_scored(missing, query_embedding)
+            for key in pool:
+                pool[key].extend(fetched[key][0])
+            if embeddings is not None:
+                embeddings.extend(fetched["embeddings"][0])
+        
+        # BM25 is relative to the query (the top hit always "wins"), so it
+        # only orders results; what may lift a chunk over the relevance
+        # threshold is an exact match on the query's SKUs / prices
+        coverage = self.lexical.identifier_coverage(query, pool["ids"])
+        pool["lexical_scores"] = [coverage[chunk_id] for chunk_id in pool["ids"]]
+        
+        position = {chunk_id: i for i, chunk_id in enumerate(pool["ids"])}
+        fused = [
+            (position[chunk_id], score)
+            for chunk_id, score in reciprocal_rank_fusion([vector_ids, lexical_ids], k=self.rrf_k)
+            if chunk_id in position  # deleted between the two lookups
+        ][:n_results]
+        
+        merged = {key: [[values[i] for i, _ in fused]] for key, values in pool.items()}
+        merged["fusion_scores"] = [[score for _, score in fused]]
+        if embeddings is not None:
+            merged["embeddings"] = [[embeddings[i] for i, _ in fused]]
+        return merged
+    
+    @staticmethod
+    def _select_mmr(results: Dict, query_embedding, top_k: int, mmr_lambda: float) -> Dict:
+        """Reduce an over-fetched result set to MMR-selected top_k (same result shape)"""
+        embeddings = results.get("embeddings")
+        if embeddings is None or len(embeddings[0]) == 0:
+            return results
+        
+        # After fusion, relevance is the RRF score (min-max scaled) rather than
+        # cosine alone, so keyword hits aren't buried by MMR
+        relevance = None
+        fusion_scores = results.get("fusion_scores")
+        if fusion_scores is not None:
+            scores = np.asarray(fusion_scores[0], dtype=np.float32)
+            spread = float(scores.max() - scores.min())
+            relevance = (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+        
+        picked = mmr_select(query_embedding, embeddings[0], top_k, mmr_lambda, relevance=relevance)
+        selected = take_results(results, picked)
+        selected["candidates"] = len(embeddings[0])
+        return selected
+    
+    def warmup(self) -> None:
+        """Run a dummy encode + query so the first real search is hot"""
+        self._ensure_collection()
+        query_embedding = self.embedder.encode(["warmup"]).tolist()
+        if self.catalog.total > 0:
+            self.collection.query(
+                query_embeddings=query_embedding,
+                n_results=1,
+                include=["documents"]
+            )
+    
     def delete_all(self) -> None:
         """Clear all documents without destroying the collection."""
         try:
             self._ensure_collection()
-            all_ids = self.collection.get()["ids"]
-            if all_ids:
-                self.collection.delete(ids=all_ids)
-            print(f"✅ Database cleared ({len(all_ids)} docs removed)")
+            removed = self.catalog.total
+            self._delete_ids(self.catalog.all_ids())
+            self.catalog.clear()
+            self.catalog.compact()
+            print(f"✅ Database cleared ({removed} docs removed)")
         except Exception as e:
             print(f"⚠️ Clear failed, recreating collection: {e}")
             try:
@@ -128,48 +505,68 @@ class ChromaDBService:
                 name="ecommerce_docs",
                 metadata={"description": "E-commerce product documents and FAQs"}
             )
+            self.catalog.clear()
+            self.catalog.compact()
+            self.metadata_index.clear()
+            if self.lexical is not None:
+                self.lexical.clear()
             print("✅ Collection recreated")
     
     def delete_by_source(self, source: str) -> int:
         """Delete all documents from a specific source"""
-        self._ensure_collection()
-        results = self.collection.get(
-            where={"source": source}
-        )
-        
-        if results["ids"]:
-            self.collection.delete(ids=results["ids"])
-            return len(results["ids"])
-        return 0
+        with self._write_lock:
+            chunk_ids = list(self.catalog.ids(source))
+            if not chunk_ids:
+                return 0
+            self._ensure_collection()
+            self._delete_ids(chunk_ids)
+            return self.catalog.drop(source)
+    
+    def _delete_ids(self, chunk_ids: List[str]) -> None:
+        for start in range(0, len(chunk_ids), DELETE_BATCH_SIZE):
+            self.collection.delete(ids=chunk_ids[start:start + DELETE_BATCH_SIZE])
+        self.metadata_index.remove(chunk_ids)
+        if self.lexical is not None:
+            self.lexical.remove(chunk_ids)
     
     def get_stats(self) -> Dict:
         """Get database statistics"""
-        self._ensure_collection()
-        count = self.collection.count()
         return {
-            "total_documents": count,
+            "total_documents": self.catalog.total,
+            "total_sources": len(self.catalog.sources()),
             "collection_name": "ecommerce_docs",
             "storage_type": "local_persistent",
             "embedding_model": "all-MiniLM-L6-v2",
-            "embedding_dimensions": 384,
+            "embedding_backend": self.embedder.name,
+            "embedding_dimensions": self.embedder.dimensions,
+            "corpus_version": self.corpus_version,
+            "query_embedding_cache": self.query_cache.get_stats(),
+            "embedding_store": self.embedding_store.get_stats() if self.embedding_store else None,
+            "lexical_index": self.lexical.get_stats() if self.lexical else None,
+            "metadata_index": self.metadata_index.get_stats(),
             "cost": "$0.00"
         }
     
+    def get_memory_footprint(self) -> Dict:
+        """Size of the loaded embedding model weights"""
+        try:
+            param_bytes = self.embedder.parameter_bytes()
+        except Exception:
+            param_bytes = 0
+        return {
+            "embedding_backend": self.embedder.name,
+            "embedder_weights_mb": round(param_bytes / (1024 * 1024), 2)
+        }
+    
     def get_all_sources(self) -> List[str]:
         """Get list of all unique document sources"""
-        self._ensure_collection()
-        results = self.collection.get(include=["metadatas"])
-        sources = set()
-        for metadata in results["metadatas"]:
-            if metadata and "source" in metadata:
-                sources.add(metadata["source"])
-        return list(sources)
-
-_chroma_service: Optional[ChromaDBService] = None
+        return self.catalog.sources()
+    
+    def get_source_counts(self) -> Dict[str, int]:
+        """Chunks indexed per source"""
+        return self.catalog.source_counts()
 
 def get_chroma_service() -> ChromaDBService:
-    """Get or create ChromaDB service singleton"""
-    global _chroma_service
-    if _chroma_service is None:
-        _chroma_service = ChromaDBService()
-    return _chroma_service
+    """Get the shared ChromaDB service from the service container"""
+    from app.services.container import get_container
+    return get_container().chroma
@@ -0,0 +1,64 @@
+"""
+Compute Executor - keeps CPU-bound work off the asyncio event loop
+Bounded thread pool for embedding and vector search
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict
+
+class ExecutorSaturated(Exception):
+    """Raised when the compute queue is full and the job is rejected"""
+
+class BoundedExecutor:
+    """Thread pool that rejects work (ExecutorSaturated) beyond max_workers + queue_depth"""
+
+    def __init__(self, max_workers: int = 2, queue_depth: int = 32, name: str = "compute"):
+        self.max_workers = max(1, max_workers)
+        self.queue_depth = max(0, queue_depth)
+        self.name = name
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix=name
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        # Stats
+        self.submitted = 0
+        self.rejected = 0
+        self.peak_pending = 0
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run `fn(*args, **kwargs)` on the pool and await its result"""
+        with self._lock:
+            if self._pending >= self.max_workers + self.queue_depth:
+                self.rejected += 1
+                raise ExecutorSaturated(
+                    f"{self.name} executor saturated ({self._pending} jobs pending)"
+                )
+            self._pending += 1
+            self.submitted += 1
+            self.peak_pending = max(self.peak_pending, self._pending)
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, partial(fn, *args, **kwargs))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> Dict:
+        return {
+            "workers": self.max_workers,
+            "queue_depth": self.queue_depth,
+            "pending": self._pending,
+            "peak_pending": self.peak_pending,
+            "submitted": self.submitted,
+            "rejected": self.rejected
+        }
@@ -0,0 +1,347 @@
+"""
+Service Container - one instance of every heavy service per process
+
+Before this existed, the RAG pipeline built its own ChromaDBService while
+the document/admin routers used a separate singleton, so production ran
+two MiniLM models and two PersistentClients side by side. Every consumer
+now resolves services through this container (directly or via FastAPI
+`Depends`), so the embedder, the Chroma client and the Gemini client are
+each loaded exactly once and share the same collection handle.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.utils.resources import get_rss_bytes, to_mb
+
+class ServiceContainer:
+    """
+    Lazily builds and caches the application services.
+
+    Each service is created on first access under a lock, and the RSS
+    growth plus wall time of its construction is recorded so
+    `memory_report()` can show what each component costs.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._instances: Dict[str, Any] = {}
+        self._load_info: Dict[str, Dict] = {}
+        self._readiness: Dict[str, Dict] = {}
+        self._warmup_started = False
+        self._factories: Dict[str, Callable[[], Any]] = {
+            "compute": self._build_compute,
+            "chroma": self._build_chroma,
+            "batcher": self._build_batcher,
+            "gemini": self._build_gemini,
+            "answer_cache": self._build_answer_cache,
+            "reranker": self._build_reranker,
+            "memory": self._build_memory,
+            "rag": self._build_rag,
+            "ingestion": self._build_ingestion,
+            "slow_requests": self._build_slow_requests,
+        }
+
+    # ------------------------------------------------------------------
+    # Factories (imports are deferred so app startup stays fast)
+    # ------------------------------------------------------------------
+
+    def _build_compute(self):
+        from app.config import settings
+        from app.services.compute_executor import BoundedExecutor
+        return BoundedExecutor(
+            max_workers=settings.COMPUTE_WORKERS,
+            queue_depth=settings.COMPUTE_QUEUE_DEPTH
+        )
+
+    def _build_chroma(self):
+        from app.services.chroma_service import ChromaDBService
+        return ChromaDBService()
+
+    def _build_batcher(self):
+        from app.config import settings
+        from app.services.embedding_batcher import EmbeddingBatcher
+        return EmbeddingBatcher(
+            encode_fn=self.chroma.embed_queries,
+            compute=self.compute,
+            max_batch_size=settings.EMBED_BATCH_MAX_SIZE,
+            window_ms=settings.EMBED_BATCH_WINDOW_MS
+        )
+
+    def _build_gemini(self):
+        from app.services.gemini_service import GeminiService
+        return GeminiService()
+
+    def _build_answer_cache(self):
+        from app.config import settings
+        from app.services.answer_cache import AnswerCache
+        return AnswerCache(
+            max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+            similarity_threshold=settings.ANSWER_CACHE_SIMILARITY
+        )
+
+    def _build_reranker(self):
+        from app.config import settings
+        from app.services.reranker import CrossEncoderReranker
+        return CrossEncoderReranker(
+            model_name=settings.RERANK_MODEL,
+            batch_size=settings.RERANK_BATCH_SIZE,
+            budget_ms=settings.RERANK_BUDGET_MS
+        )
+
+    def _build_memory(self):
+        from app.config import settings
+        from app.services.memory_service import MemoryService
+        from app.services.session_store import create_session_store
+        return MemoryService(
+            store=create_session_store(settings.SESSION_STORE, settings.SESSION_DB_PATH),
+            write_behind_ms=settings.SESSION_WRITE_BEHIND_MS,
+            sync_interval_ms=settings.SESSION_SYNC_INTERVAL_MS,
+            timeout_minutes=settings.SESSION_TIMEOUT_MINUTES,
+            max_sessions=settings.MAX_SESSIONS,
+            max_message_chars=settings.SESSION_MAX_MESSAGE_CHARS,
+            max_session_bytes=settings.SESSION_MAX_KB * 1024,
+            max_total_bytes=settings.SESSION_MEMORY_MB * 1024 * 1024
+        )
+
+    def _build_rag(self):
+        from app.config import settings
+        from app.services.rag_pipeline import FreeRAGPipeline
+        from app.services.single_flight import SingleFlight
+        from app.utils.context_packer import ContextPacker
+        return FreeRAGPipeline(
+            chroma=self.chroma,
+            gemini=self.gemini,
+            memory=self.memory,
+            compute=self.compute,
+            batcher=self.batcher,
+            answer_cache=self.get("answer_cache") if settings.ANSWER_CACHE_ENABLED else None,
+            generations=SingleFlight() if settings.COALESCE_GENERATIONS else None,
+            packer=ContextPacker(token_budget=settings.CONTEXT_TOKEN_BUDGET),
+            fetch_k=settings.RETRIEVAL_FETCH_K,
+            mmr_lambda=settings.MMR_LAMBDA if settings.MMR_ENABLED else None,
+            reranker=self.get("reranker") if settings.RERANK_ENABLED else None,
+            rerank_top_k=settings.RERANK_TOP_K,
+        )
+
+    def _build_ingestion(self):
+        from app.config import settings
+        from app.services.ingestion_jobs import IngestionJobManager
+        from app.utils.document_processor import DocumentProcessor
+        return IngestionJobManager(
+            chroma=self.chroma,
+            compute=self.compute,
+            process_workers=settings.INGEST_PROCESS_WORKERS,
+            embed_batch_size=settings.INGEST_EMBED_BATCH_SIZE,
+            processor=DocumentProcessor(
+                chunk_size=1000,
+                chunk_overlap=200,
+                pages_per_task=settings.INGEST_PAGES_PER_TASK
+            ),
+            state_path=settings.INGEST_JOB_DB_PATH or None
+        )
+
+    def _build_slow_requests(self):
+        from app.config import settings
+        from app.services.slow_request_log import SlowRequestLog
+        return SlowRequestLog(
+            capacity=settings.SLOW_REQUEST_LOG_SIZE,
+            window_minutes=settings.SLOW_REQUEST_WINDOW_MINUTES
+        )
+
+    # ------------------------------------------------------------------
+    # Resolution
+    # ------------------------------------------------------------------
+
+    def get(self, name: str) -> Any:
+        """Return the named service, creating it on first use"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            instance = self._instances.get(name)
+            if instance is not None:
+                return instance
+
+            factory = self._factories[name]
+            rss_before = get_rss_bytes()
+            started = time.perf_counter()
+            instance = factory()
+            self._load_info[name] = {
+                "load_seconds": round(time.perf_counter() - started, 3),
+                "rss_delta_bytes": max(0, get_rss_bytes() - rss_before),
+            }
+            self._instances[name] = instance
+            return instance
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def shutdown(self) -> None:
+        """Release pools owned by loaded services"""
+        for instance in list(self._instances.values()):
+            hook = getattr(instance, "shutdown", None)
+            if callable(hook):
+                hook()
+
+    @property
+    def compute(self):
+        return self.get("compute")
+
+    @property
+    def chroma(self):
+        return self.get("chroma")
+
+    @property
+    def batcher(self):
+        return self.get("batcher")
+
+    @property
+    def ingestion(self):
+        return self.get("ingestion")
+
+    @property
+    def gemini(self):
+        return self.get("gemini")
+
+    @property
+    def memory(self):
+        return self.get("memory")
+
+    @property
+    def rag(self):
+        return self.get("rag")
+
+    # ------------------------------------------------------------------
+    # Warmup / readiness
+    # ------------------------------------------------------------------
+
+    # Order matters: the pipeline depends on the three services before it
+    WARMUP_ORDER = ("chroma", "gemini", "memory", "rag")
+    # Retrieval, documents and sessions need these; a failed Gemini client
+    # (and the chat pipeline built on it) only degrades the instance
+    CRITICAL_COMPONENTS = ("chroma", "memory")
+
+    def warmup(self) -> bool:
+        """
+        Load every service and exercise the hot path once.
+
+        Blocking — call it from a worker thread. Each component's state
+        moves pending -> loading -> ready/failed and is reported by
+        `readiness()`. Components already ready are skipped, so calling it
+        again retries only the failed ones. Returns True when all
+        components are ready.
+        """
+        self._warmup_started = True
+        for name in self.WARMUP_ORDER:
+            self._readiness.setdefault(name, {"status": "pending"})
+
+        all_ready = True
+        for name in self.WARMUP_ORDER:
+            previous = self._readiness[name]
+            if previous["status"] == "ready":
+                continue
+            attempts = previous.get("attempts", 0) + 1
+            self._readiness[name] = {"status": "loading", "attempts": attempts}
+            started = time.perf_counter()
+            try:
+                service = self.get(name)
+                # Dummy encode/query so weights and the HNSW index are paged in
+                hook = getattr(service, "warmup", None)
+                if callable(hook):
+                    hook()
+                self._readiness[name] = {
+                    "status": "ready",
+                    "seconds": round(time.perf_counter() - started, 3),
+                    "attempts": attempts,
+                }
+            except Exception as e:
+                all_ready = False
+                self._readiness[name] = {
+                    "status": "failed",
+                    "seconds": round(time.perf_counter() - started, 3),
+                    "attempts": attempts,
+                    "error": str(e)[:200],
+                }
+        return all_ready
+
+    def readiness(self) -> Dict:
+        """
+        Per-component readiness with load timings.
+
+        Without a warmup (WARMUP_ON_STARTUP=false) services load on first
+        use, so the instance is ready at once and unloaded components are
+        reported as "lazy". With a warmup it is ready once every component
+        has been tried and the critical ones are up; failed non-critical
+        components are listed under "degraded" while they are retried.
+        """
+        components = {}
+        for name in self.WARMUP_ORDER:
+            state = self._readiness.get(name)
+            if state is None:
+                # Never warmed, but may have been lazily loaded by a request
+                state = {"status": "ready" if self.is_loaded(name) else "lazy"}
+            components[name] = dict(state)
+
+        if not self._warmup_started:
+            ready = True
+        else:
+            ready = all(
+                c["status"] == "ready" if name in self.CRITICAL_COMPONENTS
+                else c["status"] in ("ready", "failed")
+                for name, c in components.items()
+            )
+        return {
+            "ready": ready,
+            "degraded": [name for name, c in components.items() if c["status"] == "failed"],
+            "components": components,
+        }
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    def memory_report(self) -> Dict:
+        """
+        Memory cost per component.
+
+        `rss_delta_mb` is the RSS growth observed while the component was
+        constructed. Note the rag entry includes nested services only if
+        they were first loaded through it.
+        """
+        components = {}
+        for name in self._factories:
+            info = self._load_info.get(name)
+            if info is None:
+                components[name] = {"loaded": False}
+                continue
+
+            entry = {
+                "loaded": True,
+                "load_seconds": info["load_seconds"],
+                "rss_delta_mb": to_mb(info["rss_delta_bytes"]),
+            }
+            footprint = getattr(self._instances[name], "get_memory_footprint", None)
+            if callable(footprint):
+                entry.update(footprint())
+            components[name] = entry
+
+        return {
+            "process_rss_mb": to_mb(get_rss_bytes()),
+            "components": components,
+        }
+
+_container: Optional[ServiceContainer] = None
+_container_lock = threading.Lock()
+
+def get_container() -> ServiceContainer:
+    """Get or create the process-wide service container"""
+    global _container
+    if _container is None:
+        with _container_lock:
+            if _container is None:
+                _container = ServiceContainer()
+    return _container
@@ -0,0 +1,215 @@
+"""
+Corpus Catalog - incrementally maintained view of what is indexed
+
+Tracks, per source, the content-addressed chunk IDs it owns, plus the
+total chunk count and a monotonically increasing corpus version. It is
+updated on every add/delete, so source listings, stats and the
+empty-collection check in search() never have to scan or count the
+Chroma collection.
+
+Chunk IDs are hashes of (source, text), so the catalog is also what
+re-uploads are diffed against: new hashes get embedded, known ones are
+skipped, missing ones deleted.
+
+Persisted next to the Chroma store as a snapshot plus an append-only
+journal, so an update costs one small append however large the corpus:
+
+    corpus_catalog.json   snapshot: {"version": n, "sources": {name: [ids]}}
+    corpus_catalog.log    one JSON op per line, replayed over the snapshot
+
+The journal is folded into a fresh snapshot once it grows past
+COMPACT_AFTER entries (checked on load and after every update).
+"""
+
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Set
+
+class CorpusCatalog:
+    """Thread-safe source -> chunk IDs map with O(1) counts and a persisted version"""
+
+    SNAPSHOT = "corpus_catalog.json"
+    JOURNAL = "corpus_catalog.log"
+    COMPACT_AFTER = 2000
+
+    def __init__(self, directory: str):
+        self.snapshot_path = os.path.join(directory, self.SNAPSHOT)
+        self.journal_path = os.path.join(directory, self.JOURNAL)
+        self._sources: Dict[str, Set[str]] = {}
+        self._total = 0
+        self._version = 0
+        self._journal_entries = 0
+        self._lock = threading.Lock()
+        self.loaded_from_disk = self._load()
+        if self.loaded_from_disk:
+            self._maybe_compact()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _load(self) -> bool:
+        has_snapshot = os.path.exists(self.snapshot_path)
+        has_journal = os.path.exists(self.journal_path)
+        if not has_snapshot and not has_journal:
+            return False
+        try:
+            if has_snapshot:
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._sources = {source: set(ids) for source, ids in data.get("sources", {}).items()}
+                self._version = data.get("version", 0)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Corpus catalog unreadable, will rebuild: {e}")
+            self._sources = {}
+            return False
+
+        if has_journal:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._apply(json.loads(line))
+                    except ValueError:
+                        break  # torn final line from a crash mid-append
+                    self._journal_entries += 1
+        self._total = sum(len(ids) for ids in self._sources.values())
+        return True
+
+    def _apply(self, entry: Dict) -> None:
+        op = entry["op"]
+        if op == "add":
+            self._sources.setdefault(entry["source"], set()).update(entry["ids"])
+        elif op == "remove":
+            ids = self._sources.get(entry["source"])
+            if ids is not None:
+                ids.difference_update(entry["ids"])
+                if not ids:
+                    del self._sources[entry["source"]]
+        elif op == "drop":
+            self._sources.pop(entry["source"], None)
+        elif op == "clear":
+            self._sources.clear()
+        if "version" in entry:
+            self._version = entry["version"]
+
+    def _journal(self, entry: Dict) -> None:
+        """Append one op (caller holds the lock)"""
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        self._journal_entries += 1
+
+    def compact(self) -> None:
+        """Write a fresh snapshot and truncate the journal"""
+        with self._lock:
+            data = {
+                "version": self._version,
+                "sources": {source: sorted(ids) for source, ids in self._sources.items()}
+            }
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.snapshot_path)
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._journal_entries = 0
+
+    def _maybe_compact(self) -> None:
+        if self._journal_entries >= self.COMPACT_AFTER:
+            self.compact()
+
+    # ------------------------------------------------------------------
+    # Updates (each bumps the corpus version when it changes anything)
+    # ------------------------------------------------------------------
+
+    def add(self, source: str, chunk_ids: Iterable[str]) -> int:
+        """Record chunks for `source`; returns how many were new"""
+        with self._lock:
+            ids = self._sources.setdefault(source, set())
+            new = [chunk_id for chunk_id in set(chunk_ids) if chunk_id not in ids]
+            if not new:
+                if not ids:
+                    del self._sources[source]
+                return 0
+            ids.update(new)
+            self._total += len(new)
+            self._version += 1
+            self._journal({"op": "add", "source": source, "ids": new, "version": self._version})
+        self._maybe_compact()
+        return len(new)
+
+    def remove(self, source: str, chunk_ids: Iterable[str]) -> int:
+        """Forget chunks of `source`; returns how many were known"""
+        with self._lock:
+            ids = self._sources.get(source)
+            if ids is None:
+                return 0
+            gone = [chunk_id for chunk_id in set(chunk_ids) if chunk_id in ids]
+            if not gone:
+                return 0
+            ids.difference_update(gone)
+            if not ids:
+                del self._sources[source]
+            self._total -= len(gone)
+            self._version += 1
+            self._journal({"op": "remove", "source": source, "ids": gone, "version": self._version})
+        self._maybe_compact()
+        return len(gone)
+
+    def drop(self, source: str) -> int:
+        """Forget a whole source; returns how many chunks it had"""
+        with self._lock:
+            ids = self._sources.pop(source, None)
+            if ids is None:
+                return 0
+            self._total -= len(ids)
+            self._version += 1
+            self._journal({"op": "drop", "source": source, "version": self._version})
+        self._maybe_compact()
+        return len(ids)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sources.clear()
+            self._total = 0
+            self._version += 1
+            self._journal({"op": "clear", "version": self._version})
+
+    def bump_version(self) -> int:
+        """Mark the corpus changed without touching membership (e.g. an upsert of known IDs)"""
+        with self._lock:
+            self._version += 1
+            self._journal({"op": "version", "version": self._version})
+            return self._version
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def total(self) -> int:
+        return self._total
+
+    def ids(self, source: str) -> Set[str]:
+        with self._lock:
+            return set(self._sources.get(source, ()))
+
+    def contains(self, source: str, chunk_id: str) -> bool:
+        with self._lock:
+            return chunk_id in self._sources.get(source, ())
+
+    def sources(self) -> List[str]:
+        with self._lock:
+            return list(self._sources)
+
+    def source_counts(self) -> Dict[str, int]:
+        with self._lock:
+            return {source: len(ids) for source, ids in self._sources.items()}
+
+    def all_ids(self) -> List[str]:
+        with self._lock:
+            return [chunk_id for ids in self._sources.values() for chunk_id in ids]
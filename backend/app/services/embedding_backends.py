@@ -0,0 +1,152 @@
+"""
+Embedding Backends - pluggable sentence encoders for ChromaDBService
+
+- sentence-transformers: all-MiniLM-L6-v2 in PyTorch fp32 (the original)
+- onnx-int8:             the same model exported to ONNX with int8 dynamic
+                         quantization, run by ONNX Runtime. No torch in the
+                         hot path, a ~4x smaller weight file and faster CPU
+                         inference, at a small cost in vector fidelity
+                         (check it with benchmark_embeddings.py)
+
+Both return L2-normalized float32 vectors of the same dimension, so the
+Chroma collection and caches work unchanged. Vectors from the two
+backends are close but NOT identical: the embedding store keys them by
+backend, and switching backends on an existing collection should be
+followed by a re-ingest.
+"""
+
+from abc import ABC, abstractmethod
+from typing import List
+
+import numpy as np
+
+MINILM_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+
+def store_key_for(backend_name: str, model_name: str = MINILM_MODEL) -> str:
+    """Embedding-store key for a backend, without loading the model"""
+    if backend_name == "sentence-transformers":
+        # Keeps the directory used before backends were pluggable
+        return model_name
+    return f"{model_name}@{backend_name}"
+
+class EmbeddingBackend(ABC):
+    """Common interface: `encode(texts) -> (n, dimensions) float32, L2-normalized`"""
+
+    name: str = ""
+    model_name: str = MINILM_MODEL
+    dimensions: int = 384
+
+    @abstractmethod
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        ...
+
+    def parameter_bytes(self) -> int:
+        """Size of the loaded weights, for the memory report"""
+        return 0
+
+    @property
+    def store_key(self) -> str:
+        """Identifies vectors from this backend in the embedding store"""
+        return store_key_for(self.name, self.model_name)
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str = MINILM_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.dimensions = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        return self.model.encode(
+            texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32, copy=False)
+
+    def parameter_bytes(self) -> int:
+        return sum(p.numel() * p.element_size() for p in self.model.parameters())
+
+class OnnxInt8Backend(EmbeddingBackend):
+    """
+    int8-quantized MiniLM on ONNX Runtime.
+
+    Weights and tokenizer come from a Hugging Face repo that ships the
+    quantized export (default: Xenova/all-MiniLM-L6-v2). Pooling matches
+    sentence-transformers: attention-masked mean, then L2 normalization.
+    """
+
+    name = "onnx-int8"
+
+    def __init__(
+        self,
+        repo_id: str = "Xenova/all-MiniLM-L6-v2",
+        model_file: str = "onnx/model_quantized.onnx",
+        max_length: int = 256,
+        threads: int = 0
+    ):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+            from huggingface_hub import hf_hub_download
+        except ImportError as e:
+            raise RuntimeError(
+                "EMBEDDING_BACKEND=onnx-int8 needs onnxruntime, tokenizers and huggingface_hub"
+            ) from e
+
+        self.model_path = hf_hub_download(repo_id, model_file)
+        self.tokenizer = Tokenizer.from_file(hf_hub_download(repo_id, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            self.model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self.dimensions = self.session.get_outputs()[0].shape[-1] or 384
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            attention = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention}
+            if "token_type_ids" in self._input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+            token_states = self.session.run(None, feeds)[0]  # (batch, seq, dim)
+            mask = attention[:, :, None].astype(np.float32)
+            pooled = (token_states * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            outputs.append(pooled / np.clip(norms, 1e-12, None))
+
+        return np.vstack(outputs).astype(np.float32, copy=False)
+
+    def parameter_bytes(self) -> int:
+        import os
+        return os.path.getsize(self.model_path)
+
+BACKENDS = {
+    SentenceTransformerBackend.name: SentenceTransformerBackend,
+    OnnxInt8Backend.name: OnnxInt8Backend,
+}
+
+def create_embedding_backend(name: str, onnx_threads: int = 0) -> EmbeddingBackend:
+    """Instantiate the backend selected by Settings.EMBEDDING_BACKEND"""
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown EMBEDDING_BACKEND '{name}' (choose from: {', '.join(BACKENDS)})"
+        )
+    if backend_cls is OnnxInt8Backend:
+        return OnnxInt8Backend(threads=onnx_threads)
+    return backend_cls()
@@ -0,0 +1,119 @@
+"""
+Embedding Batcher - micro-batches concurrent query embeddings
+
+Every chat request used to call `embedder.encode([query])` with a batch
+of one. MiniLM on CPU is far cheaper per item at larger batch sizes, so
+this collects query texts that arrive within a short window (or until
+the batch is full), encodes them in one call on the compute executor,
+and hands each caller back its own vector.
+"""
+
+import asyncio
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from app.services.compute_executor import BoundedExecutor
+
+class EmbeddingBatcher:
+    """
+    Async micro-batching front for a batch `encode_fn(texts) -> vectors`.
+
+    - `max_batch_size`: flush as soon as this many texts are queued
+    - `window_ms`: otherwise flush this long after the first text arrived
+      (0 disables waiting; each call is encoded on its own)
+
+    Must be used from a single event loop.
+    """
+
+    # Upper bounds of the batch-size histogram buckets
+    SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], List[List[float]]],
+        compute: BoundedExecutor,
+        max_batch_size: int = 32,
+        window_ms: float = 3.0
+    ):
+        self.encode_fn = encode_fn
+        self.compute = compute
+        self.max_batch_size = max(1, max_batch_size)
+        self.window_ms = max(0.0, window_ms)
+
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.Handle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+        # Stats
+        self.batches = 0
+        self.items = 0
+        self.full_batches = 0
+        self.size_histogram: Dict[str, int] = {f"<={b}": 0 for b in self.SIZE_BUCKETS}
+        self.size_histogram[f">{self.SIZE_BUCKETS[-1]}"] = 0
+
+    async def embed(self, text: str) -> List[float]:
+        """Queue `text` for the next batch and await its vector"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size or self.window_ms == 0:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_ms / 1000, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch = self._pending[:self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size:]
+        if self._pending:
+            # Overflow beyond one batch goes out on the next tick
+            self._timer = asyncio.get_running_loop().call_soon(self._flush)
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        self._record(len(batch))
+        try:
+            vectors = await self.compute.run(self.encode_fn, [text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def _record(self, size: int) -> None:
+        self.batches += 1
+        self.items += size
+        if size >= self.max_batch_size:
+            self.full_batches += 1
+        for bound in self.SIZE_BUCKETS:
+            if size <= bound:
+                self.size_histogram[f"<={bound}"] += 1
+                break
+        else:
+            self.size_histogram[f">{self.SIZE_BUCKETS[-1]}"] += 1
+
+    def get_stats(self) -> Dict:
+        avg_size = self.items / self.batches if self.batches else 0.0
+        return {
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.window_ms,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(avg_size, 2),
+            "fill_rate": round(avg_size / self.max_batch_size, 3),
+            "full_batches": self.full_batches,
+            "queued": len(self._pending),
+            "batch_size_histogram": self.size_histogram
+        }
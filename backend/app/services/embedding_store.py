@@ -0,0 +1,156 @@
+"""
+Embedding Store - persistent, content-addressed document embeddings
+
+Every rebuild, reseed or re-upload used to run the model again over text
+that had already been embedded. This store keeps one vector per
+(model, text hash) on disk:
+
+    {EMBEDDING_STORE_PATH}/{model}/
+        meta.json     model name, dimensions, dtype
+        keys.bin      16-byte blake2b digests, one per row
+        vectors.bin   float16/float32 rows, memory-mapped for reads
+
+Files are append-only, so the directory can be built once (see
+build_embedding_store.py) and shipped as a build artifact; a cold rebuild
+of the catalog then only reads vectors instead of running MiniLM.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+class EmbeddingStore:
+    """Append-only memory-mapped vector store keyed by text hash"""
+
+    KEY_SIZE = 16
+
+    def __init__(self, root: str, model_name: str, dimensions: int, dtype: str = "float16"):
+        self.model_name = model_name
+        self.dimensions = dimensions
+        self.dtype = np.dtype(dtype)
+        self.directory = os.path.join(root, re.sub(r"[^\w.-]+", "_", model_name))
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._keys_path = os.path.join(self.directory, "keys.bin")
+        self._vectors_path = os.path.join(self.directory, "vectors.bin")
+        self._lock = threading.Lock()
+        self._index: Dict[bytes, int] = {}
+        self._mmap: Optional[np.memmap] = None
+        self._rows = 0
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+
+        self._check_meta()
+        self._load()
+
+    def _check_meta(self) -> None:
+        meta_path = os.path.join(self.directory, "meta.json")
+        meta = {"model": self.model_name, "dimensions": self.dimensions, "dtype": self.dtype.name}
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                existing = json.load(f)
+            if existing != meta:
+                # Different dims/dtype: the stored rows can't be reused
+                print(f"⚠️ Embedding store layout changed ({existing} -> {meta}), starting fresh")
+                for path in (self._keys_path, self._vectors_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    def _load(self) -> None:
+        row_bytes = self.dimensions * self.dtype.itemsize
+        keys = b""
+        if os.path.exists(self._keys_path):
+            with open(self._keys_path, "rb") as f:
+                keys = f.read()
+        vector_rows = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+
+        # A crash between the two appends leaves one file longer (or a torn
+        # row); trust the shorter and cut both back so the next append
+        # lands on row `_rows` in each file
+        self._rows = min(len(keys) // self.KEY_SIZE, vector_rows)
+        self._truncate(self._keys_path, self._rows * self.KEY_SIZE)
+        self._truncate(self._vectors_path, self._rows * row_bytes)
+        self._index = {
+            keys[i * self.KEY_SIZE:(i + 1) * self.KEY_SIZE]: i for i in range(self._rows)
+        }
+        if self._rows:
+            print(f"✅ Embedding store loaded: {self._rows} vectors ({self.model_name})")
+
+    @staticmethod
+    def _truncate(path: str, size: int) -> None:
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            print(f"⚠️ Embedding store: dropping torn tail of {os.path.basename(path)}")
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+    def _vectors(self) -> np.ndarray:
+        if self._mmap is None or self._mmap.shape[0] < self._rows:
+            self._mmap = np.memmap(
+                self._vectors_path, dtype=self.dtype, mode="r",
+                shape=(self._rows, self.dimensions)
+            )
+        return self._mmap
+
+    def lookup(self, texts: List[str]) -> Tuple[Dict[int, np.ndarray], List[int]]:
+        """Return ({position: vector} for stored texts, [positions of misses])"""
+        found: Dict[int, np.ndarray] = {}
+        missing: List[int] = []
+        with self._lock:
+            rows = [self._index.get(text_key(t)) for t in texts]
+            vectors = self._vectors() if any(r is not None for r in rows) else None
+            for position, row in enumerate(rows):
+                if row is None:
+                    missing.append(position)
+                else:
+                    found[position] = np.asarray(vectors[row], dtype=np.float32)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def add(self, texts: List[str], vectors: np.ndarray) -> None:
+        """Append vectors for texts not already stored"""
+        vectors = np.asarray(vectors, dtype=self.dtype).reshape(-1, self.dimensions)
+        with self._lock:
+            new_keys, new_rows = [], []
+            for text, vector in zip(texts, vectors):
+                key = text_key(text)
+                if key in self._index:
+                    continue
+                self._index[key] = self._rows + len(new_keys)
+                new_keys.append(key)
+                new_rows.append(vector)
+            if not new_keys:
+                return
+
+            # Vectors first: a key is only trusted once its row is on disk
+            with open(self._vectors_path, "ab") as f:
+                f.write(np.stack(new_rows).tobytes())
+            with open(self._keys_path, "ab") as f:
+                f.write(b"".join(new_keys))
+            self._rows += len(new_keys)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            hits, misses, rows = self.hits, self.misses, self._rows
+        lookups = hits + misses
+        return {
+            "model": self.model_name,
+            "vectors": rows,
+            "dtype": self.dtype.name,
+            "disk_mb": round(rows * (self.dimensions * self.dtype.itemsize + self.KEY_SIZE) / (1024 * 1024), 2),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0
+        }
@@ -1,14 +1,34 @@
 """
 Google Gemini Service - 100% FREE
-Dual-model fallback: tries 1.5-flash first, falls back to 2.0-flash
-Each model has its own separate rate limit quota.
+Dual-model fallback: a token-bucket scheduler sends each request to
+whichever model has spare quota (each has its own rate limit).
 """
 
 import google.generativeai as genai
 import os
+import re
 import asyncio
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+import threading
+import time
+from typing import AsyncIterator, List, Dict, Optional
+
+from app.config import settings
+from app.services.rate_scheduler import RateScheduler
+from app.utils.metrics import (
+    GEMINI_CALLS, GEMINI_EXHAUSTED, GEMINI_FALLBACKS, GEMINI_RATE_LIMITS, observe_stage, stage_timer
+)
+from app.utils.request_trace import current_trace
+
+# Free-tier requests per minute for each model
+MODEL_RPM = {
+    'gemini-1.5-flash': 15,
+    'gemini-2.0-flash': 10,
+}
+
+_RETRY_AFTER_RE = re.compile(
+    r"(?:retry[_ -]?(?:delay|after)[^0-9]*|retry in\s*)(\d+(?:\.\d+)?)",
+    re.IGNORECASE
+)
 
 class GeminiService:
     """
@@ -20,19 +40,27 @@ class GeminiService:
     If one model is rate-limited, automatically tries the other.
     """
     
+    # Canned replies returned instead of a generated answer
+    NOT_CONFIGURED_MESSAGE = "AI engine is not configured. Please set GOOGLE_API_KEY."
+    RATE_LIMITED_MESSAGE = (
+        "The AI is temporarily rate-limited by Google's free tier. "
+        "Please wait about 60 seconds and try again. "
+    )
+    
     def __init__(self):
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key or api_key == "PLACEHOLDER":
             print("⚠️ GOOGLE_API_KEY not found. Gemini will NOT work.")
             self.models = []
             self.model_name = "NOT_CONFIGURED"
+            self.scheduler = RateScheduler({})
             return
         
         genai.configure(api_key=api_key)
         
         # Initialize BOTH models — each has separate rate limits
         self.models = []
-        for model_name in ['gemini-1.5-flash', 'gemini-2.0-flash']:
+        for model_name in MODEL_RPM:
             try:
                 model = genai.GenerativeModel(model_name)
                 self.models.append((model_name, model))
@@ -40,6 +68,13 @@ class GeminiService:
             except Exception as e:
                 print(f"⚠️ {model_name} unavailable: {e}")
         
+        # One token bucket per model that actually initialized
+        self.scheduler = RateScheduler(
+            {name: MODEL_RPM[name] for name, _ in self.models},
+            max_wait=settings.GEMINI_MAX_QUEUE_WAIT_SECONDS,
+            burst=settings.GEMINI_BURST
+        )
+        
         if not self.models:
             print("❌ No Gemini models available!")
             self.model_name = "FAILED"
@@ -48,63 +83,105 @@ class GeminiService:
             print(f"✅ Primary model: {self.model_name} ({len(self.models)} models available)")
     
     async def generate_response(self, prompt: str) -> str:
-        """Generate response — tries each model, falls back on rate limit."""
+        """
+        Generate response — the scheduler picks a model with spare RPM.
+        
+        On a rate limit the model is put in cooldown (honouring the
+        Retry-After hint) and the next model is tried. Raises
+        GeminiOverloaded when no model can serve within the latency budget.
+        """
         if not self.models:
-            return "AI engine is not configured. Please set GOOGLE_API_KEY."
+            return self.NOT_CONFIGURED_MESSAGE
         
-        last_error = ""
+        models = dict(self.models)
+        tried = set()
         
-        # Try each model
-        for model_name, model in self.models:
+        while len(tried) < len(models):
+            model_name = await self.scheduler.acquire(exclude=tried)
+            tried.add(model_name)
+            started = time.perf_counter()
             try:
                 response = await asyncio.get_event_loop().run_in_executor(
-                    None, lambda m=model: m.generate_content(prompt)
+                    None, lambda m=models[model_name]: m.generate_content(prompt)
                 )
                 self.model_name = model_name
+                self._record_call(model_name, "ok", started)
                 return response.text
             
             except Exception as e:
                 error_msg = str(e)
-                last_error = error_msg
                 print(f"⚠️ {model_name} failed: {error_msg[:100]}")
                 
-                is_rate_limit = any(kw in error_msg.lower() for kw in [
-                    "rate", "429", "resource", "exhausted", "quota", "too many"
-                ])
-                
-                if is_rate_limit:
+                if self._is_rate_limit(error_msg):
+                    self.scheduler.penalize(model_name, self._parse_retry_after(error_msg))
                     print(f"↪ {model_name} rate-limited, trying next model...")
-                    continue  # Try next model
-                else:
-                    # Non-rate-limit error — still try next model
-                    continue
-        
-        # All models failed — wait and retry the first model once
-        print("⏳ All models rate-limited. Waiting 30s for one final retry...")
-        await asyncio.sleep(30)
+                # Non-rate-limit errors also fall through to the next model
+                self._record_failure(model_name, error_msg, started, fallback=len(tried) < len(models))
         
-        try:
-            first_name, first_model = self.models[0]
-            response = await asyncio.get_event_loop().run_in_executor(
-                None, lambda: first_model.generate_content(prompt)
-            )
-            self.model_name = first_name
-            return response.text
-        except Exception as e:
-            print(f"❌ Final retry failed: {str(e)[:100]}")
-            return (
-                "The AI is temporarily rate-limited by Google's free tier. "
-                "Please wait about 60 seconds and try again. "
-                f"(Tried {len(self.models)} models)"
-            )
+        print(f"❌ All {len(models)} models failed")
+        self._record_exhausted()
+        return self.RATE_LIMITED_MESSAGE + f"(Tried {len(models)} models)"
     
-    async def generate_with_context(
+    def _record_call(self, model_name: str, outcome: str, started: float) -> None:
+        observe_stage("llm_call", time.perf_counter() - started)
+        GEMINI_CALLS.inc(model=model_name, outcome=outcome)
+        trace = current_trace()
+        if trace is not None:
+            trace.attempt(model_name, outcome)
+    
+    def _record_failure(self, model_name: str, error_msg: str, started: float, fallback: bool) -> None:
+        outcome = "rate_limited" if self._is_rate_limit(error_msg) else "error"
+        self._record_call(model_name, outcome, started)
+        if outcome == "rate_limited":
+            GEMINI_RATE_LIMITS.inc(model=model_name)
+        if fallback:
+            GEMINI_FALLBACKS.inc(from_model=model_name, reason=outcome)
+    
+    @staticmethod
+    def _record_exhausted() -> None:
+        GEMINI_EXHAUSTED.inc()
+        trace = current_trace()
+        if trace is not None:
+            trace.note("exhausted")
+    
+    @staticmethod
+    def _close_stream(response) -> None:
+        """Cancel an SDK stream mid-answer so Gemini stops generating it"""
+        # The streaming response wraps a gRPC/REST iterator; close whichever
+        # level exposes cancel()/close() in the installed SDK version
+        for target in (response, getattr(response, "_iterator", None)):
+            for method in ("cancel", "close"):
+                closer = getattr(target, method, None)
+                if callable(closer):
+                    try:
+                        closer()
+                    except Exception:
+                        pass
+                    return
+    
+    @staticmethod
+    def _is_rate_limit(error_msg: str) -> bool:
+        return any(kw in error_msg.lower() for kw in [
+            "rate", "429", "resource", "exhausted", "quota", "too many"
+        ])
+    
+    @staticmethod
+    def _parse_retry_after(error_msg: str) -> Optional[float]:
+        """Extract the server's retry hint ("retry_delay { seconds: 37 }", "retry in 37s")"""
+        match = _RETRY_AFTER_RE.search(error_msg)
+        return float(match.group(1)) if match else None
+    
+    def is_error_response(self, text: str) -> bool:
+        """True if `text` is one of the canned failure replies (never cache these)"""
+        return text == self.NOT_CONFIGURED_MESSAGE or text.startswith(self.RATE_LIMITED_MESSAGE)
+    
+    def build_prompt(
         self, 
         query: str, 
         context: str, 
         conversation_history: Optional[List[Dict]] = None
     ) -> str:
-        """Generate contextual response (RAG-style)"""
+        """Build the RAG prompt shared by the blocking and streaming paths"""
         history_text = ""
         if conversation_history:
             history_text = "\n".join([
@@ -112,7 +189,7 @@ class GeminiService:
                 for msg in conversation_history[-5:]
             ])
         
-        prompt = f"""You are a helpful e-commerce customer support assistant.
+        return f"""You are a helpful e-commerce customer support assistant.
 Use the following product information to answer the customer's question accurately.
 
 PRODUCT INFORMATION:
@@ -131,14 +208,105 @@ INSTRUCTIONS:
 - Don't make up information
 
 ANSWER:"""
-
+    
+    async def generate_with_context(
+        self, 
+        query: str, 
+        context: str, 
+        conversation_history: Optional[List[Dict]] = None
+    ) -> str:
+        """Generate contextual response (RAG-style)"""
+        with stage_timer("prompt_build"):
+            prompt = self.build_prompt(query, context, conversation_history)
         return await self.generate_response(prompt)
     
+    async def stream_response(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Stream response text chunks as Gemini produces them.
+        
+        Model selection and rate-limit fallback work like generate_response,
+        but a model can only be swapped before its first chunk; an error
+        after that is raised to the caller.
+        """
+        if not self.models:
+            yield self.NOT_CONFIGURED_MESSAGE
+            return
+        
+        models = dict(self.models)
+        tried = set()
+        loop = asyncio.get_running_loop()
+        
+        while len(tried) < len(models):
+            model_name = await self.scheduler.acquire(exclude=tried)
+            tried.add(model_name)
+            
+            # The SDK's stream is a blocking iterator: drain it on a thread
+            # and hand chunks to the event loop through a queue. `stop` is
+            # set when this generator is closed (client disconnected), so
+            # the thread stops reading and cancels the stream instead of
+            # draining the whole answer
+            queue: asyncio.Queue = asyncio.Queue()
+            stop = threading.Event()
+            
+            def pump(model=models[model_name], stop=stop, queue=queue):
+                def send(item):
+                    try:
+                        loop.call_soon_threadsafe(queue.put_nowait, item)
+                    except RuntimeError:
+                        stop.set()  # event loop closed
+                
+                try:
+                    response = model.generate_content(prompt, stream=True)
+                    for chunk in response:
+                        if stop.is_set():
+                            self._close_stream(response)
+                            return
+                        text = getattr(chunk, "text", "")
+                        if text:
+                            send(("chunk", text))
+                    send(("done", None))
+                except Exception as e:
+                    if not stop.is_set():
+                        send(("error", e))
+            
+            loop.run_in_executor(None, pump)
+            started = False
+            call_started = time.perf_counter()
+            
+            try:
+                while True:
+                    kind, payload = await queue.get()
+                    if kind == "chunk":
+                        started = True
+                        self.model_name = model_name
+                        yield payload
+                    elif kind == "done":
+                        self._record_call(model_name, "ok", call_started)
+                        return
+                    else:
+                        error_msg = str(payload)
+                        print(f"⚠️ {model_name} stream failed: {error_msg[:100]}")
+                        if started:
+                            self._record_call(model_name, "error", call_started)
+                            raise payload
+                        if self._is_rate_limit(error_msg):
+                            self.scheduler.penalize(model_name, self._parse_retry_after(error_msg))
+                        self._record_failure(
+                            model_name, error_msg, call_started, fallback=len(tried) < len(models)
+                        )
+                        break  # try the next model
+            finally:
+                stop.set()
+        
+        self._record_exhausted()
+        yield self.RATE_LIMITED_MESSAGE + f"(Tried {len(models)} models)"
+    
     def get_stats(self) -> Dict:
         return {
             "model": self.model_name,
             "available_models": [m[0] for m in self.models] if self.models else [],
             "rate_limit": "15 RPM (1.5-flash) + 10 RPM (2.0-flash)",
+            "scheduler": self.scheduler.get_stats(),
             "cost": "$0.00",
             "status": "ready" if self.models else "no_api_key"
         }
@@ -0,0 +1,394 @@
+"""
+Document Ingestion Jobs - background PDF processing with progress polling
+
+Uploads used to parse, chunk and embed the whole PDF inside the request.
+Now the upload only enqueues a job and returns its ID. Two stages run
+overlapped:
+
+- extracting: the upload is spooled to a temp file and page ranges are
+  parsed in a process pool (PyPDF2 is pure Python and would otherwise
+  hold the GIL), merged back in page order. Tasks carry only the path
+  and range, never the PDF bytes
+- embedding:  each range's chunks are embedded and upserted in batches on
+  the shared compute executor as soon as the range is done, so chat
+  queries interleave between batches. Chunk IDs are content hashes, so a
+  re-upload only embeds new/changed chunks and prunes the removed ones.
+
+Progress is polled via GET /api/documents/jobs/{id}. Job state is also
+written to a small SQLite file so any uvicorn worker can answer the poll.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from app.services.compute_executor import BoundedExecutor, ExecutorSaturated
+from app.utils.document_processor import DocumentProcessor
+
+class IngestionJob:
+    """State and progress of one upload: queued -> processing -> completed/failed"""
+
+    # Share of `progress` given to extraction; embedding is the slow stage
+    EXTRACT_WEIGHT = 0.3
+
+    def __init__(self, filename: str, size_bytes: int):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.size_bytes = size_bytes
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.created = time.time()
+
+        # Extraction progress (page ranges handed to the process pool)
+        self.ranges_total = 0
+        self.ranges_done = 0
+        self.pages = 0
+        self.extract_seconds = 0.0
+
+        # Embedding progress
+        self.chunks_total = 0
+        self.chunks_embedded = 0
+        self.embed_seconds = 0.0
+
+        # Incremental re-ingestion outcome (content-addressed chunk IDs)
+        self.chunks_added = 0
+        self.chunks_unchanged = 0
+        self.chunks_removed = 0
+
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+
+    def start(self) -> None:
+        self.status = "processing"
+        self._started = time.monotonic()
+
+    def mark_extracted(self) -> None:
+        self.extract_seconds = max(self.extract_seconds, time.monotonic() - self._started)
+
+    def finish(self, error: Optional[str] = None) -> None:
+        self.status = "failed" if error else "completed"
+        self.error = error
+        self._finished = time.monotonic()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    @property
+    def progress(self) -> float:
+        """Extraction and embedding weighted into one 0..1 figure"""
+        if self.status == "completed":
+            return 1.0
+        if not self.ranges_done:
+            return 0.0
+        extracted = self.ranges_done / self.ranges_total
+        # chunks_total only covers the ranges done so far: extrapolate to the whole file
+        expected_chunks = self.chunks_total / extracted
+        embedded = min(1.0, self.chunks_embedded / expected_chunks) if expected_chunks else 0.0
+        return self.EXTRACT_WEIGHT * extracted + (1 - self.EXTRACT_WEIGHT) * embedded
+
+    def to_dict(self) -> Dict:
+        elapsed = 0.0
+        if self._started is not None:
+            elapsed = (self._finished or time.monotonic()) - self._started
+
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "created": self.created,
+            "stages": {
+                "extracting": {
+                    "ranges_done": self.ranges_done,
+                    "ranges_total": self.ranges_total,
+                    "pages": self.pages,
+                    "seconds": round(self.extract_seconds, 3),
+                    "pages_per_sec": round(self.pages / self.extract_seconds, 2) if self.extract_seconds else 0.0
+                },
+                "embedding": {
+                    "chunks_embedded": self.chunks_embedded,
+                    "chunks_total": self.chunks_total,
+                    "seconds": round(self.embed_seconds, 3),
+                    "chunks_per_sec": round(self.chunks_embedded / self.embed_seconds, 2) if self.embed_seconds else 0.0
+                }
+            },
+            "result": {
+                "added": self.chunks_added,
+                "unchanged": self.chunks_unchanged,
+                "removed": self.chunks_removed
+            },
+            "progress": round(self.progress, 3),
+            "elapsed_seconds": round(elapsed, 3),
+            "size_bytes": self.size_bytes,
+            "error": self.error
+        }
+
+class JobStateStore:
+    """Job snapshots in a WAL-mode SQLite file shared by all worker processes"""
+
+    # A processing job not updated for this long belongs to a worker that died
+    STALE_SECONDS = 600
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS ingestion_jobs (
+            job_id TEXT PRIMARY KEY,
+            created REAL NOT NULL,
+            updated REAL NOT NULL,
+            finished INTEGER NOT NULL,
+            state TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_created ON ingestion_jobs(created);
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript(self.SCHEMA)
+
+    def save(self, job: "IngestionJob", max_jobs_kept: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO ingestion_jobs (job_id, created, updated, finished, state) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(job_id) DO UPDATE SET "
+                "updated = excluded.updated, finished = excluded.finished, state = excluded.state",
+                (job.id, job.created, time.time(), int(job.finished), json.dumps(job.to_dict()))
+            )
+            if job.finished:
+                # Forget the oldest finished jobs beyond max_jobs_kept
+                self._conn.execute(
+                    "DELETE FROM ingestion_jobs WHERE finished = 1 AND job_id NOT IN ("
+                    "  SELECT job_id FROM ingestion_jobs ORDER BY created DESC LIMIT ?)",
+                    (max_jobs_kept,)
+                )
+
+    def load(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT updated, state FROM ingestion_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._decode(row) if row else None
+
+    def recent(self, limit: int) -> List[Dict]:
+        """Newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT updated, state FROM ingestion_jobs ORDER BY created DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def _decode(self, row) -> Dict:
+        updated, state = row
+        job = json.loads(state)
+        if job["status"] == "processing" and time.time() - updated > self.STALE_SECONDS:
+            job["status"] = "failed"
+            job["error"] = "The worker running this job stopped before it finished"
+        return job
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class IngestionJobManager:
+    """Queues uploads and runs them in the background, one job at a time by default"""
+
+    def __init__(
+        self,
+        chroma,
+        compute: BoundedExecutor,
+        process_workers: int = 1,
+        max_concurrent_jobs: int = 1,
+        embed_batch_size: int = 64,
+        processor: Optional[DocumentProcessor] = None,
+        max_jobs_kept: int = 100,
+        state_path: Optional[str] = None
+    ):
+        self.chroma = chroma
+        self.compute = compute
+        self.process_workers = max(1, process_workers)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.processor = processor or DocumentProcessor(chunk_size=1000, chunk_overlap=200)
+        self.max_jobs_kept = max_jobs_kept
+
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._tasks: set = set()
+        self._slots = asyncio.Semaphore(max(1, max_concurrent_jobs))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Without a shared state file, only the worker that took the upload knows the job
+        self._state = JobStateStore(state_path) if state_path else None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # "spawn" so workers don't inherit the torch/Chroma state of this process
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.process_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    async def submit(self, content: bytes, filename: str) -> IngestionJob:
+        """Enqueue an upload and return immediately"""
+        job = IngestionJob(filename, len(content))
+        self._jobs[job.id] = job
+        self._trim()
+        await self._save(job)  # visible to the other workers before the ID is returned
+
+        task = asyncio.create_task(self._run(job, content))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        """A job's progress, whichever worker is running it"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self._state is None:
+            return None
+        return await asyncio.to_thread(self._state.load, job_id)
+
+    async def list_jobs(self) -> List[Dict]:
+        """Recent jobs of every worker, newest first (this worker's are live)"""
+        local = [job.to_dict() for job in reversed(self._jobs.values())]
+        if self._state is None:
+            return local
+        stored = await asyncio.to_thread(self._state.recent, self.max_jobs_kept)
+        seen = {job["job_id"] for job in local}
+        jobs = local + [job for job in stored if job["job_id"] not in seen]
+        jobs.sort(key=lambda job: job["created"], reverse=True)
+        return jobs[:self.max_jobs_kept]
+
+    async def _save(self, job: IngestionJob) -> None:
+        if self._state is None:
+            return
+        try:
+            await asyncio.to_thread(self._state.save, job, self.max_jobs_kept)
+        except Exception as e:
+            print(f"⚠️ Could not save ingestion job state: {e}")
+
+    def _trim(self) -> None:
+        """Forget the oldest finished jobs beyond `max_jobs_kept`"""
+        if len(self._jobs) <= self.max_jobs_kept:
+            return
+        for job_id in [j.id for j in self._jobs.values() if j.finished]:
+            if len(self._jobs) <= self.max_jobs_kept:
+                break
+            del self._jobs[job_id]
+
+    async def _run(self, job: IngestionJob, content: bytes) -> None:
+        async with self._slots:
+            job.start()
+            await self._save(job)
+            path = None
+            try:
+                # Spooling and counting pages (xref parse) stay off the event loop
+                path = await asyncio.to_thread(self.processor.spool, content)
+                del content
+                futures = await asyncio.to_thread(
+                    self.processor.submit_page_ranges, path, self._get_pool()
+                )
+                job.ranges_total = len(futures)
+                for future in futures:
+                    # Wall time until the last range finished in the pool
+                    future.add_done_callback(lambda _f: job.mark_extracted())
+
+                pending: List[Dict] = []
+                kept_ids: set = set()
+                for future in futures:
+                    # Ranges finish in parallel; consume them in page order
+                    pages = await asyncio.wrap_future(future)
+                    job.ranges_done += 1
+                    job.pages += len(pages)
+
+                    chunks = self.processor.chunk_pages(pages, job.filename)
+                    job.chunks_total += len(chunks)
+                    pending.extend(chunks)
+
+                    while len(pending) >= self.embed_batch_size:
+                        batch, pending = pending[:self.embed_batch_size], pending[self.embed_batch_size:]
+                        kept_ids.update(await self._embed(job, batch))
+                    await self._save(job)
+
+                if pending:
+                    kept_ids.update(await self._embed(job, pending))
+
+                if job.chunks_total == 0:
+                    job.finish("Could not extract text")
+                    return
+
+                # Chunks from the previous upload that no longer exist
+                job.chunks_removed = await self._run_on_compute(
+                    self.chroma.prune_source, job.filename, kept_ids
+                )
+
+                job.finish()
+                print(f"✅ Ingested {job.filename}: {job.chunks_total} chunks from {job.pages} pages")
+            except Exception as e:
+                print(f"❌ Ingestion of {job.filename} failed: {e}")
+                job.finish(str(e))
+            finally:
+                await self._save(job)
+                if path is not None:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    async def _embed(self, job: IngestionJob, batch: List[Dict]) -> List[str]:
+        """Embed + upsert the new chunks of a batch; returns the batch's chunk IDs"""
+        texts = [c["text"] for c in batch]
+        metadatas = [
+            {
+                "source": c["source"], "page": c.get("page", 0), "chunk_index": c.get("chunk_index", 0),
+                "char_start": c.get("char_start", 0), "char_end": c.get("char_end", 0)
+            }
+            for c in batch
+        ]
+
+        started = time.monotonic()
+        result = await self._run_on_compute(self.chroma.add_chunks, texts, metadatas)
+        job.embed_seconds += time.monotonic() - started
+        job.chunks_embedded += len(batch)
+        job.chunks_added += result["added"]
+        job.chunks_unchanged += result["unchanged"]
+        return result["ids"]
+
+    async def _run_on_compute(self, fn, *args):
+        """Run on the compute pool; back off (rather than fail) while chat saturates it"""
+        while True:
+            try:
+                return await self.compute.run(fn, *args)
+            except ExecutorSaturated:
+                await asyncio.sleep(0.5)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        if self._state is not None:
+            self._state.close()
+
+    def get_stats(self) -> Dict:
+        statuses: Dict[str, int] = {}
+        for job in self._jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {
+            "jobs": len(self._jobs),
+            "by_status": statuses,
+            "shared_state": self._state is not None,
+            "process_workers": self.process_workers,
+            "embed_batch_size": self.embed_batch_size
+        }
@@ -0,0 +1,559 @@
+"""
+Lexical Index - BM25 over chunk texts for hybrid retrieval
+Exact SKU/model/price matches that embeddings blur; fused with vector hits by RRF.
+Memory-mapped segments in {CHROMA_DB_PATH}/bm25/ plus a journaled in-memory delta.
+"""
+
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+from array import array
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Words, numbers and compounds like "79.99", "x200-pro", "usb-c", "1/2"
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+COMPOUND_SPLIT_RE = re.compile(r"[\-/]")
+
+STOPWORDS = frozenset("""
+    a an and are as at be but by can do does for from has have how i if in
+    is it its me my of on or our so that the their there this to was we
+    what when where which who will with you your
+""".split())
+
+def identifier_terms(text: str) -> List[str]:
+    """Whole SKU/model-number/price tokens ("x200-pro", "79.99"): 3+ chars with a digit"""
+    return sorted({
+        token for token in TOKEN_RE.findall(text.lower())
+        if len(token) >= 3 and any(ch.isdigit() for ch in token)
+    })
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; hyphen/slash compounds are indexed whole and by part"""
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if "-" in token or "/" in token:
+            tokens.extend(
+                part for part in COMPOUND_SPLIT_RE.split(token)
+                if part and part not in STOPWORDS
+            )
+    return tokens
+
+class _SegmentBuilder:
+    """Accumulates postings in flat typed arrays and sorts them into a segment"""
+
+    def __init__(self, term_list: List[str]):
+        self.term_list = list(term_list)
+        self.term_ids = {term: i for i, term in enumerate(self.term_list)}
+        self.ids: List[str] = []
+        self.lengths = array("i")
+        self.terms = array("i")
+        self.docs = array("i")
+        self.tfs = array("B")
+        self._base: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def add_base(self, ids: List[str], lengths, terms, docs, tfs) -> None:
+        """Seed with surviving postings of the previous segment (already renumbered)"""
+        self.ids.extend(ids)
+        self._base = (np.asarray(lengths), np.asarray(terms), np.asarray(docs), np.asarray(tfs))
+
+    def add(self, chunk_id: str, length: int, counts: Dict[str, int]) -> None:
+        docno = len(self.ids)
+        self.ids.append(chunk_id)
+        self.lengths.append(length)
+        for term, tf in counts.items():
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                term_id = self.term_ids[term] = len(self.term_list)
+                self.term_list.append(term)
+            self.terms.append(term_id)
+            self.docs.append(docno)
+            self.tfs.append(min(tf, 255))
+
+    def build(self) -> Dict:
+        base = self._base or (np.zeros(0, np.int32),) * 3 + (np.zeros(0, np.uint8),)
+        lengths = np.concatenate([base[0], np.frombuffer(self.lengths, dtype=np.int32)]).astype(np.int32)
+        terms = np.concatenate([base[1], np.frombuffer(self.terms, dtype=np.int32)]).astype(np.int32)
+        docs = np.concatenate([base[2], np.frombuffer(self.docs, dtype=np.int32)]).astype(np.int32)
+        tfs = np.concatenate([base[3], np.frombuffer(self.tfs, dtype=np.uint8)]).astype(np.uint8)
+
+        # Drop terms whose every posting was deleted
+        counts = np.bincount(terms, minlength=len(self.term_list))
+        used = counts > 0
+        term_list = self.term_list
+        if not used.all():
+            remap = (np.cumsum(used) - 1).astype(np.int32)
+            terms = remap[terms]
+            term_list = [term for term, keep in zip(term_list, used) if keep]
+            counts = counts[used]
+
+        order = np.lexsort((docs, terms))
+        offsets = np.zeros(len(term_list) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return {
+            "terms": term_list,
+            "ids": self.ids,
+            "offsets": offsets,
+            "docs": docs[order],
+            "tfs": tfs[order],
+            "lengths": lengths,
+        }
+
+class BM25Index:
+    """Segment + delta BM25 index keyed by chunk ID; thread-safe"""
+
+    MERGE_AFTER = 2000      # delta docs before they are folded into the segment
+    MAX_DEAD_RATIO = 0.25   # tombstoned share of the segment that forces a merge
+    MAX_DF_RATIO = 0.5      # query terms in more docs than this are skipped (near-zero idf)
+    CURRENT = "CURRENT"
+
+    def __init__(self, directory: str, k1: float = 1.2, b: float = 0.75):
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+
+        # Stats
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.merges = 0
+
+        self._reset_state(generation=0)
+        self.loaded_from_disk = self._load()
+
+    # ------------------------------------------------------------------
+    # State
+    # ------------------------------------------------------------------
+
+    def _reset_state(self, generation: int) -> None:
+        self._generation = generation
+        # Segment (memory-mapped, immutable)
+        self._term_ids: Dict[str, int] = {}
+        self._term_list: List[str] = []
+        self._ids: List[str] = []
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._docs = np.zeros(0, dtype=np.int32)
+        self._tfs = np.zeros(0, dtype=np.uint8)
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self._norm = np.zeros(0, dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._docno: Dict[str, int] = {}
+        self._dead = 0
+        self._avgdl = 0.0
+        # Delta (in memory, journaled)
+        self._delta_docs: Dict[str, Tuple[int, Dict[str, int]]] = {}
+        self._delta_postings: Dict[str, Dict[str, int]] = {}
+        # Live totals across segment + delta
+        self._count = 0
+        self._total_length = 0
+
+    def _segment_dir(self, generation: int) -> str:
+        return os.path.join(self.directory, f"seg_{generation}")
+
+    def _journal_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"delta_{generation}.log")
+
+    @staticmethod
+    def _load_array(path: str) -> np.ndarray:
+        # Zero-length files can't be mapped
+        return np.load(path, mmap_mode="r" if os.path.getsize(path) > 128 else None)
+
+    def _open_segment(self, generation: int) -> None:
+        directory = self._segment_dir(generation)
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(directory, "terms.json"), "r", encoding="utf-8") as f:
+            term_list = json.load(f)
+        with open(os.path.join(directory, "ids.json"), "r", encoding="utf-8") as f:
+            ids = json.load(f)
+
+        self._reset_state(generation)
+        self._term_list = term_list
+        self._term_ids = {term: i for i, term in enumerate(term_list)}
+        self._ids = ids
+        self._docno = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        self._offsets = self._load_array(os.path.join(directory, "offsets.npy"))
+        self._docs = self._load_array(os.path.join(directory, "docs.npy"))
+        self._tfs = self._load_array(os.path.join(directory, "tfs.npy"))
+        self._lengths = self._load_array(os.path.join(directory, "lengths.npy"))
+        self._alive = np.ones(len(ids), dtype=bool)
+        self._count = len(ids)
+        self._total_length = int(meta["total_length"])
+        self._avgdl = self._total_length / self._count if self._count else 0.0
+        # Per-doc BM25 length normalisation, fixed until the next merge
+        self._norm = (
+            self.k1 * (1 - self.b + self.b * self._lengths / max(self._avgdl, 1.0))
+        ).astype(np.float32)
+
+    def _load(self) -> bool:
+        current_path = os.path.join(self.directory, self.CURRENT)
+        if not os.path.exists(current_path):
+            return False
+        try:
+            with open(current_path, "r", encoding="utf-8") as f:
+                generation = int(f.read().strip())
+            self._open_segment(generation)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ BM25 index unreadable, will rebuild: {e}")
+            self._reset_state(generation=0)
+            return False
+
+        journal_path = self._journal_path(generation)
+        if os.path.exists(journal_path):
+            with open(journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # torn final line from a crash mid-append
+                    self._apply(entry)
+        self._maybe_merge()
+        print(f"✅ BM25 index loaded: {self._count} chunks, {len(self._term_list)} terms")
+        return True
+
+    def _apply(self, entry: Dict) -> None:
+        if entry["op"] == "add":
+            for chunk_id, length, counts in entry["docs"]:
+                self._discard(chunk_id)
+                self._add_delta(chunk_id, length, counts)
+        elif entry["op"] == "remove":
+            for chunk_id in entry["ids"]:
+                self._discard(chunk_id)
+
+    def _journal(self, entry: Dict) -> None:
+        """Append one op (caller holds the lock)"""
+        with open(self._journal_path(self._generation), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+
+    def _add_delta(self, chunk_id: str, length: int, counts: Dict[str, int]) -> None:
+        self._delta_docs[chunk_id] = (length, counts)
+        for term, tf in counts.items():
+            self._delta_postings.setdefault(term, {})[chunk_id] = tf
+        self._count += 1
+        self._total_length += length
+
+    def _discard(self, chunk_id: str) -> bool:
+        entry = self._delta_docs.pop(chunk_id, None)
+        if entry is not None:
+            length, counts = entry
+            for term in counts:
+                postings = self._delta_postings[term]
+                del postings[chunk_id]
+                if not postings:
+                    del self._delta_postings[term]
+        else:
+            docno = self._docno.pop(chunk_id, None)
+            if docno is None:
+                return False
+            self._alive[docno] = False
+            self._dead += 1
+            length = int(self._lengths[docno])
+        self._count -= 1
+        self._total_length -= length
+        return True
+
+    def add(self, documents: Iterable[Tuple[str, str]]) -> None:
+        """Index (chunk_id, text) pairs; known IDs are replaced"""
+        entries = []
+        for chunk_id, text in documents:
+            counts = Counter(tokenize(text))
+            entries.append([chunk_id, sum(counts.values()), dict(counts)])
+        if not entries:
+            return
+        with self._lock:
+            for chunk_id, length, counts in entries:
+                self._discard(chunk_id)
+                self._add_delta(chunk_id, length, counts)
+            self._journal({"op": "add", "docs": entries})
+            self._maybe_merge()
+
+    def remove(self, chunk_ids: Iterable[str]) -> int:
+        with self._lock:
+            removed = [chunk_id for chunk_id in chunk_ids if self._discard(chunk_id)]
+            if removed:
+                self._journal({"op": "remove", "ids": removed})
+                self._maybe_merge()
+            return len(removed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._write_segment(_SegmentBuilder([]).build())
+
+    def rebuild(self, pages: Iterable[List[Tuple[str, str]]]) -> None:
+        """Replace the index with the given (chunk_id, text) pages, built straight into a segment"""
+        builder = _SegmentBuilder([])
+        for page in pages:
+            for chunk_id, text in page:
+                counts = Counter(tokenize(text))
+                builder.add(chunk_id, sum(counts.values()), counts)
+        with self._lock:
+            self._write_segment(builder.build())
+
+    def _maybe_merge(self) -> None:
+        if (
+            len(self._delta_docs) >= self.MERGE_AFTER
+            or (self._dead and self._dead >= self.MAX_DEAD_RATIO * len(self._ids))
+        ):
+            self.merge()
+
+    def merge(self) -> None:
+        """Fold the delta and tombstones into a new segment"""
+        with self._lock:
+            if not self._delta_docs and not self._dead:
+                return
+            builder = _SegmentBuilder(self._term_list)
+            posting_terms = np.repeat(
+                np.arange(len(self._term_list), dtype=np.int32), np.diff(self._offsets)
+            )
+            keep = self._alive[self._docs]
+            renumber = (np.cumsum(self._alive) - 1).astype(np.int32)
+            builder.add_base(
+                [chunk_id for chunk_id, alive in zip(self._ids, self._alive) if alive],
+                self._lengths[self._alive],
+                posting_terms[keep],
+                renumber[self._docs[keep]],
+                self._tfs[keep],
+            )
+            for chunk_id, (length, counts) in self._delta_docs.items():
+                builder.add(chunk_id, length, counts)
+            self._write_segment(builder.build())
+            self.merges += 1
+
+    def _write_segment(self, segment: Dict) -> None:
+        """Persist a segment as the next generation and switch to it (caller holds the lock)"""
+        previous = self._generation
+        generation = previous + 1
+        directory = self._segment_dir(generation)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        for name in ("offsets", "docs", "tfs", "lengths"):
+            np.save(os.path.join(directory, f"{name}.npy"), segment[name])
+        with open(os.path.join(directory, "terms.json"), "w", encoding="utf-8") as f:
+            json.dump(segment["terms"], f)
+        with open(os.path.join(directory, "ids.json"), "w", encoding="utf-8") as f:
+            json.dump(segment["ids"], f)
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "documents": len(segment["ids"]),
+                "terms": len(segment["terms"]),
+                "postings": int(len(segment["docs"])),
+                "total_length": int(segment["lengths"].sum()),
+            }, f)
+
+        # Atomic switch: a crash before this line leaves the old generation live
+        tmp_path = os.path.join(self.directory, self.CURRENT + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(str(generation))
+        os.replace(tmp_path, os.path.join(self.directory, self.CURRENT))
+
+        self._open_segment(generation)
+        shutil.rmtree(self._segment_dir(previous), ignore_errors=True)
+        if os.path.exists(self._journal_path(previous)):
+            os.remove(self._journal_path(previous))
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        allowed: Optional[Callable[[str], bool]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Top `k` (chunk_id, BM25 score) pairs, best first. `allowed`
+        restricts hits to a metadata slice (scores still use corpus-wide idf).
+        """
+        terms = set(tokenize(query))
+        if not terms or k <= 0:
+            return []
+        started = time.perf_counter()
+        with self._lock:
+            snapshot = self._snapshot(terms)
+        # Scoring runs on the snapshot, so adds, merges and other queries don't wait on it
+        hits = self._score(snapshot, k, allowed) if snapshot is not None else []
+        with self._lock:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - started
+        return hits
+
+    def _snapshot(self, terms) -> Optional[Dict]:
+        """What a query reads, captured under the lock (segment arrays are immutable per generation)"""
+        n = self._count
+        if n == 0:
+            return None
+
+        # (df, start, end, delta postings) per query term found in the index
+        matched = []
+        for term in terms:
+            term_id = self._term_ids.get(term)
+            start = end = 0
+            if term_id is not None:
+                start, end = int(self._offsets[term_id]), int(self._offsets[term_id + 1])
+            delta = self._delta_postings.get(term)
+            # Tombstoned postings still count towards df until the next merge
+            df = (end - start) + (len(delta) if delta else 0)
+            if df:
+                matched.append((df, start, end, dict(delta) if delta else None))
+        # Terms like "sku" on every chunk add ~nothing to the ranking but would
+        # dominate the cost; a query made only of them is left to the vectors
+        matched = [m for m in matched if m[0] <= self.MAX_DF_RATIO * n]
+        if not matched:
+            return None
+
+        delta_lengths = {
+            chunk_id: self._delta_docs[chunk_id][0]
+            for _, _, _, delta in matched if delta
+            for chunk_id in delta
+        }
+        return {
+            "n": n,
+            "avgdl": self._avgdl or self._total_length / n,
+            "matched": matched,
+            "delta_lengths": delta_lengths,
+            "ids": self._ids,
+            "docs": self._docs,
+            "tfs": self._tfs,
+            "norm": self._norm,
+            "alive": self._alive.copy() if self._dead else None,
+        }
+
+    def _score(
+        self,
+        snapshot: Dict,
+        k: int,
+        allowed: Optional[Callable[[str], bool]]
+    ) -> List[Tuple[str, float]]:
+        n = snapshot["n"]
+        k1, b = self.k1, self.b
+        avgdl = snapshot["avgdl"]
+        ids = snapshot["ids"]
+        segment_docs = len(ids)
+        delta_lengths = snapshot["delta_lengths"]
+
+        doc_parts, score_parts = [], []
+        delta_scores: Dict[str, float] = {}
+        for df, start, end, delta in snapshot["matched"]:
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+            if end > start:
+                docs = snapshot["docs"][start:end]
+                tf = snapshot["tfs"][start:end].astype(np.float32)
+                doc_parts.append(docs)
+                score_parts.append(idf * tf * (k1 + 1) / (tf + snapshot["norm"][docs]))
+            if delta:
+                for chunk_id, tf in delta.items():
+                    norm = k1 * (1 - b + b * delta_lengths[chunk_id] / max(avgdl, 1.0))
+                    delta_scores[chunk_id] = (
+                        delta_scores.get(chunk_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+                    )
+
+        hits: List[Tuple[str, float]] = []
+        if doc_parts:
+            docs = np.concatenate(doc_parts)
+            scores = np.concatenate(score_parts)
+            if len(doc_parts) > 1:
+                # Sum per doc: sort-based for short lists, dense accumulator otherwise
+                if len(docs) * 16 < segment_docs:
+                    docs, inverse = np.unique(docs, return_inverse=True)
+                    scores = np.bincount(inverse, weights=scores)
+                else:
+                    dense = np.bincount(docs, weights=scores, minlength=segment_docs)
+                    docs = np.flatnonzero(dense)
+                    scores = dense[docs]
+            alive = snapshot["alive"]
+            if alive is not None:
+                live = alive[docs]
+                docs, scores = docs[live], scores[live]
+            if allowed is not None:
+                # Walk best-first until k hits fall inside the slice
+                order = np.argsort(-scores)
+                for d, score in zip(docs[order].tolist(), scores[order].tolist()):
+                    if allowed(ids[d]):
+                        hits.append((ids[d], score))
+                        if len(hits) == k:
+                            break
+            else:
+                if len(docs) > k:
+                    top = np.argpartition(-scores, k)[:k]
+                    docs, scores = docs[top], scores[top]
+                hits = [(ids[d], float(s)) for d, s in zip(docs.tolist(), scores.tolist())]
+
+        if allowed is not None:
+            delta_scores = {c: s for c, s in delta_scores.items() if allowed(c)}
+        hits.extend(delta_scores.items())
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return hits[:k]
+
+    def identifier_coverage(self, query: str, chunk_ids: Iterable[str]) -> Dict[str, float]:
+        """
+        Share of the query's identifier terms (see identifier_terms) each chunk
+        contains verbatim: 0..1, and 0 everywhere for a query without identifiers
+        """
+        chunk_ids = list(chunk_ids)
+        with self._lock:
+            n = self._count
+            postings = []
+            for term in identifier_terms(query):
+                term_id = self._term_ids.get(term)
+                start = end = 0
+                if term_id is not None:
+                    start, end = int(self._offsets[term_id]), int(self._offsets[term_id + 1])
+                delta = self._delta_postings.get(term) or {}
+                if (end - start) + len(delta) > self.MAX_DF_RATIO * n:
+                    continue
+                postings.append((self._docs[start:end], delta))
+            if not postings:
+                return {chunk_id: 0.0 for chunk_id in chunk_ids}
+
+            coverage = {}
+            for chunk_id in chunk_ids:
+                docno = self._docno.get(chunk_id)
+                matched = 0
+                for docs, delta in postings:
+                    if chunk_id in delta:
+                        matched += 1
+                    elif docno is not None and len(docs):
+                        # Postings are sorted by doc number
+                        i = int(np.searchsorted(docs, docno))
+                        matched += i < len(docs) and int(docs[i]) == docno
+                coverage[chunk_id] = matched / len(postings)
+            return coverage
+
+    @property
+    def total(self) -> int:
+        return self._count
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            queries = self.queries
+            segment_bytes = sum(
+                a.nbytes for a in (self._offsets, self._docs, self._tfs, self._lengths)
+            )
+            return {
+                "documents": self._count,
+                "terms": len(self._term_list),
+                "postings": int(len(self._docs)),
+                "delta_documents": len(self._delta_docs),
+                "tombstones": self._dead,
+                "segment_generation": self._generation,
+                "segment_mb": round(segment_bytes / (1024 * 1024), 2),
+                "merges": self.merges,
+                "queries": queries,
+                "avg_query_ms": round(self.query_seconds / queries * 1000, 3) if queries else 0.0
+            }
@@ -1,126 +1,407 @@
 """
-In-Memory Session Storage - 100% FREE
-No Redis needed - uses Python dictionary
-Perfect for free tier deployments
+Session Storage - 100% FREE
+No Redis needed - in-process cache in front of a SessionStore (memory or SQLite)
 """
 
 from typing import Dict, List, Optional
-from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import OrderedDict, deque
+from datetime import datetime
+from itertools import islice
+import sys
+import threading
+import time
+
+from app.services.session_store import InMemorySessionStore, MessageRow, SessionStore
+
+class Message:
+    """One stored chat turn; msg["role"] / msg.get("content") work like a dict"""
+    
+    __slots__ = ("role", "content", "ts")
+    
+    def __init__(self, role: str, content: str, ts: float):
+        self.role = sys.intern(role)  # "user"/"assistant" shared by every record
+        self.content = content
+        self.ts = ts
+    
+    @property
+    def timestamp(self) -> str:
+        return datetime.fromtimestamp(self.ts).isoformat()
+    
+    def __getitem__(self, key: str):
+        return getattr(self, key)
+    
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+    
+    def to_dict(self) -> Dict:
+        return {"role": self.role, "content": self.content, "timestamp": self.timestamp}
+    
+    @property
+    def nbytes(self) -> int:
+        return _MESSAGE_OVERHEAD + sys.getsizeof(self.content)
+
+class SessionHistory:
+    """Ring buffer of one session's messages plus its byte count"""
+    
+    __slots__ = ("messages", "nbytes")
+    
+    def __init__(self, max_messages: int):
+        self.messages: deque = deque(maxlen=max_messages)
+        self.nbytes = _SESSION_OVERHEAD
+    
+    def append(self, message: Message, max_bytes: int) -> int:
+        """Add a message, dropping the oldest past the count/byte limits; returns the byte delta"""
+        before = self.nbytes
+        if len(self.messages) == self.messages.maxlen:
+            self.nbytes -= self.messages[0].nbytes  # about to be pushed out
+        self.messages.append(message)
+        self.nbytes += message.nbytes
+        while self.nbytes > max_bytes and len(self.messages) > 1:
+            self.nbytes -= self.messages.popleft().nbytes
+        return self.nbytes - before
+    
+    def tail(self, limit: int) -> List[Message]:
+        start = max(0, len(self.messages) - limit)
+        return list(islice(self.messages, start, None))
+    
+    def __len__(self) -> int:
+        return len(self.messages)
+
+# Per-record costs as measured by sys.getsizeof (CPython, 64-bit)
+_MESSAGE_OVERHEAD = (
+    sys.getsizeof(Message("user", "", 0.0))                      # slotted instance
+    + sys.getsizeof(0.0)                                         # boxed timestamp
+    + 8                                                          # deque slot
+)
+_SESSION_OVERHEAD = (
+    sys.getsizeof(SessionHistory.__new__(SessionHistory))
+    + sys.getsizeof(deque())
+    + 200  # conversations + last_activity entries (dict slot, OrderedDict link, boxed float)
+)
 
 class MemoryService:
     """
-    FREE in-memory conversation storage
+    FREE conversation storage
     
     Features:
     - No external service required
-    - Automatic session cleanup
-    - Configurable history limit
-    
-    Limitations:
-    - Sessions lost on server restart
-    - Single server only (no horizontal scaling)
+    - Automatic session cleanup (O(1) LRU eviction, background expiry)
+    - Configurable history limit, session cap and byte budgets
+    - With the SQLite store: shared by all workers, survives restarts
     """
     
-    def __init__(self):
-        # Store conversations in memory
-        self.conversations: Dict[str, List[Dict]] = defaultdict(list)
-        self.last_activity: Dict[str, datetime] = {}
+    def __init__(
+        self,
+        store: Optional[SessionStore] = None,
+        write_behind_ms: float = 50.0,
+        sync_interval_ms: float = 100.0,
+        timeout_minutes: int = 60,
+        max_messages: int = 20,
+        max_sessions: int = 10000,
+        max_message_chars: int = 1000,
+        max_session_bytes: int = 32 * 1024,
+        max_total_bytes: int = 64 * 1024 * 1024
+    ):
+        self.store = store or InMemorySessionStore()
+        
+        # In-process read cache (the only copy with the in-memory store)
+        self.conversations: Dict[str, SessionHistory] = {}
+        # session_id -> last access (epoch seconds), least recently used first
+        self.last_activity: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.RLock()
         
         # Configuration
-        self.TIMEOUT_MINUTES = 60  # Sessions expire after 1 hour
-        self.MAX_MESSAGES = 20     # Keep last 20 messages per session
+        self.TIMEOUT_MINUTES = timeout_minutes  # Sessions expire after 1 hour
+        self.MAX_MESSAGES = max_messages        # Keep last 20 messages per session
+        self.MAX_SESSIONS = max_sessions        # LRU-evict beyond this many
+        self.MAX_MESSAGE_CHARS = max_message_chars
+        self.MAX_SESSION_BYTES = max_session_bytes
+        self.MAX_TOTAL_BYTES = max_total_bytes  # LRU-evict beyond this much
+        self.total_bytes = 0
+        self.expired = 0
+        self.evicted = 0
+        
+        # Write-behind buffer, flushed to the store in one transaction
+        self._pending: List[MessageRow] = []
+        self._pending_sessions: Dict[str, int] = {}
+        self._inflight_sessions: Dict[str, int] = {}  # swapped out, not yet committed
+        self._flush_lock = threading.Lock()
+        self._write_behind = write_behind_ms / 1000
+        self._sync_interval = sync_interval_ms / 1000
+        self._sync_epoch = 0  # bumped whenever other workers' writes evict sessions
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self.flushes = 0
+        self.flush_errors = 0
+        self.cache_misses = 0
+        self.external_invalidations = 0
+        if self.store.persistent:
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name="session-write-behind", daemon=True
+            )
+            self._flusher.start()
         
-        print("✅ Memory service initialized (In-memory - FREE)")
+        print(f"✅ Memory service initialized ({self.store.name} store - FREE)")
     
     def add_message(
-        self, 
-        session_id: str, 
-        role: str, 
+        self,
+        session_id: str,
+        role: str,
         content: str
     ) -> None:
         """
         Add message to conversation history
-        Automatically trims old messages
+        Automatically trims old messages (and content past MAX_MESSAGE_CHARS)
         """
-        self.conversations[session_id].append({
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        # Update last activity
-        self.last_activity[session_id] = datetime.now()
-        
-        # Keep only last N messages (memory optimization)
-        if len(self.conversations[session_id]) > self.MAX_MESSAGES:
-            self.conversations[session_id] = \
-                self.conversations[session_id][-self.MAX_MESSAGES:]
+        now = time.time()
+        content = content[:self.MAX_MESSAGE_CHARS]
+        while True:
+            self._cached(session_id)
+            self._lock.acquire()
+            # Evicted by another worker's write in between: load it again
+            if session_id in self.conversations:
+                break
+            self._lock.release()
+        try:
+            history = self.conversations[session_id]
+            # The ring buffer keeps only the last N messages / MAX_SESSION_BYTES
+            self.total_bytes += history.append(Message(role, content, now), self.MAX_SESSION_BYTES)
+            
+            # Update last activity
+            self._touch(session_id, now)
+            self._enforce_budget()
+            
+            if self.store.persistent:
+                self._pending.append((session_id, role, content, now))
+                self._pending_sessions[session_id] = self._pending_sessions.get(session_id, 0) + 1
+        finally:
+            self._lock.release()
+        if self.store.persistent:
+            self._wake.set()
     
     def get_history(
-        self, 
-        session_id: str, 
+        self,
+        session_id: str,
         limit: int = 10
-    ) -> List[Dict]:
+    ) -> List[Message]:
+        """Get conversation history for a session (oldest first)"""
+        history = self._cached(session_id)
+        with self._lock:
+            return history.tail(limit)
+    
+    def _cached(self, session_id: str) -> SessionHistory:
         """
-        Get conversation history for a session
-        Triggers cleanup of old sessions
+        Cached message list for a session, loading it from the store on a miss.
+        Store I/O happens outside self._lock so hot sessions never wait on it.
         """
-        # Clean up old sessions
-        self._cleanup_old_sessions()
-        
-        messages = self.conversations.get(session_id, [])
-        return messages[-limit:] if messages else []
+        while True:
+            with self._lock:
+                history = self.conversations.get(session_id)
+                if history is not None:
+                    self._touch(session_id)
+                    return history
+                if not self.store.persistent:
+                    return self._admit(session_id, [])
+                self.cache_misses += 1
+                unflushed = session_id in self._pending_sessions or session_id in self._inflight_sessions
+                epoch = self._sync_epoch
+            
+            if unflushed:
+                self.flush()  # our own buffered writes must be visible to the load
+            rows = self.store.load(session_id, self.MAX_MESSAGES) or []
+            
+            with self._lock:
+                history = self.conversations.get(session_id)
+                if history is not None:
+                    return history
+                # Another worker's write may have landed after our load: read it again
+                if epoch == self._sync_epoch:
+                    return self._admit(session_id, [
+                        Message(role, content[:self.MAX_MESSAGE_CHARS], ts) for _, role, content, ts in rows
+                    ])
+    
+    def _touch(self, session_id: str, now: Optional[float] = None) -> None:
+        """Mark a cached session as just used: O(1) move to the MRU end"""
+        self.last_activity[session_id] = now or time.time()
+        self.last_activity.move_to_end(session_id)
+    
+    def _admit(self, session_id: str, messages: List[Message]) -> SessionHistory:
+        """Cache a session, evicting the least recently used past the session/byte caps"""
+        history = SessionHistory(self.MAX_MESSAGES)
+        for message in messages:
+            history.append(message, self.MAX_SESSION_BYTES)
+        self.conversations[session_id] = history
+        self.total_bytes += history.nbytes + sys.getsizeof(session_id)
+        self._touch(session_id)
+        self._enforce_budget()
+        return history
+    
+    def _enforce_budget(self) -> None:
+        """LRU-evict until under MAX_SESSIONS and MAX_TOTAL_BYTES (never the MRU session)"""
+        while len(self.last_activity) > 1 and (
+            len(self.last_activity) > self.MAX_SESSIONS or self.total_bytes > self.MAX_TOTAL_BYTES
+        ):
+            oldest = next(iter(self.last_activity))
+            self._drop(oldest)
+            self.evicted += 1
+    
+    def _drop(self, session_id: str) -> Optional[SessionHistory]:
+        self.last_activity.pop(session_id, None)
+        history = self.conversations.pop(session_id, None)
+        if history is not None:
+            self.total_bytes -= history.nbytes + sys.getsizeof(session_id)
+        return history
+    
+    def _sync_external_changes(self) -> None:
+        """Evict sessions other workers wrote to (write-behind thread, every sync_interval_ms)"""
+        try:
+            changed = self.store.changed_sessions()
+        except Exception as e:
+            print(f"⚠️ Session change check failed: {e}")
+            return
+        if changed is not None and not changed:
+            return
+        with self._lock:
+            self._sync_epoch += 1
+            if changed is None:
+                self.external_invalidations += len(self.conversations)
+                self.conversations.clear()
+                self.last_activity.clear()
+                self.total_bytes = 0
+                return
+            for session_id in changed:
+                if self._drop(session_id) is not None:
+                    self.external_invalidations += 1
     
     def clear_session(self, session_id: str) -> bool:
         """Clear specific session"""
-        cleared = False
-        if session_id in self.conversations:
-            del self.conversations[session_id]
-            cleared = True
-        if session_id in self.last_activity:
-            del self.last_activity[session_id]
+        if self.store.persistent:
+            # Commit buffered messages first so the delete removes them too
+            self.flush()
+        with self._lock:
+            history = self._drop(session_id)
+        cleared = bool(history)
+        if self.store.persistent:
+            if history is None:
+                cleared = self.store.load(session_id, 1) is not None
+            self.store.delete(session_id)
         return cleared
     
-    def _cleanup_old_sessions(self) -> int:
+    def flush(self) -> int:
+        """Write buffered messages to the store; returns how many were written"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+                self._inflight_sessions, self._pending_sessions = self._pending_sessions, {}
+            if not rows:
+                return 0
+            try:
+                self.store.append(rows, self.MAX_MESSAGES)
+                self.flushes += 1
+                return len(rows)
+            except Exception as e:
+                # Put them back so the next flush retries
+                self.flush_errors += 1
+                with self._lock:
+                    self._pending = rows + self._pending
+                    for row in rows:
+                        self._pending_sessions[row[0]] = self._pending_sessions.get(row[0], 0) + 1
+                print(f"⚠️ Session write-behind failed, will retry: {e}")
+                return 0
+            finally:
+                with self._lock:
+                    self._inflight_sessions = {}
+    
+    def _flush_loop(self) -> None:
+        while not self._stopped.is_set():
+            if self._wake.wait(self._sync_interval):
+                self._wake.clear()
+                # Let a burst of appends accumulate into one transaction
+                self._stopped.wait(self._write_behind)
+                self.flush()
+            self._sync_external_changes()
+    
+    def shutdown(self) -> None:
+        """Flush pending writes and close the store"""
+        self._stopped.set()
+        self._wake.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+        self.flush()
+        self.store.close()
+    
+    def sweep(self) -> int:
         """
         Remove sessions inactive for > TIMEOUT_MINUTES
         Returns number of sessions cleaned
-        """
-        now = datetime.now()
-        timeout = timedelta(minutes=self.TIMEOUT_MINUTES)
-        
-        expired_sessions = [
-            session_id 
-            for session_id, last_time in self.last_activity.items()
-            if now - last_time > timeout
-        ]
         
-        for session_id in expired_sessions:
-            self.clear_session(session_id)
+        Called periodically by the background sweeper, not per request.
+        Sessions are in access order, so this only visits expired ones.
+        """
+        cutoff = time.time() - self.TIMEOUT_MINUTES * 60
+        expired = 0
+        with self._lock:
+            while self.last_activity:
+                session_id, last_time = next(iter(self.last_activity.items()))
+                if last_time >= cutoff:
+                    break
+                self._drop(session_id)
+                expired += 1
+            self.expired += expired
         
-        return len(expired_sessions)
+        # The cache copy is gone; the store expires its own rows
+        if self.store.persistent:
+            try:
+                expired = max(expired, self.store.expire(cutoff))
+            except Exception as e:
+                print(f"⚠️ Session expiry failed: {e}")
+        return expired
     
     def get_stats(self) -> Dict:
         """Get memory statistics"""
-        total_messages = sum(
-            len(msgs) for msgs in self.conversations.values()
-        )
+        with self._lock:
+            total_messages = sum(
+                len(history) for history in self.conversations.values()
+            )
+            cached_sessions = sum(1 for history in self.conversations.values() if history)
+            pending = len(self._pending)
+            total_bytes = self.total_bytes
+        stored_sessions = self.store.count_sessions()
         return {
-            "active_sessions": len(self.conversations),
+            "store": self.store.name,
+            "active_sessions": stored_sessions if stored_sessions is not None else cached_sessions,
+            "cached_sessions": cached_sessions,
             "total_messages": total_messages,
+            "pending_writes": pending,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "cache_misses": self.cache_misses,
+            "external_invalidations": self.external_invalidations,
+            "expired_sessions": self.expired,
+            "evicted_sessions": self.evicted,
             "timeout_minutes": self.TIMEOUT_MINUTES,
+            "max_sessions": self.MAX_SESSIONS,
             "max_messages_per_session": self.MAX_MESSAGES,
+            "memory_bytes": total_bytes,
+            "memory_mb": round(total_bytes / (1024 * 1024), 2),
+            "avg_bytes_per_session": total_bytes // len(self.conversations) if self.conversations else 0,
+            "budget_mb": round(self.MAX_TOTAL_BYTES / (1024 * 1024), 2),
+            "max_session_bytes": self.MAX_SESSION_BYTES,
             "cost": "$0.00"
         }
     
     def get_session_info(self, session_id: str) -> Optional[Dict]:
         """Get info about a specific session"""
-        if session_id not in self.conversations:
-            return None
-        
-        return {
-            "session_id": session_id,
-            "message_count": len(self.conversations[session_id]),
-            "last_active": self.last_activity.get(session_id, "unknown")
-        }
+        history = self._cached(session_id)
+        with self._lock:
+            if not history:
+                return None
+            
+            return {
+                "session_id": session_id,
+                "message_count": len(history),
+                "bytes": history.nbytes,
+                "last_active": datetime.fromtimestamp(self.last_activity[session_id])
+                if session_id in self.last_activity else "unknown"
+            }
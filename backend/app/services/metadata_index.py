@@ -0,0 +1,179 @@
+"""
+Metadata Index - bitmap indexes over chunk metadata for filtered retrieval
+One int bitmap per (field, value): OR within a field, AND across fields.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+# Metadata fields that can be filtered on
+FILTER_FIELDS = ("source", "category", "type")
+
+FilterSpec = Dict[str, Union[str, List[str]]]
+
+def normalize_filters(filters: Optional[FilterSpec]) -> Optional[Dict[str, Tuple[str, ...]]]:
+    """Drop empty fields and make every value a sorted tuple; None if nothing is left"""
+    if not filters:
+        return None
+    normalized = {}
+    for field, values in filters.items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Cannot filter on '{field}' (choose from: {', '.join(FILTER_FIELDS)})")
+        if values is None:
+            continue
+        if isinstance(values, str):
+            values = [values]
+        values = tuple(sorted(set(values)))
+        if values:
+            normalized[field] = values
+    return normalized or None
+
+def where_clause(filters: Dict[str, Tuple[str, ...]]) -> Dict:
+    """Chroma `where` for normalized filters"""
+    clauses = [
+        {field: values[0]} if len(values) == 1 else {field: {"$in": list(values)}}
+        for field, values in sorted(filters.items())
+    ]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+class MetadataIndex:
+    """Thread-safe chunk ID -> filterable metadata, with one bitmap per (field, value)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slots: Dict[str, int] = {}              # chunk ID -> slot
+        self._chunk_ids: List[Optional[str]] = []     # slot -> chunk ID (None = free)
+        self._free: List[int] = []
+        self._values: Dict[str, Tuple[Optional[str], ...]] = {}  # chunk ID -> value per field
+        self._bitmaps: Dict[str, Dict[str, int]] = {field: {} for field in FILTER_FIELDS}
+
+        # Stats: how filtered searches were answered
+        self.plans = {"empty": 0, "exact": 0, "pushdown": 0}
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+
+    def add(self, chunk_ids: Iterable[str], metadatas: Iterable[Dict]) -> None:
+        """Index (or re-index) chunks with their metadata"""
+        with self._lock:
+            for chunk_id, metadata in zip(chunk_ids, metadatas):
+                metadata = metadata or {}
+                values = tuple(
+                    None if metadata.get(field) is None else str(metadata[field])
+                    for field in FILTER_FIELDS
+                )
+                if self._values.get(chunk_id) == values:
+                    continue
+                self._remove(chunk_id)
+                slot = self._free.pop() if self._free else len(self._chunk_ids)
+                if slot == len(self._chunk_ids):
+                    self._chunk_ids.append(chunk_id)
+                else:
+                    self._chunk_ids[slot] = chunk_id
+                self._slots[chunk_id] = slot
+                self._values[chunk_id] = values
+                bit = 1 << slot
+                for field, value in zip(FILTER_FIELDS, values):
+                    if value is not None:
+                        bitmaps = self._bitmaps[field]
+                        bitmaps[value] = bitmaps.get(value, 0) | bit
+
+    def remove(self, chunk_ids: Iterable[str]) -> None:
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._remove(chunk_id)
+
+    def _remove(self, chunk_id: str) -> None:
+        slot = self._slots.pop(chunk_id, None)
+        if slot is None:
+            return
+        values = self._values.pop(chunk_id)
+        mask = ~(1 << slot)
+        for field, value in zip(FILTER_FIELDS, values):
+            if value is None:
+                continue
+            bitmaps = self._bitmaps[field]
+            remaining = bitmaps[value] & mask
+            if remaining:
+                bitmaps[value] = remaining
+            else:
+                del bitmaps[value]
+        self._chunk_ids[slot] = None
+        self._free.append(slot)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._slots.clear()
+            self._chunk_ids.clear()
+            self._free.clear()
+            self._values.clear()
+            self._bitmaps = {field: {} for field in FILTER_FIELDS}
+
+    # ------------------------------------------------------------------
+    # Queries (filters must come from normalize_filters)
+    # ------------------------------------------------------------------
+
+    def _bitmap(self, filters: Dict[str, Tuple[str, ...]]) -> int:
+        result = -1  # all ones
+        for field, values in filters.items():
+            bitmaps = self._bitmaps[field]
+            any_of = 0
+            for value in values:
+                any_of |= bitmaps.get(value, 0)
+            result &= any_of
+            if not result:
+                break
+        return result
+
+    def count(self, filters: Dict[str, Tuple[str, ...]]) -> int:
+        """Number of chunks in the slice"""
+        with self._lock:
+            return self._bitmap(filters).bit_count()
+
+    def ids(self, filters: Dict[str, Tuple[str, ...]], limit: Optional[int] = None) -> List[str]:
+        """Chunk IDs in the slice (in slot order), up to `limit`"""
+        with self._lock:
+            bitmap = self._bitmap(filters)
+            chunk_ids = []
+            while bitmap and (limit is None or len(chunk_ids) < limit):
+                low = bitmap & -bitmap
+                chunk_ids.append(self._chunk_ids[low.bit_length() - 1])
+                bitmap ^= low
+            return chunk_ids
+
+    def matches(self, chunk_id: str, filters: Dict[str, Tuple[str, ...]]) -> bool:
+        values = self._values.get(chunk_id)
+        if values is None:
+            return False
+        return all(
+            values[FILTER_FIELDS.index(field)] in allowed
+            for field, allowed in filters.items()
+        )
+
+    def facets(self) -> Dict[str, Dict[str, int]]:
+        """Chunk count per value of every filterable field"""
+        with self._lock:
+            return {
+                field: {value: bitmap.bit_count() for value, bitmap in sorted(bitmaps.items())}
+                for field, bitmaps in self._bitmaps.items()
+            }
+
+    def record(self, plan: str) -> None:
+        self.plans[plan] += 1
+
+    @property
+    def total(self) -> int:
+        return len(self._slots)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "chunks": len(self._slots),
+                "values": {field: len(bitmaps) for field, bitmaps in self._bitmaps.items()},
+                "bitmap_bytes": sum(
+                    (bitmap.bit_length() + 7) // 8
+                    for bitmaps in self._bitmaps.values() for bitmap in bitmaps.values()
+                ),
+                "filtered_searches": dict(self.plans)
+            }
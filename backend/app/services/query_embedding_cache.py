@@ -0,0 +1,95 @@
+"""
+Query Embedding Cache - bounded LRU of query text -> vector
+
+Storefront traffic is extremely repetitive ("return policy", "shipping
+cost", ...). Caching the embedding of the normalized query text lets
+repeated and near-repeated queries skip the transformer forward pass.
+Vectors are stored as packed float32 arrays and the cache is bounded by
+bytes, not entries, so its RAM cost is known up front.
+"""
+
+import re
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+_PUNCT_RE = re.compile(r"[^\w\s$.]")
+_SPACE_RE = re.compile(r"\s+")
+
+def normalize_query(text: str) -> str:
+    """
+    Canonical cache key for a query.
+    Case, surrounding punctuation and repeated whitespace don't change
+    the meaning of a shopper's question ("Return policy?" == "return policy").
+    """
+    text = _PUNCT_RE.sub(" ", text.lower())
+    text = _SPACE_RE.sub(" ", text).strip()
+    return text.rstrip(".")
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU cache bounded by `max_bytes` of stored keys + vectors"""
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, array]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _entry_size(key: str, vector: array) -> int:
+        return sys.getsizeof(key) + vector.itemsize * len(vector)
+
+    def get(self, query: str) -> Optional[List[float]]:
+        key = normalize_query(query)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector.tolist()
+
+    def put(self, query: str, embedding: List[float]) -> None:
+        key = normalize_query(query)
+        vector = array("f", embedding)
+        size = self._entry_size(key, vector)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= self._entry_size(key, old)
+
+            self._entries[key] = vector
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                old_key, old_vector = self._entries.popitem(last=False)
+                self._bytes -= self._entry_size(old_key, old_vector)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions
+        }
@@ -12,8 +12,18 @@ Total Cost: $0.00
 from app.services.chroma_service import ChromaDBService
 from app.services.gemini_service import GeminiService
 from app.services.memory_service import MemoryService
+from app.services.compute_executor import BoundedExecutor
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.answer_cache import AnswerCache
+from app.services.single_flight import SingleFlight, generation_key
+from app.services.reranker import CrossEncoderReranker
 from app.utils.prompts import format_rag_prompt, format_no_context_prompt
-from typing import Dict, List, Optional
+from app.utils.context_packer import ContextPacker
+from app.utils.ranking import mmr_select, take_results
+from app.utils.metrics import stage_timer
+from app.utils.request_trace import current_trace
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
 import logging
 
 # Configure logging
@@ -26,33 +36,261 @@ class FreeRAGPipeline:
     
     Flow:
     1. Receive user query
-    2. Search ChromaDB for relevant documents
+    2. Search ChromaDB for relevant documents (optionally cross-encoder reranked)
     3. Build context from search results
     4. Get conversation history from memory
-    5. Generate response using Gemini
-    6. Save to memory and return
+    5. Generate response using Gemini (or stream it)
+    6. Save to memory
+    7. Return answer with sources
     
     All components are completely free!
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        chroma: Optional[ChromaDBService] = None,
+        gemini: Optional[GeminiService] = None,
+        memory: Optional[MemoryService] = None,
+        compute: Optional[BoundedExecutor] = None,
+        batcher: Optional[EmbeddingBatcher] = None,
+        answer_cache: Optional[AnswerCache] = None,
+        generations: Optional[SingleFlight] = None,
+        packer: Optional[ContextPacker] = None,
+        fetch_k: int = 30,
+        mmr_lambda: Optional[float] = 0.7,
+        reranker: Optional[CrossEncoderReranker] = None,
+        rerank_top_k: int = 3
+    ):
         logger.info("Initializing FREE RAG Pipeline...")
         
-        # Initialize all FREE services
-        self.chroma = ChromaDBService()
-        self.gemini = GeminiService()
-        self.memory = MemoryService()
+        # Services are injected by the ServiceContainer so the pipeline
+        # shares the same embedder / Chroma client as the routers
+        self.chroma = chroma or ChromaDBService()
+        self.gemini = gemini or GeminiService()
+        self.memory = memory or MemoryService()
+        self.compute = compute or BoundedExecutor()
+        self.batcher = batcher or EmbeddingBatcher(self.chroma.embed_queries, self.compute)
+        self.answer_cache = answer_cache  # None disables answer caching
+        self.generations = generations  # None disables request coalescing
+        self.reranker = reranker  # None = bi-encoder order only
         
         # Configuration
         self.top_k = 5  # Number of documents to retrieve
         self.relevance_threshold = 0.5  # Minimum relevance score
+        self.fetch_k = fetch_k  # Candidates over-fetched for MMR diversification
+        self.mmr_lambda = mmr_lambda  # None = plain top-k by distance
+        self.rerank_top_k = rerank_top_k  # Chunks kept when the reranker finishes in budget
+        
+        # Merges overlapping chunks and fits them into a token budget
+        self.packer = packer or ContextPacker(relevance_threshold=self.relevance_threshold)
         
         logger.info("✅ FREE RAG Pipeline initialized!")
     
+    async def _retrieve(
+        self,
+        query: str,
+        fetch_k: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
+        filters: Optional[Dict] = None,
+        top_k: Optional[int] = None
+    ):
+        """
+        Step 2: returns (search_results, query_embedding).
+        
+        Embedding + vector search run on the compute pool, not the event loop;
+        concurrent queries share one batched encode, repeated ones hit the cache.
+        `filters` scope the search to a category/source/type slice.
+        """
+        with stage_timer("embed"):
+            query_embedding = self.chroma.get_cached_embedding(query)
+            if query_embedding is None:
+                query_embedding = await self.batcher.embed(query)
+        fetch_k = fetch_k or self.fetch_k
+        mmr_lambda = self.mmr_lambda if mmr_lambda is None else mmr_lambda
+        if self.reranker is None:
+            with stage_timer("search"):
+                search_results = await self.compute.run(
+                    self.chroma.search, query,
+                    top_k=top_k or self.top_k, query_embedding=query_embedding,
+                    fetch_k=fetch_k, mmr_lambda=mmr_lambda, filters=filters
+                )
+        else:
+            search_results = await self._rerank(
+                query, query_embedding, fetch_k, mmr_lambda, filters, top_k
+            )
+        return search_results, query_embedding
+    
+    async def _prepare(
+        self,
+        query: str,
+        session_id: str,
+        fetch_k: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
+        filters: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Retrieval half of the pipeline (steps 2-4), shared by the blocking
+        and streaming chat paths. Also resolves an answer-cache hit.
+        
+        `fetch_k` / `mmr_lambda` override the pipeline's MMR defaults.
+        """
+        # Step 2: Search ChromaDB for relevant documents (FREE)
+        corpus_version = self.chroma.corpus_version  # before retrieval, for the answer cache
+        search_results, query_embedding = await self._retrieve(query, fetch_k, mmr_lambda, filters)
+        
+        # Step 3: Build context from results (merged, deduplicated, token-budgeted)
+        with stage_timer("context_pack"):
+            packed = self._build_context(search_results)
+        context = packed["context"]
+        
+        # Step 4: Get conversation history (in-memory - FREE)
+        with stage_timer("history"):
+            history = await self._session_io(self.memory.get_history, session_id, 5)
+        
+        # A near-identical question over the same chunks may have just been answered.
+        # Only first turns are cached: later answers depend on the history.
+        cacheable = self.answer_cache is not None and not history
+        chunk_ids = search_results.get('ids', [[]])[0]
+        cached_answer = None
+        if cacheable:
+            cached_answer = self.answer_cache.get(query, query_embedding, chunk_ids, corpus_version)
+        
+        return {
+            "search_results": search_results,
+            "context": context if context else "No relevant context found.",
+            "context_tokens": packed["tokens"],
+            "history": history,
+            "query_embedding": query_embedding,
+            "corpus_version": corpus_version,
+            "cacheable": cacheable,
+            "chunk_ids": chunk_ids,
+            "generation_key": generation_key(query, chunk_ids, history),
+            "cached_answer": cached_answer
+        }
+    
+    async def _rerank(
+        self,
+        query: str,
+        query_embedding: List[float],
+        fetch_k: int,
+        mmr_lambda: Optional[float],
+        filters: Optional[Dict] = None,
+        top_k: Optional[int] = None
+    ) -> Dict:
+        """
+        Step 2 with the cross-encoder: score the `fetch_k` nearest chunks
+        and keep the best `rerank_top_k` (MMR-diversified on the
+        cross-encoder scores when `mmr_lambda` is set). If scoring misses
+        its latency budget, the bi-encoder order and the usual top_k win.
+        An explicit `top_k` (search API) replaces both.
+        """
+        with stage_timer("search"):
+            candidates = await self.compute.run(
+                self.chroma.search, query,
+                top_k=fetch_k, query_embedding=query_embedding,
+                include_embeddings=mmr_lambda is not None, filters=filters
+            )
+        documents = candidates["documents"][0]
+        embeddings = candidates.get("embeddings")
+        use_mmr = mmr_lambda is not None and embeddings is not None and len(embeddings[0]) > 0
+        
+        scores = None
+        if documents:
+            # Deadline is taken before queuing, so pool wait counts against the budget
+            with stage_timer("rerank"):
+                scores = await self.compute.run(
+                    self.reranker.score, query, documents, self.reranker.deadline()
+                )
+        
+        if scores is None:
+            if documents:
+                logger.info(f"Rerank over budget for '{query[:50]}', keeping vector order")
+                self._trace_note("rerank:fallback")
+            fallback_k = top_k or self.top_k
+            if use_mmr:
+                picked = mmr_select(query_embedding, embeddings[0], fallback_k, mmr_lambda)
+            else:
+                picked = list(range(min(fallback_k, len(documents))))
+            return take_results(candidates, picked)
+        
+        keep = top_k or self.rerank_top_k
+        if use_mmr:
+            picked = mmr_select(query_embedding, embeddings[0], keep, mmr_lambda, relevance=scores)
+        else:
+            picked = sorted(range(len(scores)), key=scores.__getitem__, reverse=True)[:keep]
+        results = take_results(candidates, picked)
+        results["rerank_scores"] = [[scores[i] for i in picked]]
+        return results
+    
+    async def _generate(self, query: str, prepared: Dict) -> str:
+        """
+        Step 5 for the blocking path. Concurrent requests that would send
+        Gemini the same prompt share one in-flight call; each still gets
+        its own memory write in _finish.
+        """
+        def generate():
+            return self.gemini.generate_with_context(
+                query=query,
+                context=prepared["context"],
+                conversation_history=prepared["history"]
+            )
+        
+        with stage_timer("llm"):
+            if self.generations is None:
+                return await generate()
+            if self.generations.pending(prepared["generation_key"]) is not None:
+                # The Gemini attempts are traced on the request that started the call
+                self._trace_served_by("coalesced")
+            return await self.generations.do(prepared["generation_key"], generate)
+    
+    @staticmethod
+    def _trace_note(event: str) -> None:
+        trace = current_trace()
+        if trace is not None:
+            trace.note(event)
+    
+    @staticmethod
+    def _trace_served_by(source: str) -> None:
+        """Name the answer's origin in the request trace when no Gemini call of ours produced it"""
+        trace = current_trace()
+        if trace is not None:
+            trace.model = source
+    
+    async def _session_io(self, fn, *args):
+        """
+        Call a MemoryService method that may hit the session store (cache-miss
+        loads, flushes) on a worker thread, keeping SQLite off the event loop
+        """
+        if not self.memory.store.persistent:
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+    
+    async def _finish(self, query: str, session_id: str, prepared: Dict, answer: str) -> None:
+        """Step 6: remember the exchange and populate the answer cache"""
+        if (
+            prepared["cacheable"]
+            and prepared["cached_answer"] is None
+            and not self.gemini.is_error_response(answer)
+        ):
+            self.answer_cache.put(
+                query, prepared["query_embedding"], prepared["chunk_ids"],
+                prepared["corpus_version"], answer
+            )
+        
+        with stage_timer("memory_write"):
+            await self._session_io(self._remember, session_id, query, answer)
+    
+    def _remember(self, session_id: str, query: str, answer: str) -> None:
+        self.memory.add_message(session_id, "user", query)
+        self.memory.add_message(session_id, "assistant", answer)
+    
     async def process_query(
         self, 
         query: str, 
-        session_id: str
+        session_id: str,
+        fetch_k: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
+        filters: Optional[Dict] = None
     ) -> Dict:
         """
         Main RAG pipeline - process user query and generate response
@@ -60,69 +298,131 @@ class FreeRAGPipeline:
         logger.info(f"Processing query: '{query[:50]}...' for session: {session_id}")
         
         try:
-            # Step 1: Search ChromaDB for relevant documents (FREE)
-            search_results = self.chroma.search(query, top_k=self.top_k)
-            
-            # Step 2: Build context from results
-            context = self._build_context(search_results)
+            prepared = await self._prepare(query, session_id, fetch_k, mmr_lambda, filters)
             
-            # Step 3: Get conversation history (in-memory - FREE)
-            history = self.memory.get_history(session_id, limit=5)
-            history_text = self._format_history(history)
+            # Step 5: Generate response with Gemini (FREE - 15 RPM)
+            answer = prepared["cached_answer"]
+            if answer is None:
+                answer = await self._generate(query, prepared)
+            else:
+                self._trace_served_by("answer_cache")
             
-            # Step 4: Generate response with Gemini (FREE - 15 RPM)
-            answer = await self.gemini.generate_with_context(
-                query=query,
-                context=context if context else "No relevant context found.",
-                conversation_history=history
-            )
+            # Step 6: Save to memory
+            await self._finish(query, session_id, prepared, answer)
             
-            # Step 5: Save to memory
-            self.memory.add_message(session_id, "user", query)
-            self.memory.add_message(session_id, "assistant", answer)
+            # Step 7: Format and return response
+            sources = self._format_sources(prepared["search_results"])
             
-            # Step 6: Format and return response
-            sources = self._format_sources(search_results)
-            
-            logger.info(f"Generated response with {len(sources)} sources")
+            logger.info(
+                f"Generated response with {len(sources)} sources "
+                f"({prepared['context_tokens']} context tokens)"
+            )
             
             return {
                 "answer": answer,
                 "sources": sources,
-                "session_id": session_id
+                "session_id": session_id,
+                "context_tokens": prepared["context_tokens"]
             }
             
         except Exception as e:
             logger.error(f"RAG pipeline error: {str(e)}")
             raise
     
-    def _build_context(self, search_results: Dict) -> str:
-        """Extract and format context from ChromaDB results"""
-        if not search_results.get('documents') or not search_results['documents'][0]:
-            logger.info("No documents found in search results")
-            return ""
+    async def stream_query(
+        self,
+        query: str,
+        session_id: str,
+        fetch_k: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
+        filters: Optional[Dict] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Streaming variant of process_query.
         
-        contexts = []
-        documents = search_results['documents'][0]
-        metadatas = search_results['metadatas'][0]
+        Yields events: one `sources` event as soon as retrieval finishes,
+        then `token` events as Gemini produces text, then `done`.
+        Memory is only written once the full answer has been produced.
+        """
+        logger.info(f"Streaming query: '{query[:50]}...' for session: {session_id}")
+        
+        prepared = await self._prepare(query, session_id, fetch_k, mmr_lambda, filters)
+        yield {
+            "event": "sources",
+            "data": {
+                "sources": self._format_sources(prepared["search_results"]),
+                "session_id": session_id,
+                "context_tokens": prepared["context_tokens"]
+            }
+        }
+        
+        answer = prepared["cached_answer"]
+        if answer is None and self.generations is not None:
+            # An identical blocking request is already waiting on Gemini: join it
+            in_flight = self.generations.pending(prepared["generation_key"])
+            if in_flight is not None:
+                answer = await self.generations.join(in_flight)
+        
+        if answer is not None:
+            yield {"event": "token", "data": {"text": answer}}
+        else:
+            with stage_timer("prompt_build"):
+                prompt = self.gemini.build_prompt(query, prepared["context"], prepared["history"])
+            parts = []
+            with stage_timer("llm"):
+                async for text in self.gemini.stream_response(prompt):
+                    parts.append(text)
+                    yield {"event": "token", "data": {"text": text}}
+            answer = "".join(parts)
+        
+        await self._finish(query, session_id, prepared, answer)
+        yield {"event": "done", "data": {"session_id": session_id}}
+    
+    async def search(
+        self,
+        query: str,
+        top_k: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[Dict]:
+        """Retrieval only (no Gemini, no memory): ranked chunks for the search API"""
+        search_results, _ = await self._retrieve(query, filters=filters, top_k=top_k)
+        ids = search_results.get('ids', [[]])[0]
+        documents = search_results.get('documents', [[]])[0]
+        metadatas = search_results.get('metadatas', [[]])[0]
         distances = search_results.get('distances', [[]])[0]
+        lexical_scores = (search_results.get('lexical_scores') or [[]])[0]
+        rerank_scores = (search_results.get('rerank_scores') or [[]])[0]
         
-        for i, (doc, metadata) in enumerate(zip(documents, metadatas)):
-            # Check relevance (lower distance = more relevant)
-            distance = distances[i] if i < len(distances) else 1
-            relevance = 1 - distance
-            
-            if relevance < self.relevance_threshold:
-                continue
-            
-            source = metadata.get('source', 'Unknown')
-            page = metadata.get('page', 'N/A')
-            
-            contexts.append(
-                f"[Source: {source}, Page: {page}]\n{doc}"
+        results = []
+        for i, (chunk_id, document, metadata) in enumerate(zip(ids, documents, metadatas)):
+            metadata = metadata or {}
+            score = 1 - distances[i] if i < len(distances) else 0
+            if i < len(lexical_scores):
+                score = max(score, lexical_scores[i])
+            results.append({
+                "id": chunk_id,
+                "text": document,
+                "source": metadata.get('source', 'Unknown'),
+                "page": metadata.get('page'),
+                "category": metadata.get('category'),
+                "type": metadata.get('type'),
+                "relevance": max(0, round(score * 100, 2)),
+                "rerank_score": round(rerank_scores[i], 4) if i < len(rerank_scores) else None
+            })
+        return results
+    
+    def _build_context(self, search_results: Dict) -> Dict:
+        """Extract and pack context from ChromaDB results (see ContextPacker)"""
+        packed = self.packer.pack(search_results)
+        if not packed["context"]:
+            logger.info("No documents found in search results")
+        elif packed["chunks_merged"] or packed["truncated"]:
+            logger.info(
+                f"Context packed: {packed['chunks_used']} blocks, {packed['tokens']} tokens "
+                f"(from {packed['raw_tokens']}; merged {packed['chunks_merged']}, "
+                f"truncated={packed['truncated']})"
             )
-        
-        return "\n\n---\n\n".join(contexts) if contexts else ""
+        return packed
     
     def _format_history(self, history: List[Dict]) -> str:
         """Format conversation history for prompt"""
@@ -146,10 +446,14 @@ class FreeRAGPipeline:
         
         metadatas = search_results['metadatas'][0]
         distances = search_results.get('distances', [[]])[0]
+        lexical_scores = (search_results.get('lexical_scores') or [[]])[0]
         
         for i, metadata in enumerate(metadatas):
             distance = distances[i] if i < len(distances) else 0
-            relevance = round((1 - distance) * 100, 2)
+            score = 1 - distance
+            if i < len(lexical_scores):
+                score = max(score, lexical_scores[i])
+            relevance = round(score * 100, 2)
             
             sources.append({
                 "source": metadata.get('source', 'Unknown'),
@@ -166,22 +470,32 @@ class FreeRAGPipeline:
             "chroma": self.chroma.get_stats(),
             "gemini": self.gemini.get_stats(),
             "memory": self.memory.get_stats(),
+            "compute": self.compute.get_stats(),
+            "embedding_batcher": self.batcher.get_stats(),
+            "answer_cache": self.answer_cache.get_stats() if self.answer_cache else {"enabled": False},
+            "coalescing": self.generations.get_stats() if self.generations else {"enabled": False},
+            "reranker": self.reranker.get_stats() if self.reranker else {"enabled": False},
             "pipeline": {
                 "top_k": self.top_k,
-                "relevance_threshold": self.relevance_threshold
+                "relevance_threshold": self.relevance_threshold,
+                "fetch_k": self.fetch_k,
+                "mmr_lambda": self.mmr_lambda,
+                "rerank_top_k": self.rerank_top_k if self.reranker else None
             },
+            "context_packer": self.packer.get_stats(),
             "total_cost": "$0.00"
         }
     
-    def clear_memory(self, session_id: str) -> bool:
+    def warmup(self) -> None:
+        """Page in the reranker weights (the other services warm themselves)"""
+        if self.reranker is not None:
+            self.reranker.warmup()
+    
+    async def clear_memory(self, session_id: str) -> bool:
         """Clear conversation history for a session"""
-        return self.memory.clear_session(session_id)
-
-_rag_pipeline: Optional[FreeRAGPipeline] = None
+        return await self._session_io(self.memory.clear_session, session_id)
 
 def get_rag_pipeline() -> FreeRAGPipeline:
-    """Get or create RAG pipeline singleton"""
-    global _rag_pipeline
-    if _rag_pipeline is None:
-        _rag_pipeline = FreeRAGPipeline()
-    return _rag_pipeline
+    """Get the shared RAG pipeline from the service container"""
+    from app.services.container import get_container
+    return get_container().rag
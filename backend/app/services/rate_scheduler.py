@@ -0,0 +1,178 @@
+"""
+Gemini Rate Scheduler - per-model token buckets with admission control
+
+Replaces the old "try both models, then sleep 30s and retry" loop. Each
+model gets a token bucket sized to its free-tier RPM. Each request
+reserves the earliest free slot across the models and sleeps until it.
+A 429 (with its Retry-After hint) puts that model in cooldown. When the
+estimated queue wait would exceed the latency budget, the request is
+rejected up front so the API can answer 429 + Retry-After immediately
+instead of holding the connection.
+"""
+
+import asyncio
+import math
+import time
+from typing import Dict, Iterable, Optional
+
+from app.utils.metrics import GEMINI_REJECTIONS, GEMINI_SLEEPS, GEMINI_SLEEP_SECONDS, observe_stage
+
+class GeminiOverloaded(Exception):
+    """Raised when a request can't be scheduled within the latency budget"""
+
+    def __init__(self, retry_after: float, message: str = "Gemini capacity exhausted"):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+class ModelBudget:
+    """Token bucket for one model: `rpm` requests per minute, small burst"""
+
+    def __init__(self, name: str, rpm: int, burst: int = 2):
+        self.name = name
+        self.rpm = rpm
+        self.rate = rpm / 60.0  # tokens per second
+        self.capacity = max(1, min(burst, rpm))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.cooldown_until = 0.0
+
+        # Stats
+        self.granted = 0
+        self.rate_limited = 0
+
+    def _refill(self, now: float) -> None:
+        # The bucket doesn't refill during a cooldown
+        start = max(self.updated, self.cooldown_until)
+        if now > start:
+            self.tokens = min(self.capacity, self.tokens + (now - start) * self.rate)
+        self.updated = max(self.updated, now)
+
+    def wait_time(self, now: float) -> float:
+        """
+        Seconds until this model can take one more request. Tokens go
+        negative while requests hold reservations, so this includes the
+        queue already waiting on the model.
+        """
+        self._refill(now)
+        start = max(now, self.cooldown_until)
+        return (start - now) + max(0.0, 1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        """Reserve the next slot (the caller sleeps wait_time() before using it)"""
+        self._refill(now)
+        self.tokens -= 1
+        self.granted += 1
+
+    def release(self) -> None:
+        """Give back a reservation that won't be used"""
+        self._refill(time.monotonic())
+        self.tokens = min(self.capacity, self.tokens + 1)
+        self.granted -= 1
+
+    def penalize(self, retry_after: float) -> None:
+        """Model answered 429: drain the bucket and respect Retry-After"""
+        now = time.monotonic()
+        self._refill(now)
+        # One probe request when the cooldown ends; outstanding reservations
+        # stay as debt and are handed back when their holders wake and re-plan
+        self.tokens = min(self.tokens, 0.0) + 1.0
+        self.cooldown_until = max(self.cooldown_until, now + retry_after)
+        self.rate_limited += 1
+
+    def get_stats(self, now: float) -> Dict:
+        self._refill(now)
+        return {
+            "rpm": self.rpm,
+            "tokens": round(self.tokens, 2),
+            "cooldown_seconds": round(max(0.0, self.cooldown_until - now), 1),
+            "granted": self.granted,
+            "rate_limited": self.rate_limited
+        }
+
+class RateScheduler:
+    """
+    Fair (FIFO) scheduler over several model budgets.
+
+    `acquire()` resolves to the name of the model the caller may use now,
+    or raises GeminiOverloaded if the expected wait exceeds `max_wait`.
+
+    A caller reserves a slot on the model that frees up first and then
+    sleeps until it is due, holding no lock, so one request waiting on a
+    throttled model never delays requests another model can serve.
+    Reservations are handed out in arrival order, which keeps it FIFO
+    per model.
+    """
+
+    def __init__(self, model_rpm: Dict[str, int], max_wait: float = 20.0, burst: int = 2):
+        self.budgets = {name: ModelBudget(name, rpm, burst) for name, rpm in model_rpm.items()}
+        self.max_wait = max_wait
+        self._queued = 0
+
+        # Stats
+        self.acquired = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_observed_wait = 0.0
+        self.peak_queue = 0
+
+    async def acquire(self, exclude: Iterable[str] = ()) -> str:
+        excluded = set(exclude)
+        candidates = [b for name, b in self.budgets.items() if name not in excluded]
+        if not candidates:
+            raise GeminiOverloaded(self.max_wait, "No Gemini model left to try")
+
+        started = time.monotonic()
+        while True:
+            # Pick and reserve without awaiting in between, so it is atomic on the loop
+            now = time.monotonic()
+            budget = min(candidates, key=lambda b: b.wait_time(now))
+            wait = budget.wait_time(now)
+            if (now - started) + wait > self.max_wait:
+                self.rejected += 1
+                GEMINI_REJECTIONS.inc()
+                raise GeminiOverloaded(wait)
+            budget.take(now)
+            if wait <= 0:
+                break
+
+            GEMINI_SLEEPS.inc()
+            GEMINI_SLEEP_SECONDS.inc(wait)
+            self._queued += 1
+            self.peak_queue = max(self.peak_queue, self._queued)
+            try:
+                await asyncio.sleep(wait)
+            except BaseException:
+                budget.release()
+                raise
+            finally:
+                self._queued -= 1
+
+            if time.monotonic() >= budget.cooldown_until:
+                break
+            # The model was rate-limited while we slept: hand the slot back and re-plan
+            budget.release()
+
+        waited = time.monotonic() - started
+        self.acquired += 1
+        self.total_wait += waited
+        self.max_observed_wait = max(self.max_observed_wait, waited)
+        observe_stage("llm_queue", waited)
+        return budget.name
+
+    def penalize(self, model_name: str, retry_after: Optional[float]) -> None:
+        budget = self.budgets.get(model_name)
+        if budget is not None:
+            budget.penalize(retry_after if retry_after is not None else 60.0)
+
+    def get_stats(self) -> Dict:
+        now = time.monotonic()
+        return {
+            "queue_depth": self._queued,
+            "peak_queue_depth": self.peak_queue,
+            "max_wait_seconds": self.max_wait,
+            "acquired": self.acquired,
+            "rejected": self.rejected,
+            "avg_wait_seconds": round(self.total_wait / self.acquired, 3) if self.acquired else 0.0,
+            "max_observed_wait_seconds": round(self.max_observed_wait, 3),
+            "models": {name: b.get_stats(now) for name, b in self.budgets.items()}
+        }
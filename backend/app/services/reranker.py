@@ -0,0 +1,127 @@
+"""
+Cross-Encoder Reranker - rescore retrieved candidates on the CPU
+
+The bi-encoder ranks chunks by the distance between two independently
+computed vectors. A cross-encoder reads the query and the chunk together
+and is much better at telling the right product page from a near miss,
+so the pipeline can send Gemini 2-3 chunks instead of 5.
+
+It is also ~100x more expensive per candidate, so pairs are scored in
+small batches against a per-request deadline. If the deadline passes
+before every candidate has a score, the caller falls back to the
+bi-encoder order (partial scores are not comparable with missing ones).
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+class CrossEncoderReranker:
+    """Batched, deadline-bounded wrapper around a sentence-transformers CrossEncoder"""
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_RERANK_MODEL,
+        batch_size: int = 8,
+        budget_ms: float = 300,
+        max_length: int = 256
+    ):
+        import torch
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.budget_ms = budget_ms
+        self.model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+        # MS MARCO cross-encoders output raw logits (their config sets an
+        # Identity activation; e.g. 8.6 / -4.3). MMR mixes relevance with
+        # cosine similarity, so squash them into [0, 1] explicitly
+        self._activation = torch.nn.Sigmoid()
+
+        # Stats
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.pairs_scored = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+
+        print(f"✅ Cross-encoder reranker loaded ({model_name}, budget {budget_ms:.0f}ms)")
+
+    def deadline(self) -> float:
+        """Monotonic deadline for a request starting now"""
+        return time.monotonic() + self.budget_ms / 1000
+
+    def score(self, query: str, documents: Sequence[str], deadline: float) -> Optional[List[float]]:
+        """
+        Relevance of each document to `query` in [0, 1], or None if
+        `deadline` (time.monotonic) passed before all of them were scored.
+
+        The deadline is checked before every batch, so it covers time
+        spent queued on the compute pool too; the overshoot is at most
+        one batch.
+        """
+        started = time.monotonic()
+        scores: List[float] = []
+        timed_out = False
+        try:
+            for start in range(0, len(documents), self.batch_size):
+                if time.monotonic() >= deadline:
+                    timed_out = True
+                    break
+                pairs = [(query, doc) for doc in documents[start:start + self.batch_size]]
+                batch_scores = self.model.predict(
+                    pairs, batch_size=len(pairs), show_progress_bar=False,
+                    activation_fct=self._activation
+                )
+                scores.extend(float(s) for s in batch_scores)
+        except Exception as e:
+            print(f"⚠️ Rerank failed, keeping vector order: {e}")
+            self._record(started, len(scores), error=True)
+            return None
+
+        self._record(started, len(scores), timed_out=timed_out)
+        return None if timed_out else scores
+
+    def _record(self, started: float, pairs: int, timed_out: bool = False, error: bool = False) -> None:
+        elapsed_ms = (time.monotonic() - started) * 1000
+        with self._lock:
+            self.requests += 1
+            self.pairs_scored += pairs
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            self.last_ms = elapsed_ms
+            if error:
+                self.errors += 1
+            elif timed_out:
+                self.timeouts += 1
+            else:
+                self.completed += 1
+
+    def warmup(self) -> None:
+        """Score one pair so the first real request doesn't pay for lazy init"""
+        self.model.predict([("warmup", "warmup")], show_progress_bar=False)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            requests = self.requests
+            return {
+                "enabled": True,
+                "model": self.model_name,
+                "budget_ms": self.budget_ms,
+                "batch_size": self.batch_size,
+                "requests": requests,
+                "completed": self.completed,
+                "fallbacks": self.timeouts + self.errors,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+                "pairs_scored": self.pairs_scored,
+                "avg_ms": round(self.total_ms / requests, 2) if requests else 0.0,
+                "max_ms": round(self.max_ms, 2),
+                "last_ms": round(self.last_ms, 2)
+            }
@@ -0,0 +1,248 @@
+"""
+Session Stores - where conversation history lives behind MemoryService
+memory: per process (lost on restart); sqlite: one WAL-mode file shared by all workers
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Set, Tuple
+
+# (session_id, role, content, timestamp)
+MessageRow = Tuple[str, str, str, float]
+
+class SessionStore(ABC):
+    """Persistence behind MemoryService's in-process cache"""
+
+    name = ""
+    persistent = False
+
+    @abstractmethod
+    def load(self, session_id: str, limit: int) -> Optional[List[MessageRow]]:
+        """Last `limit` messages of a session (oldest first), or None if unknown"""
+
+    @abstractmethod
+    def append(self, rows: List[MessageRow], max_messages: int) -> None:
+        """Write a batch of messages, keeping at most `max_messages` per session"""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        ...
+
+    @abstractmethod
+    def expire(self, cutoff: float) -> int:
+        """Delete sessions idle since before `cutoff` (epoch seconds)"""
+
+    def changed_sessions(self) -> Optional[Set[str]]:
+        """
+        Sessions written by other processes since the last call.
+        Empty set when nothing changed, None when the cache must be dropped.
+        """
+        return set()
+
+    def count_sessions(self) -> Optional[int]:
+        return None
+
+    def close(self) -> None:
+        pass
+
+class InMemorySessionStore(SessionStore):
+    """No persistence: MemoryService's cache is the only copy"""
+
+    name = "memory"
+
+    def load(self, session_id: str, limit: int) -> Optional[List[MessageRow]]:
+        return None
+
+    def append(self, rows: List[MessageRow], max_messages: int) -> None:
+        pass
+
+    def delete(self, session_id: str) -> None:
+        pass
+
+    def expire(self, cutoff: float) -> int:
+        return 0
+
+class SQLiteSessionStore(SessionStore):
+    """WAL-mode SQLite store shared by all worker processes"""
+
+    name = "sqlite"
+    persistent = True
+
+    # Change-log rows older than this are pruned; a reader that fell
+    # further behind than the log reaches drops its whole cache instead
+    CHANGE_LOG_SECONDS = 600
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            ts REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id);
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            last_active REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_last_active ON sessions(last_active);
+        CREATE TABLE IF NOT EXISTS changes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            writer TEXT NOT NULL,
+            ts REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.writer = uuid.uuid4().hex[:12]  # tags this process's changes
+
+        # One connection shared by request threads and the write-behind flusher
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript(self.SCHEMA)
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            self._last_change = self._conn.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM changes"
+            ).fetchone()[0]
+        print(f"✅ SQLite session store ready ({path})")
+
+    def load(self, session_id: str, limit: int) -> Optional[List[MessageRow]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT session_id, role, content, ts FROM messages "
+                "WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, limit)
+            ).fetchall()
+        if not rows:
+            return None
+        rows.reverse()
+        return rows
+
+    def append(self, rows: List[MessageRow], max_messages: int) -> None:
+        if not rows:
+            return
+        last_active: Dict[str, float] = {}
+        for session_id, _, _, ts in rows:
+            last_active[session_id] = max(ts, last_active.get(session_id, 0.0))
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO messages (session_id, role, content, ts) VALUES (?, ?, ?, ?)", rows
+                )
+                self._conn.executemany(
+                    "INSERT INTO sessions (session_id, last_active) VALUES (?, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET last_active = excluded.last_active",
+                    last_active.items()
+                )
+                # Keep only the newest max_messages rows of each touched session
+                self._conn.executemany(
+                    "DELETE FROM messages WHERE session_id = ? AND id <= ("
+                    "  SELECT id FROM messages WHERE session_id = ? "
+                    "  ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    [(s, s, max_messages) for s in last_active]
+                )
+                self._log_changes(last_active, now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+                self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                self._log_changes([session_id], time.time())
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def expire(self, cutoff: float) -> int:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                expired = [row[0] for row in self._conn.execute(
+                    "SELECT session_id FROM sessions WHERE last_active < ?", (cutoff,)
+                )]
+                if expired:
+                    self._conn.executemany(
+                        "DELETE FROM messages WHERE session_id = ?", [(s,) for s in expired]
+                    )
+                    self._conn.executemany(
+                        "DELETE FROM sessions WHERE session_id = ?", [(s,) for s in expired]
+                    )
+                    self._log_changes(expired, now)
+                self._conn.execute(
+                    "DELETE FROM changes WHERE ts < ?", (now - self.CHANGE_LOG_SECONDS,)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(expired)
+
+    def _log_changes(self, session_ids, now: float) -> None:
+        self._conn.executemany(
+            "INSERT INTO changes (session_id, writer, ts) VALUES (?, ?, ?)",
+            [(s, self.writer, now) for s in session_ids]
+        )
+
+    def changed_sessions(self) -> Optional[Set[str]]:
+        # Polled by MemoryService's write-behind thread, so waiting for the
+        # connection here never holds up a request
+        with self._lock:
+            # data_version only moves when *another* connection commits
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return set()
+            self._data_version = version
+
+            oldest, newest = self._conn.execute(
+                "SELECT MIN(id), MAX(id) FROM changes"
+            ).fetchone()
+            if newest is None or newest <= self._last_change:
+                return set()
+            if oldest > self._last_change + 1:
+                # Entries we never saw were pruned: we can't tell what changed
+                self._last_change = newest
+                return None
+            rows = self._conn.execute(
+                "SELECT DISTINCT session_id FROM changes WHERE id > ? AND writer != ?",
+                (self._last_change, self.writer)
+            ).fetchall()
+            self._last_change = newest
+        return {row[0] for row in rows}
+
+    def count_sessions(self) -> Optional[int]:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+def create_session_store(name: str, path: str = "./sessions.db") -> SessionStore:
+    """Instantiate the store selected by Settings.SESSION_STORE"""
+    if name == InMemorySessionStore.name:
+        return InMemorySessionStore()
+    if name == SQLiteSessionStore.name:
+        return SQLiteSessionStore(path)
+    raise ValueError(f"Unknown SESSION_STORE '{name}' (choose from: memory, sqlite)")
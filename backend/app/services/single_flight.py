@@ -0,0 +1,85 @@
+"""
+Single-Flight - coalesce identical in-flight Gemini generations
+
+During promotions many shoppers ask the same question within seconds.
+The answer cache only helps once the first answer has finished; until
+then every request would make its own Gemini call and burn the RPM
+budget. SingleFlight lets concurrent callers with the same key share
+one in-flight generation: the first caller (the leader) starts it, the
+rest await the same result.
+
+The key covers everything that shapes the prompt: the normalized query,
+the retrieved chunk IDs and a digest of the conversation history.
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.services.query_embedding_cache import normalize_query
+
+def generation_key(query: str, chunk_ids: List[str], history: List[Dict]) -> Tuple:
+    """Requests with equal keys would send Gemini the same prompt"""
+    history_digest = hashlib.blake2b(
+        json.dumps([(m.get("role"), m.get("content")) for m in history]).encode("utf-8"),
+        digest_size=8
+    ).hexdigest() if history else ""
+    return (normalize_query(query), tuple(chunk_ids), history_digest)
+
+class SingleFlight:
+    """Per-key sharing of one in-flight coroutine result (event-loop only)"""
+
+    def __init__(self):
+        self._in_flight: Dict[Tuple, asyncio.Task] = {}
+
+        # Stats
+        self.leaders = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.max_waiters = 0
+        self._waiters: Dict[Tuple, int] = {}
+
+    async def do(self, key: Tuple, fn: Callable[[], Awaitable[str]]) -> str:
+        """Run `fn()` once per key among concurrent callers and share the result"""
+        task = self._in_flight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.create_task(fn())
+            self._in_flight[key] = task
+            self._waiters[key] = 1
+            task.add_done_callback(lambda t, k=key: self._done(k, t))
+        else:
+            self.coalesced += 1
+            self._waiters[key] += 1
+            self.max_waiters = max(self.max_waiters, self._waiters[key])
+
+        # shield: one disconnecting client must not cancel everyone's answer
+        return await asyncio.shield(task)
+
+    def pending(self, key: Tuple) -> Optional[asyncio.Task]:
+        """The in-flight generation for `key`, if any"""
+        return self._in_flight.get(key)
+
+    async def join(self, task: asyncio.Task) -> str:
+        """Await a task found via pending(), counted as a coalesced call"""
+        self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key: Tuple, task: asyncio.Task) -> None:
+        self._in_flight.pop(key, None)
+        self._waiters.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            self.failures += 1
+
+    def get_stats(self) -> Dict:
+        calls = self.leaders + self.coalesced
+        return {
+            "enabled": True,
+            "in_flight": len(self._in_flight),
+            "generations": self.leaders,
+            "deduplicated": self.coalesced,
+            "dedup_rate": round(self.coalesced / calls, 3) if calls else 0.0,
+            "max_waiters": self.max_waiters,
+            "failures": self.failures
+        }
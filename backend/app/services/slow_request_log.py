@@ -0,0 +1,98 @@
+"""
+Slow Request Log - the N slowest recent chat requests, with their traces
+
+When a shopper reports a slow answer, /api/admin/slow-requests shows what
+that request spent its time on: per-stage timings, the Gemini models it
+tried in order (the fallback path) and the model that answered.
+
+Bounded in both directions: at most `capacity` entries (a min-heap, so a
+new request only gets in by beating the fastest one kept) and nothing
+older than `window_minutes`, so one bad hour doesn't hide today's
+problems. Queries are stored as a short hash, never as text.
+"""
+
+import hashlib
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.services.query_embedding_cache import normalize_query
+from app.utils.request_trace import RequestTrace
+
+def query_hash(query: str) -> str:
+    """Stable short ID for a query (same text, case and spacing aside -> same hash)"""
+    return hashlib.blake2b(normalize_query(query).encode("utf-8"), digest_size=6).hexdigest()
+
+class SlowRequestLog:
+    """Thread-safe top-N (by duration) of requests seen within a time window"""
+
+    def __init__(self, capacity: int = 50, window_minutes: float = 60):
+        self.capacity = max(1, capacity)
+        self.window_seconds = window_minutes * 60
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[float, int, Dict]] = []  # (duration_ms, seq, entry)
+        self._seq = itertools.count()
+
+        # Stats
+        self.recorded = 0
+
+    def record(
+        self,
+        trace: RequestTrace,
+        query: str,
+        session_id: Optional[str],
+        status: str = "ok"
+    ) -> None:
+        duration_ms = trace.elapsed_ms
+        now = time.time()
+        with self._lock:
+            self.recorded += 1
+            self._expire(now)
+            if len(self._heap) >= self.capacity and duration_ms <= self._heap[0][0]:
+                return
+            entry = {
+                "ts": now,
+                "endpoint": trace.endpoint,
+                "status": status,
+                "duration_ms": round(duration_ms, 2),
+                "query_hash": query_hash(query),
+                "session_id": session_id,
+                "model": trace.model,
+                "fallback_path": list(trace.path),
+                "stages_ms": trace.stage_ms()
+            }
+            item = (duration_ms, next(self._seq), entry)
+            if len(self._heap) >= self.capacity:
+                heapq.heapreplace(self._heap, item)
+            else:
+                heapq.heappush(self._heap, item)
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.window_seconds
+        if any(entry["ts"] < cutoff for _, _, entry in self._heap):
+            self._heap = [item for item in self._heap if item[2]["ts"] >= cutoff]
+            heapq.heapify(self._heap)
+
+    def slowest(self, limit: Optional[int] = None) -> List[Dict]:
+        """Slowest first; timestamps as ISO strings"""
+        with self._lock:
+            self._expire(time.time())
+            items = sorted(self._heap, key=lambda item: item[0], reverse=True)
+        if limit is not None:
+            items = items[:limit]
+        return [
+            {**entry, "ts": datetime.fromtimestamp(entry["ts"]).isoformat()}
+            for _, _, entry in items
+        ]
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "window_minutes": self.window_seconds / 60,
+                "kept": len(self._heap),
+                "recorded": self.recorded
+            }
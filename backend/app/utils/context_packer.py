@@ -0,0 +1,199 @@
+"""
+Context Packer - assemble retrieved chunks into a token-budgeted prompt context
+
+DocumentProcessor cuts pages into ~1000-char chunks with a 200-char
+overlap, so neighbouring hits from the same page repeat text. Before the
+context goes to Gemini the packer:
+
+1. drops hits under the relevance threshold (vector relevance, or the
+   relative BM25 score for keyword hits from hybrid search)
+2. merges chunks of the same source/page whose char_start/char_end spans
+   overlap or touch (the overlap is emitted once), and drops chunks whose
+   span is already covered
+3. drops exact duplicate texts (e.g. the same FAQ under two sources)
+4. packs the blocks, best first, into a token budget; the last block is
+   cut at a sentence boundary if only part of it fits
+
+Tokens are estimated at ~4 characters each (Gemini's rule of thumb), so
+no tokenizer has to be loaded.
+"""
+
+import math
+import threading
+from typing import Dict, List, Optional
+
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def _overlap_len(left: str, right: str, expected: int) -> int:
+    """Length of the suffix of `left` that is a prefix of `right`, searched near `expected`"""
+    if expected > 0 and left.endswith(right[:expected]):
+        return expected
+    for size in range(min(len(left), len(right), expected + 8), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+def _cut_at_sentence(text: str, max_chars: int) -> str:
+    """Longest prefix of `text` within max_chars, ending at a sentence if possible"""
+    if len(text) <= max_chars:
+        return text
+    head = text[:max_chars]
+    for end_char in ('. ', '! ', '? '):
+        pos = head.rfind(end_char)
+        if pos > max_chars // 2:
+            return head[:pos + 1]
+    return head.rsplit(' ', 1)[0] + " ..."
+
+class ContextPacker:
+    """Merge overlapping chunks and pack them into a token budget"""
+
+    def __init__(
+        self,
+        token_budget: int = 1200,
+        relevance_threshold: float = 0.5,
+        min_block_tokens: int = 40
+    ):
+        self.token_budget = token_budget
+        self.relevance_threshold = relevance_threshold
+        self.min_block_tokens = min_block_tokens  # don't bother packing a tail shorter than this
+
+        # Stats
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_packed = 0
+        self.tokens_saved = 0
+        self.chunks_merged = 0
+        self.chunks_deduplicated = 0
+        self.truncated = 0
+
+    def pack(self, search_results: Dict, token_budget: Optional[int] = None) -> Dict:
+        """
+        Returns {"context", "tokens", "chunks_used", "chunks_merged",
+        "chunks_deduplicated", "raw_tokens", "truncated"}
+        """
+        budget = token_budget or self.token_budget
+        hits = self._relevant_hits(search_results)
+        raw_tokens = sum(estimate_tokens(h["text"]) for h in hits)
+        blocks, merged, deduplicated = self._merge(hits)
+
+        parts, used, truncated = [], 0, False
+        separator_tokens = estimate_tokens("\n\n---\n\n")
+        for block in blocks:
+            header = f"[Source: {block['source']}, Page: {block['page']}]\n"
+            cost = estimate_tokens(header) + (separator_tokens if parts else 0)
+            remaining = budget - used - cost
+            if remaining < self.min_block_tokens:
+                truncated = True
+                break
+            text = block["text"]
+            if estimate_tokens(text) > remaining:
+                text = _cut_at_sentence(text, remaining * CHARS_PER_TOKEN)
+                truncated = True
+            parts.append(header + text)
+            used += cost + estimate_tokens(text)
+
+        with self._lock:
+            self.requests += 1
+            self.tokens_packed += used
+            self.tokens_saved += max(0, raw_tokens - used)
+            self.chunks_merged += merged
+            self.chunks_deduplicated += deduplicated
+            self.truncated += truncated
+
+        return {
+            "context": "\n\n---\n\n".join(parts),
+            "tokens": used,
+            "raw_tokens": raw_tokens,
+            "chunks_used": len(parts),
+            "chunks_merged": merged,
+            "chunks_deduplicated": deduplicated,
+            "truncated": truncated
+        }
+
+    def _relevant_hits(self, search_results: Dict) -> List[Dict]:
+        documents = (search_results.get('documents') or [[]])[0]
+        metadatas = (search_results.get('metadatas') or [[]])[0]
+        distances = (search_results.get('distances') or [[]])[0]
+        lexical_scores = (search_results.get('lexical_scores') or [[]])[0]
+
+        hits = []
+        for rank, (doc, metadata) in enumerate(zip(documents, metadatas)):
+            # Lower distance = more relevant
+            distance = distances[rank] if rank < len(distances) else 1
+            relevance = 1 - distance
+            if rank < len(lexical_scores):
+                # An exact SKU/price match can be a poor embedding neighbour
+                relevance = max(relevance, lexical_scores[rank])
+            if relevance < self.relevance_threshold or not doc:
+                continue
+            metadata = metadata or {}
+            hits.append({
+                "text": doc,
+                "rank": rank,
+                "source": metadata.get('source', 'Unknown'),
+                "page": metadata.get('page', 'N/A'),
+                "start": metadata.get('char_start'),
+                "end": metadata.get('char_end'),
+            })
+        return hits
+
+    def _merge(self, hits: List[Dict]):
+        """Group overlapping spans per (source, page); returns (blocks best-first, merged, deduplicated)"""
+        merged = deduplicated = 0
+        blocks: List[Dict] = []
+        by_page: Dict[tuple, List[Dict]] = {}
+        for hit in hits:
+            if hit["start"] is None or hit["end"] is None:
+                blocks.append(dict(hit))  # no offsets (FAQs, older uploads): stands alone
+            else:
+                by_page.setdefault((hit["source"], hit["page"]), []).append(hit)
+
+        for page_hits in by_page.values():
+            page_hits.sort(key=lambda h: h["start"])
+            current = dict(page_hits[0])
+            for hit in page_hits[1:]:
+                if hit["end"] <= current["end"]:
+                    # Span already covered by the current block
+                    current["rank"] = min(current["rank"], hit["rank"])
+                    merged += 1
+                    continue
+                if hit["start"] <= current["end"]:
+                    overlap = _overlap_len(current["text"], hit["text"], current["end"] - hit["start"])
+                    if overlap or hit["start"] == current["end"]:
+                        joiner = "" if overlap else " "
+                        current["text"] = current["text"] + joiner + hit["text"][overlap:]
+                        current["end"] = hit["end"]
+                        current["rank"] = min(current["rank"], hit["rank"])
+                        merged += 1
+                        continue
+                blocks.append(current)
+                current = dict(hit)
+            blocks.append(current)
+
+        # Exact duplicate texts across sources/pages: keep the best-ranked copy
+        blocks.sort(key=lambda b: b["rank"])
+        unique, seen = [], set()
+        for block in blocks:
+            key = block["text"].strip()
+            if key in seen:
+                deduplicated += 1
+                continue
+            seen.add(key)
+            unique.append(block)
+        return unique, merged, deduplicated
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            requests = self.requests
+            return {
+                "token_budget": self.token_budget,
+                "requests": requests,
+                "avg_context_tokens": round(self.tokens_packed / requests, 1) if requests else 0.0,
+                "tokens_saved": self.tokens_saved,
+                "chunks_merged": self.chunks_merged,
+                "chunks_deduplicated": self.chunks_deduplicated,
+                "truncated": self.truncated
+            }
@@ -5,9 +5,55 @@ Handles PDF and text extraction with chunking
 
 import PyPDF2
 import io
-from typing import List, Tuple, Dict
+import os
+import tempfile
+from concurrent.futures import Executor, Future
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 import re
 
+_WHITESPACE_RE = re.compile(r'\s+')
+_SPECIAL_CHARS_RE = re.compile(r'[^\w\s.,;:!?\'"-]')
+
+def _clean_page_text(text: str) -> str:
+    """Collapse whitespace and strip special characters from extracted text"""
+    text = _WHITESPACE_RE.sub(' ', text)
+    text = _SPECIAL_CHARS_RE.sub('', text)
+    return text.strip()
+
+# Worker-local: ((path, mtime_ns), reader) of the file whose ranges this
+# process is extracting, so a worker parses each upload once, not per range
+_worker_reader: Optional[Tuple[Tuple[str, int], PyPDF2.PdfReader]] = None
+
+def _reader_for(source: Union[bytes, str]) -> PyPDF2.PdfReader:
+    global _worker_reader
+    if isinstance(source, bytes):
+        return PyPDF2.PdfReader(io.BytesIO(source))
+    key = (source, os.stat(source).st_mtime_ns)
+    if _worker_reader is None or _worker_reader[0] != key:
+        _worker_reader = (key, PyPDF2.PdfReader(source))
+    return _worker_reader[1]
+
+def extract_page_range(
+    source: Union[bytes, str], 
+    start: int = 0, 
+    end: Optional[int] = None
+) -> List[Tuple[int, str]]:
+    """
+    Extract and clean pages [start, end) (0-based) of a PDF given as bytes
+    or as a file path. Module-level so it can run in a process pool worker;
+    pool tasks get the path, so only (path, start, end) is pickled.
+    Returns (page_number, text) tuples with 1-based page numbers.
+    """
+    pdf_reader = _reader_for(source)
+    page_count = len(pdf_reader.pages)
+    end = page_count if end is None else min(end, page_count)
+    pages = []
+    for index in range(start, end):
+        text = pdf_reader.pages[index].extract_text()
+        if text and text.strip():
+            pages.append((index + 1, _clean_page_text(text)))
+    return pages
+
 class DocumentProcessor:
     """
     Process documents for RAG pipeline
@@ -21,33 +67,94 @@ class DocumentProcessor:
     def __init__(
         self, 
         chunk_size: int = 1000, 
-        chunk_overlap: int = 200
+        chunk_overlap: int = 200,
+        pages_per_task: int = 16
     ):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.pages_per_task = max(1, pages_per_task)
     
-    def extract_text_from_pdf(self, content: bytes) -> List[Tuple[int, str]]:
+    def extract_text_from_pdf(
+        self, 
+        content: bytes, 
+        executor: Optional[Executor] = None
+    ) -> List[Tuple[int, str]]:
         """
         Extract text from PDF file
         Returns list of (page_number, text) tuples
+        
+        With a process pool `executor`, page ranges are extracted in parallel
+        and merged back in page order.
+        """
+        return list(self.iter_pages(content, executor))
+    
+    @staticmethod
+    def spool(content: bytes) -> str:
+        """Write an upload to a temp file for submit_page_ranges; the caller removes it"""
+        fd, path = tempfile.mkstemp(suffix=".pdf", prefix="ingest-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        return path
+    
+    def submit_page_ranges(self, path: str, executor: Executor) -> List[Future]:
+        """
+        Split the PDF at `path` into `pages_per_task` ranges and submit each
+        to `executor`. Tasks carry only the path and the range; each worker
+        reads the file once. The returned futures are in page order, and
+        the file must outlive them.
         """
-        pages = []
+        try:
+            page_count = len(PyPDF2.PdfReader(path).pages)
+        except Exception as e:
+            raise ValueError(f"Failed to extract PDF: {str(e)}")
         
+        return [
+            executor.submit(extract_page_range, path, start, start + self.pages_per_task)
+            for start in range(0, page_count, self.pages_per_task)
+        ]
+    
+    def iter_pages(
+        self, 
+        content: bytes, 
+        executor: Optional[Executor] = None
+    ) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (page_number, text) in page order as soon as each range is done.
+        Serial when no executor is given.
+        """
         try:
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
-            
-            for page_num, page in enumerate(pdf_reader.pages, 1):
-                text = page.extract_text()
-                if text and text.strip():
-                    # Clean the text
-                    text = self._clean_text(text)
-                    pages.append((page_num, text))
+            if executor is None:
+                yield from extract_page_range(content)
+                return
             
-            return pages
-        
+            path = self.spool(content)
+            try:
+                for future in self.submit_page_ranges(path, executor):
+                    yield from future.result()
+            finally:
+                os.remove(path)
+        except ValueError:
+            raise
         except Exception as e:
             raise ValueError(f"Failed to extract PDF: {str(e)}")
     
+    def chunk_pages(
+        self, 
+        pages: List[Tuple[int, str]], 
+        filename: str
+    ) -> List[Dict]:
+        """Chunk already-extracted pages, tagging each chunk with source/page"""
+        chunks = []
+        for page_num, page_text in pages:
+            chunks.extend(self.chunk_text(
+                page_text,
+                metadata={
+                    "source": filename,
+                    "page": page_num
+                }
+            ))
+        return chunks
+    
     def chunk_text(
         self, 
         text: str, 
@@ -75,15 +182,18 @@ class DocumentProcessor:
                 if sentence_end > start:
                     end = sentence_end
             
-            # Extract chunk
-            chunk_text = text[start:end].strip()
+            # Extract chunk (offsets describe the stripped text exactly,
+            # so the context packer can splice overlapping chunks)
+            raw = text[start:end]
+            chunk_text = raw.strip()
             
             if chunk_text:
+                lead = len(raw) - len(raw.lstrip())
                 chunk_data = {
                     "text": chunk_text,
                     "chunk_index": chunk_index,
-                    "char_start": start,
-                    "char_end": end
+                    "char_start": start + lead,
+                    "char_end": start + lead + len(chunk_text)
                 }
                 
                 # Add metadata if provided
@@ -103,37 +213,23 @@ class DocumentProcessor:
     def process_pdf(
         self, 
         content: bytes, 
-        filename: str
+        filename: str,
+        executor: Optional[Executor] = None
     ) -> List[Dict]:
         """
         Full PDF processing pipeline
         Extract text → Chunk → Return with metadata
+        
+        Pages are chunked as they stream out of extraction.
         """
         all_chunks = []
-        
-        # Extract text from all pages
-        pages = self.extract_text_from_pdf(content)
-        
-        for page_num, page_text in pages:
-            # Chunk the page text
-            chunks = self.chunk_text(
-                page_text,
-                metadata={
-                    "source": filename,
-                    "page": page_num
-                }
-            )
-            all_chunks.extend(chunks)
-        
+        for page in self.iter_pages(content, executor):
+            all_chunks.extend(self.chunk_pages([page], filename))
         return all_chunks
     
     def _clean_text(self, text: str) -> str:
         """Clean extracted text"""
-        # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
-        # Remove special characters
-        text = re.sub(r'[^\w\s.,;:!?\'"-]', '', text)
-        return text.strip()
+        return _clean_page_text(text)
     
     def _find_sentence_boundary(
         self, 
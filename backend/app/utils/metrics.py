@@ -0,0 +1,294 @@
+"""
+Metrics - per-stage latency histograms and event counters
+
+A chat request used to be one opaque number. Every pipeline stage now
+records its duration into `rag_stage_seconds{stage=...}` and the Gemini
+layer counts fallbacks, rate limits and scheduler sleeps. Everything is
+rendered at /metrics in the Prometheus text format (0.0.4) and
+summarised in /api/admin/dashboard.
+
+Deliberately tiny instead of pulling in prometheus_client: a histogram
+observation is one bisect plus a few adds under a lock (a few µs), and
+every metric caps its label combinations (MAX_SERIES) so a bad label
+value can't blow up memory or the scrape. Metrics are per process; with
+several uvicorn workers each scrape sees the worker that answered it.
+"""
+
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.utils.request_trace import current_trace
+
+# Seconds; spans a cache hit (~0.1ms) to a queued Gemini call (~20s)
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0
+)
+
+OVERFLOW_LABEL = "other"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric(ABC):
+    """Named metric with a bounded set of label combinations"""
+
+    kind = ""
+    MAX_SERIES = 64
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        if key not in self._series and len(self._series) >= self.MAX_SERIES:
+            key = tuple(OVERFLOW_LABEL for _ in self.labels)
+        return key
+
+    def _label_text(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, key)]
+        if extra is not None:
+            pairs.append(f'{extra[0]}="{extra[1]}"')
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+            lines.extend(self._render_series(series))
+        return lines
+
+    @abstractmethod
+    def _render_series(self, series) -> List[str]:
+        ...
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        with self._lock:
+            key = self._key(labels)
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+    def total(self) -> float:
+        with self._lock:
+            return sum(self._series.values())
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._series)
+
+    def _render_series(self, series) -> List[str]:
+        return [f"{self.name}{self._label_text(key)} {_format_value(value)}" for key, value in series]
+
+class _HistogramSeries:
+    __slots__ = ("buckets", "sum", "count", "max")
+
+    def __init__(self, size: int):
+        self.buckets = [0] * size
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+class _Timer:
+    """Context manager that observes its wall time into a histogram"""
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: "Histogram", labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, help_text, labels)
+        self.bounds = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str) -> None:
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            key = self._key(labels)
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(len(self.bounds) + 1)
+            series.buckets[index] += 1
+            series.sum += value
+            series.count += 1
+            if value > series.max:
+                series.max = value
+
+    def time(self, **labels: str) -> _Timer:
+        """`with histogram.time(stage="embed"): ...` observes the block's duration"""
+        return _Timer(self, labels)
+
+    def _render_series(self, series) -> List[str]:
+        lines = []
+        for key, data in series:
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), data.buckets):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{self._label_text(key, ('le', _format_value(bound)))} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_format_value(data.sum)}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {data.count}")
+        return lines
+
+    def summary(self, quantiles: Sequence[float] = (0.5, 0.95)) -> Dict[str, Dict]:
+        """Per label value: count, mean and bucket-interpolated quantiles in ms"""
+        with self._lock:
+            snapshot = {
+                key: (list(data.buckets), data.sum, data.count, data.max)
+                for key, data in self._series.items()
+            }
+        result = {}
+        for key, (buckets, total, count, peak) in sorted(snapshot.items()):
+            if not count:
+                continue
+            entry = {"count": count, "avg_ms": round(total / count * 1000, 2)}
+            for q in quantiles:
+                # Interpolation can overshoot inside a wide bucket; never report above the max
+                value = min(self._quantile(buckets, count, q), peak)
+                entry[f"p{int(q * 100)}_ms"] = round(value * 1000, 2)
+            entry["max_ms"] = round(peak * 1000, 2)
+            result["/".join(key) or "all"] = entry
+        return result
+
+    def _quantile(self, buckets: List[int], count: int, q: float) -> float:
+        rank = q * count
+        cumulative = 0
+        lower = 0.0
+        for bound, bucket_count in zip(self.bounds + (self.bounds[-1],), buckets):
+            if bucket_count and cumulative + bucket_count >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+            lower = bound
+        return self.bounds[-1]
+
+class MetricsRegistry:
+    """Holds every metric in declaration order and renders the scrape"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+METRICS = MetricsRegistry()
+
+# Pipeline stages: embed, search, vector_query, lexical_search, rerank,
+# context_pack, history, prompt_build, llm_queue, llm_call, llm, memory_write
+STAGE_SECONDS = METRICS.histogram(
+    "rag_stage_seconds", "Time spent in each RAG pipeline stage", ["stage"]
+)
+REQUEST_SECONDS = METRICS.histogram(
+    "rag_request_seconds", "End-to-end request time by endpoint", ["endpoint"]
+)
+GEMINI_CALLS = METRICS.counter(
+    "gemini_calls_total", "Gemini API calls by model and outcome (ok, rate_limited, error)",
+    ["model", "outcome"]
+)
+GEMINI_FALLBACKS = METRICS.counter(
+    "gemini_fallbacks_total", "Requests moved to the next model after a failure",
+    ["from_model", "reason"]
+)
+GEMINI_RATE_LIMITS = METRICS.counter(
+    "gemini_rate_limits_total", "429 / quota errors returned by Gemini", ["model"]
+)
+GEMINI_EXHAUSTED = METRICS.counter(
+    "gemini_exhausted_total", "Requests answered with the canned reply after every model failed"
+)
+GEMINI_REJECTIONS = METRICS.counter(
+    "gemini_rejections_total", "Requests rejected up front (HTTP 429) by the rate scheduler"
+)
+GEMINI_SLEEPS = METRICS.counter(
+    "gemini_scheduler_sleeps_total", "Times a request slept waiting for Gemini quota"
+)
+GEMINI_SLEEP_SECONDS = METRICS.counter(
+    "gemini_scheduler_sleep_seconds_total", "Total seconds slept waiting for Gemini quota"
+)
+
+class _StageTimer:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self) -> "_StageTimer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        observe_stage(self.stage, time.perf_counter() - self.started)
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """Record a stage duration in rag_stage_seconds and the current request trace"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = current_trace()
+    if trace is not None:
+        trace.add_stage(stage, seconds)
+
+def stage_timer(stage: str) -> _StageTimer:
+    """`with stage_timer("embed"): ...` records into rag_stage_seconds"""
+    return _StageTimer(stage)
+
+def dashboard_summary() -> Dict:
+    """Compact view of the metrics for /api/admin/dashboard"""
+    return {
+        "stages": STAGE_SECONDS.summary(),
+        "requests": REQUEST_SECONDS.summary(),
+        "gemini": {
+            "calls": {"/".join(key): int(v) for key, v in sorted(GEMINI_CALLS.values().items())},
+            "fallbacks": int(GEMINI_FALLBACKS.total()),
+            "rate_limits": int(GEMINI_RATE_LIMITS.total()),
+            "exhausted": int(GEMINI_EXHAUSTED.total()),
+            "rejected": int(GEMINI_REJECTIONS.total()),
+            "scheduler_sleeps": int(GEMINI_SLEEPS.total()),
+            "scheduler_sleep_seconds": round(GEMINI_SLEEP_SECONDS.total(), 2),
+        },
+    }
@@ -0,0 +1,88 @@
+"""
+Ranking Helpers - result diversification for retrieval
+
+Catalog queries often retrieve several near-identical chunks from one
+product page. Maximal marginal relevance (MMR) picks results that are
+relevant to the query but not redundant with what is already picked:
+
+    score(d) = lambda * sim(q, d) - (1 - lambda) * max_{s in picked} sim(d, s)
+
+lambda = 1 is plain relevance order; lower values favour diversity.
+
+Hybrid (BM25 + vector) retrieval merges the two ranked lists with
+reciprocal rank fusion, which needs no score calibration between them:
+
+    rrf(d) = sum_{lists} 1 / (k + rank(d))
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+def mmr_select(
+    query_embedding,
+    candidate_embeddings,
+    k: int,
+    mmr_lambda: float = 0.7,
+    relevance: Optional[List[float]] = None
+) -> List[int]:
+    """
+    Indices of `k` candidates chosen by MMR, in selection order.
+
+    All similarities come from one (n x n) matrix product, so a 30-candidate
+    over-fetch costs microseconds on top of the Chroma query. `relevance`
+    replaces sim(q, d) with externally computed scores in [0, 1] (e.g.
+    cross-encoder probabilities).
+    """
+    candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+    n = len(candidates)
+    if n == 0 or k <= 0:
+        return []
+    if k >= n and mmr_lambda >= 1.0 and relevance is None:
+        return list(range(n))
+
+    candidates = _normalize(candidates)
+    query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+    if relevance is None:
+        relevance = candidates @ query
+    else:
+        relevance = np.asarray(relevance, dtype=np.float32)
+    similarity = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    for _ in range(min(k, n) - 1):
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+
+    return selected
+
+# Per-hit lists of a single-query result dict ("lexical_scores" only with hybrid search)
+RESULT_KEYS = ("ids", "documents", "metadatas", "distances", "lexical_scores")
+
+def take_results(results: Dict, indices: List[int]) -> Dict:
+    """Subset/reorder a single-query Chroma result dict (embeddings are dropped)"""
+    return {
+        key: [[results[key][0][i] for i in indices]]
+        for key in RESULT_KEYS
+        if results.get(key) is not None
+    }
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """(id, fused score) over several best-first ID lists, best first"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,88 @@
+"""
+Request Trace - per-request stage timings for Server-Timing and the slow log
+
+The /metrics histograms say that p95 chat latency went up; they can't say
+why one shopper's answer took 9 seconds. A RequestTrace is opened for
+each chat request and stored in a ContextVar, so every stage_timer() and
+Gemini attempt made on behalf of that request adds to it without being
+passed around. The chat endpoint turns it into a `Server-Timing` header
+and hands it to the slow-request log.
+
+ContextVars follow asyncio tasks (including the SingleFlight generation
+task, which is created in the leader's context) but not plain
+run_in_executor threads, so only stages timed on the event loop are
+attributed; vector_query/lexical_search inside the compute pool are
+covered by the enclosing "search" stage.
+"""
+
+import time
+from contextvars import ContextVar
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# Server-Timing entry -> pipeline stages it sums (see app.utils.metrics)
+SERVER_TIMING_STAGES = {
+    "retrieve": ("embed", "search"),
+    "rerank": ("rerank",),
+    "history": ("history",),
+    "llm": ("llm",),
+}
+
+class RequestTrace:
+    """Stage durations and the Gemini fallback path of one request"""
+
+    __slots__ = ("endpoint", "started", "stages", "path", "model")
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}   # stage -> seconds (summed if repeated)
+        self.path: List[str] = []            # "model:outcome" per Gemini attempt, plus notes
+        self.model: Optional[str] = None     # model (or cache) that produced the answer
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def attempt(self, model: str, outcome: str) -> None:
+        self.path.append(f"{model}:{outcome}")
+        if outcome == "ok":
+            self.model = model
+
+    def note(self, event: str) -> None:
+        """Record a non-Gemini detour (rerank fallback, exhausted models, ...)"""
+        self.path.append(event)
+
+    @property
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def stage_ms(self) -> Dict[str, float]:
+        return {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()}
+
+    def server_timing(self) -> str:
+        """`Server-Timing` header value: retrieve/rerank/history/llm, model, total"""
+        entries = []
+        for name, stages in SERVER_TIMING_STAGES.items():
+            if any(stage in self.stages for stage in stages):
+                seconds = sum(self.stages.get(stage, 0.0) for stage in stages)
+                entries.append(f"{name};dur={seconds * 1000:.1f}")
+        if self.model:
+            entries.append(f'model;desc="{self.model}"')
+        entries.append(f"total;dur={self.elapsed_ms:.1f}")
+        return ", ".join(entries)
+
+_current: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+def current_trace() -> Optional[RequestTrace]:
+    """The trace of the request being served, or None outside a traced request"""
+    return _current.get()
+
+@contextmanager
+def traced(endpoint: str) -> Iterator[RequestTrace]:
+    """`with traced("chat") as trace: ...` makes `trace` current for the block"""
+    trace = RequestTrace(endpoint)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
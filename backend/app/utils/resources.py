@@ -0,0 +1,31 @@
+"""
+Process Resource Helpers
+Lightweight RSS readings used for the service memory report
+"""
+
+import os
+import sys
+
+def get_rss_bytes() -> int:
+    """
+    Current resident set size of this process in bytes.
+    Reads /proc on Linux (Render), falls back to peak RSS elsewhere.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS reports bytes, Linux reports kilobytes
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return 0
+
+def to_mb(num_bytes: int) -> float:
+    """Convert bytes to megabytes rounded for display"""
+    return round(num_bytes / (1024 * 1024), 2)
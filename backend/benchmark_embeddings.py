@@ -0,0 +1,146 @@
+"""
+Benchmark: embedding backends - encode throughput, RSS and fp32 parity
+
+Usage:
+    python benchmark_embeddings.py                                  # both backends
+    python benchmark_embeddings.py --backends onnx-int8 --texts 2000
+    python benchmark_embeddings.py catalog.pdf                      # chunks of your own file
+
+Each backend is loaded in a fresh spawned process so the RSS numbers
+aren't polluted by the other model. Parity compares every backend's
+vectors against sentence-transformers (fp32) on the same texts: mean and
+worst-case cosine, plus how often the top-5 neighbours of a sample of
+queries agree.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from app.utils.resources import get_rss_bytes, to_mb
+
+QUERIES = [
+    "What is your return policy?",
+    "Do you ship internationally?",
+    "How long does delivery take?",
+    "wireless headphones with noise cancelling",
+    "Can I pay with PayPal?",
+    "Is there a warranty on electronics?",
+    "track my order",
+    "cheapest laptop bag",
+]
+
+def synthetic_texts(count: int):
+    return [
+        f"SKU-{i:05d} Wireless Product {i % 97}: ${10 + i % 50}.99, ships in {i % 5 + 1} days. "
+        f"Free returns within 30 days. Compatible with {['iOS', 'Android', 'Windows'][i % 3]}."
+        for i in range(count)
+    ]
+
+def pdf_texts(path: str):
+    from app.utils.document_processor import DocumentProcessor
+    with open(path, "rb") as f:
+        chunks = DocumentProcessor(chunk_size=1000, chunk_overlap=200).process_pdf(
+            f.read(), os.path.basename(path)
+        )
+    return [c["text"] for c in chunks]
+
+def measure(backend_name: str, texts, batch_size: int, threads: int, out_path: str) -> dict:
+    """Runs in a child process: load, time, and dump vectors for the parity check"""
+    from app.services.embedding_backends import create_embedding_backend
+
+    rss_before = get_rss_bytes()
+    started = time.perf_counter()
+    backend = create_embedding_backend(backend_name, onnx_threads=threads)
+    load_seconds = time.perf_counter() - started
+    rss_loaded = get_rss_bytes()
+
+    backend.encode(texts[:batch_size], batch_size=batch_size)  # warm up kernels
+
+    started = time.perf_counter()
+    vectors = backend.encode(texts, batch_size=batch_size)
+    doc_seconds = time.perf_counter() - started
+
+    # Single-query latency is what the chat path pays
+    started = time.perf_counter()
+    query_vectors = np.vstack([backend.encode([q], batch_size=1) for q in QUERIES])
+    query_ms = (time.perf_counter() - started) * 1000 / len(QUERIES)
+
+    np.savez(out_path, docs=vectors, queries=query_vectors)
+    return {
+        "backend": backend_name,
+        "load_s": load_seconds,
+        "weights_mb": to_mb(backend.parameter_bytes()),
+        "rss_model_mb": to_mb(rss_loaded - rss_before),
+        "rss_peak_mb": to_mb(get_rss_bytes()),
+        "texts_per_s": len(texts) / doc_seconds if doc_seconds else float("inf"),
+        "query_ms": query_ms,
+        "vectors": out_path,
+    }
+
+def parity(reference: dict, candidate: dict, top_k: int = 5) -> dict:
+    ref, cand = np.load(reference["vectors"]), np.load(candidate["vectors"])
+    # Both are L2-normalized, so the row-wise dot product is the cosine
+    cosines = np.sum(ref["docs"] * cand["docs"], axis=1)
+
+    ref_top = np.argsort(-ref["queries"] @ ref["docs"].T, axis=1)[:, :top_k]
+    cand_top = np.argsort(-cand["queries"] @ cand["docs"].T, axis=1)[:, :top_k]
+    overlap = np.mean([len(set(a) & set(b)) / top_k for a, b in zip(ref_top, cand_top)])
+    return {
+        "mean_cosine": float(cosines.mean()),
+        "min_cosine": float(cosines.min()),
+        f"top{top_k}_overlap": float(overlap),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", nargs="?", help="PDF to chunk and embed (default: synthetic catalog text)")
+    parser.add_argument("--backends", nargs="+", default=["sentence-transformers", "onnx-int8"])
+    parser.add_argument("--texts", type=int, default=500, help="synthetic texts to embed")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=0, help="ONNX intra-op threads (0 = auto)")
+    args = parser.parse_args()
+
+    texts = pdf_texts(args.pdf) if args.pdf else synthetic_texts(args.texts)
+    print(f"📄 {len(texts)} texts, batch size {args.batch_size}, {os.cpu_count()} CPUs")
+
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1, maxtasksperchild=1) as pool:
+        for name in args.backends:
+            out_path = os.path.join(os.getcwd(), f".bench_{name}.npz")
+            try:
+                results.append(pool.apply(measure, (name, texts, args.batch_size, args.threads, out_path)))
+            except Exception as e:
+                print(f"❌ {name}: {e}")
+
+    if not results:
+        return 1
+
+    print(f"\n{'backend':<22} {'load s':>7} {'weights MB':>11} {'RSS model MB':>13} "
+          f"{'RSS peak MB':>12} {'texts/sec':>10} {'query ms':>9}")
+    for r in results:
+        print(f"{r['backend']:<22} {r['load_s']:>7.1f} {r['weights_mb']:>11.1f} {r['rss_model_mb']:>13.1f} "
+              f"{r['rss_peak_mb']:>12.1f} {r['texts_per_s']:>10.1f} {r['query_ms']:>9.1f}")
+
+    reference = next((r for r in results if r["backend"] == "sentence-transformers"), None)
+    if reference is None:
+        print("\n⚠️ Parity check skipped: sentence-transformers (fp32 reference) not benchmarked")
+    else:
+        print(f"\nParity vs. fp32 sentence-transformers:")
+        for r in results:
+            if r is reference:
+                continue
+            scores = parity(reference, r)
+            print(f"  {r['backend']}: " + ", ".join(f"{k}={v:.4f}" for k, v in scores.items()))
+
+    for r in results:
+        os.remove(r["vectors"])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
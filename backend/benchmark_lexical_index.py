@@ -0,0 +1,126 @@
+"""
+Benchmark: BM25 lexical index query latency (p50/p99) vs. concurrent searchers
+
+Usage:
+    python benchmark_lexical_index.py                         # 100k synthetic chunks
+    python benchmark_lexical_index.py --chunks 20000 --threads 1 4 8
+    python benchmark_lexical_index.py --writer                # with adds running alongside
+
+The index is built once into a temp directory (segment + a delta of
+--delta chunks), then every thread count runs the same query mix.
+"""
+
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from app.services.lexical_index import BM25Index
+
+WORDS = (
+    "wireless bluetooth headphones charger cable usb-c laptop stand case "
+    "speaker keyboard mouse monitor ssd backup camera tripod battery pack "
+    "warranty returns shipping delivery refund exchange gift card discount "
+    "waterproof noise cancelling ergonomic portable fast compact premium"
+).split()
+# Long tail of product words, each in a few hundred chunks at 100k
+BRANDS = [f"brand{n}" for n in range(20000)]
+
+def synthetic_chunk(rng: random.Random, i: int) -> str:
+    sku = f"x{i % 5000}-pro"
+    words = " ".join(rng.choices(WORDS, k=rng.randint(30, 80)) + rng.choices(BRANDS, k=rng.randint(30, 80)))
+    return f"SKU {sku} {words} now ${rng.randint(5, 500)}.99 ships in {rng.randint(1, 9)} days"
+
+def build_index(directory: str, chunks: int, delta: int, seed: int = 7) -> BM25Index:
+    rng = random.Random(seed)
+    base = chunks - delta
+    index = BM25Index(directory)
+    index.rebuild(
+        [(f"chunk-{i}", synthetic_chunk(rng, i)) for i in range(start, min(start + 5000, base))]
+        for start in range(0, base, 5000)
+    )
+    index.add((f"chunk-{i}", synthetic_chunk(rng, i)) for i in range(base, chunks))
+    return index
+
+def queries(count: int, seed: int = 11) -> list:
+    rng = random.Random(seed)
+    mix = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.3:
+            mix.append(f"x{rng.randrange(5000)}-pro price")
+        elif kind < 0.6:
+            mix.append(" ".join(rng.sample(BRANDS, 2) + [rng.choice(WORDS)]))
+        else:
+            mix.append(f"{rng.choice(BRANDS)} {rng.choice(WORDS)} ${rng.randint(5, 500)}.99")
+    return mix
+
+def run(index: BM25Index, threads: int, per_thread: int, writer: bool) -> list:
+    latencies = []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def searcher(seed: int):
+        mine = []
+        for query in queries(per_thread, seed):
+            started = time.perf_counter()
+            index.search(query, k=20)
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    def adder():
+        rng = random.Random(3)
+        i = 0
+        while not stop.is_set():
+            index.add([(f"live-{i}", synthetic_chunk(rng, i))])
+            i += 1
+
+    background = threading.Thread(target=adder) if writer else None
+    if background:
+        background.start()
+    workers = [threading.Thread(target=searcher, args=(seed,)) for seed in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    stop.set()
+    if background:
+        background.join()
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--delta", type=int, default=1000, help="chunks left in the in-memory delta")
+    parser.add_argument("--queries", type=int, default=500, help="queries per thread")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--writer", action="store_true", help="add chunks while querying")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bm25-bench-")
+    try:
+        started = time.perf_counter()
+        index = build_index(directory, args.chunks, min(args.delta, args.chunks))
+        stats = index.get_stats()
+        print(f"📚 {stats['documents']} chunks, {stats['terms']} terms, {stats['postings']} postings "
+              f"(built in {time.perf_counter() - started:.1f}s)")
+        print(f"{'threads':>8} {'queries':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'qps':>8}")
+
+        for threads in args.threads:
+            started = time.perf_counter()
+            latencies = np.array(run(index, threads, args.queries, args.writer)) * 1000
+            wall = time.perf_counter() - started
+            print(f"{threads:>8} {len(latencies):>8} {np.percentile(latencies, 50):>8.2f} "
+                  f"{np.percentile(latencies, 99):>8.2f} {latencies.max():>8.2f} "
+                  f"{len(latencies) / wall:>8.0f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Benchmark: PDF page extraction throughput vs. process-pool workers
+
+Usage:
+    python benchmark_pdf_extraction.py                 # synthetic 400-page catalog
+    python benchmark_pdf_extraction.py catalog.pdf     # your own file
+    python benchmark_pdf_extraction.py --pages 1000 --workers 1 2 4 8
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.utils.document_processor import DocumentProcessor
+
+def build_synthetic_pdf(num_pages: int, lines_per_page: int = 40) -> bytes:
+    """Write a plain-text catalog PDF without extra dependencies"""
+    objects = []
+
+    def add(obj: bytes) -> int:
+        objects.append(obj)
+        return len(objects)
+
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = add(b"")  # filled in once the page ids are known
+    page_ids = []
+
+    for page in range(1, num_pages + 1):
+        lines = [
+            f"SKU-{page:04d}-{line:02d} Wireless Product {line} - ${10 + line}.99. "
+            f"Ships in {line % 5 + 1} days. 30-day returns."
+            for line in range(lines_per_page)
+        ]
+        ops = ["BT", "/F1 10 Tf", "14 TL", "50 780 Td"]
+        ops += [f"({text}) '" for text in lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        content_id = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+            % (pages_id, font_id, content_id)
+        ))
+
+    kids = b" ".join(b"%d 0 R" % pid for pid in page_ids)
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog_id, xref_at
+    )
+    return bytes(out)
+
+def run(content: bytes, workers: int, pages_per_task: int) -> tuple:
+    processor = DocumentProcessor(pages_per_task=pages_per_task)
+    if workers <= 1:
+        started = time.perf_counter()
+        pages = processor.extract_text_from_pdf(content)
+        return len(pages), time.perf_counter() - started
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # Warm the pool so process start-up isn't counted
+        list(pool.map(abs, range(workers)))
+        started = time.perf_counter()
+        pages = processor.extract_text_from_pdf(content, executor=pool)
+        return len(pages), time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", nargs="?", help="PDF to benchmark (default: synthetic catalog)")
+    parser.add_argument("--pages", type=int, default=400, help="pages in the synthetic catalog")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--pages-per-task", type=int, default=16)
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            content = f.read()
+        label = os.path.basename(args.pdf)
+    else:
+        content = build_synthetic_pdf(args.pages)
+        label = f"synthetic ({args.pages} pages)"
+
+    print(f"📄 {label}, {len(content) / 1024 / 1024:.1f} MB, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'pages':>7} {'seconds':>9} {'pages/sec':>10} {'speedup':>8}")
+
+    baseline = None
+    for workers in args.workers:
+        pages, seconds = run(content, workers, args.pages_per_task)
+        rate = pages / seconds if seconds else float("inf")
+        baseline = baseline or rate
+        print(f"{workers:>8} {pages:>7} {seconds:>9.2f} {rate:>10.1f} {rate / baseline:>7.2f}x")
+
+if __name__ == "__main__":
+    sys.exit(main())
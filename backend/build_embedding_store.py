@@ -0,0 +1,99 @@
+"""
+Build the persistent embedding store as a deploy artifact
+
+Usage:
+    python build_embedding_store.py                      # export vectors already in CHROMA_DB_PATH
+    python build_embedding_store.py catalog.pdf faq.pdf  # embed PDFs with EMBEDDING_BACKEND
+
+Ship the resulting EMBEDDING_STORE_PATH directory with the build: when
+the Chroma store on Render's ephemeral disk is rebuilt, add_documents
+reads these vectors instead of running the model.
+"""
+
+import os
+import sys
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.embedding_store import EmbeddingStore
+from app.services.embedding_backends import store_key_for
+
+def open_store(dimensions: int) -> EmbeddingStore:
+    return EmbeddingStore(
+        settings.EMBEDDING_STORE_PATH, store_key_for(settings.EMBEDDING_BACKEND), dimensions,
+        settings.EMBEDDING_STORE_DTYPE
+    )
+
+def export_from_chroma(page_size: int = 1000) -> Tuple[Optional[EmbeddingStore], int]:
+    """Copy (document, embedding) pairs out of the existing collection
+    (assumed to have been built with the configured EMBEDDING_BACKEND)"""
+    import chromadb
+    from chromadb.config import Settings
+
+    client = chromadb.PersistentClient(
+        path=os.getenv("CHROMA_DB_PATH", "./chroma_db"),
+        settings=Settings(anonymized_telemetry=False)
+    )
+    collection = client.get_or_create_collection("ecommerce_docs")
+
+    store = None
+    exported = 0
+    for offset in range(0, collection.count(), page_size):
+        page = collection.get(limit=page_size, offset=offset, include=["documents", "embeddings"])
+        embeddings = np.asarray(page["embeddings"])
+        if store is None:
+            store = open_store(embeddings.shape[1])
+        store.add(page["documents"], embeddings)
+        exported += len(page["documents"])
+    return store, exported
+
+def embed_pdfs(paths) -> Tuple[EmbeddingStore, int]:
+    """Chunk PDFs exactly like the upload path and embed anything not stored yet"""
+    from app.services.embedding_backends import create_embedding_backend
+    from app.utils.document_processor import DocumentProcessor
+
+    embedder = create_embedding_backend(
+        settings.EMBEDDING_BACKEND, onnx_threads=settings.EMBEDDING_ONNX_THREADS
+    )
+    processor = DocumentProcessor(chunk_size=1000, chunk_overlap=200)
+    store = open_store(embedder.dimensions)
+
+    embedded = 0
+    for path in paths:
+        with open(path, "rb") as f:
+            chunks = processor.process_pdf(f.read(), os.path.basename(path))
+        texts = [c["text"] for c in chunks]
+        _, missing = store.lookup(texts)
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            store.add(missing_texts, embedder.encode(missing_texts, batch_size=64))
+        embedded += len(missing)
+        print(f"📄 {path}: {len(texts)} chunks, {len(missing)} newly embedded")
+    return store, embedded
+
+def main():
+    if not settings.EMBEDDING_STORE_PATH:
+        print("❌ EMBEDDING_STORE_PATH is empty; nothing to build")
+        return 1
+
+    started = time.perf_counter()
+    if len(sys.argv) > 1:
+        store, count = embed_pdfs(sys.argv[1:])
+        print(f"✅ Embedded {count} new chunks")
+    else:
+        store, count = export_from_chroma()
+        if store is None:
+            print("❌ The ChromaDB collection is empty; nothing to export")
+            return 1
+        print(f"✅ Exported {count} vectors from ChromaDB")
+
+    stats = store.get_stats()
+    print(f"📦 {store.directory}: {stats['vectors']} vectors, {stats['disk_mb']} MB "
+          f"({time.perf_counter() - started:.1f}s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
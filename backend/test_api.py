@@ -42,9 +42,45 @@ def test_chat():
         assert "answer" in data
         print(f"✅ Got answer: {data['answer'][:100]}...")
         print(f"   Sources: {len(data.get('sources', []))}")
+        print(f"   Server-Timing: {r.headers.get('Server-Timing')}")
     except Exception as e:
         print(f"❌ Chat failed: {e}")
 
+def test_filtered_search():
+    print("\n🔎 Testing Filtered Search...")
+    try:
+        payload = {"query": "wireless headphones", "top_k": 3, "filters": {"category": "electronics"}}
+        r = requests.post(f"{BASE_URL}/api/search", json=payload)
+        assert r.status_code == 200
+        results = r.json()["results"]
+        assert all(item["category"] == "electronics" for item in results)
+        print(f"✅ {len(results)} electronics results")
+    except Exception as e:
+        print(f"❌ Filtered search failed: {e}")
+
+def test_slow_requests():
+    print("\n🐢 Testing Slow Request Log...")
+    try:
+        # Every chat request is a candidate, whatever its outcome
+        payload = {"message": "What is your return policy?", "session_id": "test_slow"}
+        requests.post(f"{BASE_URL}/api/chat", json=payload)
+        
+        r = requests.get(f"{BASE_URL}/api/admin/slow-requests", params={"limit": 5})
+        assert r.status_code == 200
+        data = r.json()
+        assert {"capacity", "window_minutes", "kept", "recorded", "requests"} <= set(data)
+        assert len(data["requests"]) <= 5
+        for entry in data["requests"]:
+            assert {"duration_ms", "status", "query_hash", "fallback_path", "stages_ms"} <= set(entry)
+        if data["requests"]:
+            slowest = data["requests"][0]
+            print(f"✅ Slowest: {slowest['duration_ms']}ms via {slowest['fallback_path']}")
+        else:
+            # With several uvicorn workers the chat may have been served by another one
+            print("✅ Slow request log reachable (no entries on this worker)")
+    except Exception as e:
+        print(f"❌ Slow request log failed: {e}")
+
 if __name__ == "__main__":
     print("=" * 50)
     print("🧪 Running API Integration Tests")
@@ -54,6 +90,8 @@ if __name__ == "__main__":
     test_seed_data()
     test_document_stats()
     test_chat()
+    test_filtered_search()
+    test_slow_requests()
     
     print("\n" + "=" * 50)
     print("Test run complete")
@@ -0,0 +1,85 @@
+"""
+Cross-worker session cache tests - run from backend/: python -m pytest tests
+"""
+
+import threading
+import time
+
+from app.services.memory_service import MemoryService
+from app.services.session_store import SQLiteSessionStore
+
+class GatedStore(SQLiteSessionStore):
+    """SQLite store whose next append parks mid-transaction until released"""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.gated = False
+        self.in_flush = threading.Event()
+        self.release = threading.Event()
+
+    def _log_changes(self, session_ids, now: float) -> None:
+        super()._log_changes(session_ids, now)
+        if self.gated:
+            self.gated = False
+            self.in_flush.set()
+            self.release.wait(5)
+
+def wait_for(predicate, timeout: float = 3.0) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+def test_changed_sessions_waits_for_busy_connection(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    a = SQLiteSessionStore(path)
+    b = SQLiteSessionStore(path)
+    try:
+        assert a.changed_sessions() == set()
+        with a._lock:  # a's flusher holds the connection
+            b.append([("s1", "user", "hi", time.time())], 20)
+            checked = []
+            checker = threading.Thread(target=lambda: checked.append(a.changed_sessions()))
+            checker.start()
+            checker.join(0.2)
+            assert checker.is_alive()  # waits instead of reporting "no changes"
+        checker.join(5)
+        assert checked == [{"s1"}]
+        assert a.changed_sessions() == set()
+    finally:
+        a.close()
+        b.close()
+
+def test_write_during_flush_invalidates_other_worker(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store_a = GatedStore(path)
+    a = MemoryService(store=store_a, write_behind_ms=5, sync_interval_ms=20)
+    b = MemoryService(store=SQLiteSessionStore(path), write_behind_ms=5, sync_interval_ms=20)
+    try:
+        a.add_message("shared", "user", "from a")
+        a.flush()
+        assert [m.content for m in a.get_history("shared")] == ["from a"]
+
+        # a's write-behind thread is now inside a transaction for another session
+        store_a.gated = True
+        a.add_message("other", "user", "unrelated")
+        assert store_a.in_flush.wait(5)
+
+        writer = threading.Thread(target=lambda: (
+            b.add_message("shared", "assistant", "from b"), b.flush()
+        ))
+        writer.start()
+        # Requests on a keep being served from its cache meanwhile
+        assert [m.content for m in a.get_history("shared")] == ["from a"]
+        store_a.release.set()
+        writer.join(10)
+        assert not writer.is_alive()
+
+        assert wait_for(lambda: [m.content for m in a.get_history("shared")] == ["from a", "from b"])
+        assert a.external_invalidations >= 1
+    finally:
+        store_a.release.set()
+        a.shutdown()
+        b.shutdown()
@@ -241,7 +241,7 @@ const ChatInterface = () => {
                     ))}
 
                     {/* Loading */}
-                    {isLoading && (
+                    {isLoading && !messages[messages.length - 1]?.streaming && (
                         <div className="flex justify-start animate-slide-up">
                             <div className="max-w-[70%]">
                                 <div className="flex items-center gap-2 mb-1.5">
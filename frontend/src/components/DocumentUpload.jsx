@@ -13,8 +13,8 @@ const DocumentUpload = ({ onUploadComplete }) => {
             setMessage({ type: 'error', text: 'Only PDF files are supported.' });
             return;
         }
-        if (file.size > 10 * 1024 * 1024) {
-            setMessage({ type: 'error', text: 'File size must be under 10MB.' });
+        if (file.size > 50 * 1024 * 1024) {
+            setMessage({ type: 'error', text: 'File size must be under 50MB.' });
             return;
         }
 
@@ -57,7 +57,7 @@ const DocumentUpload = ({ onUploadComplete }) => {
                 <p className="text-[11px] font-medium text-slate-400 mb-1">
                     {uploading ? 'Uploading...' : 'Click to upload PDF'}
                 </p>
-                <p className="text-[9px] text-slate-600">Max 10MB</p>
+                <p className="text-[9px] text-slate-600">Max 50MB</p>
             </div>
 
             {uploading && (
@@ -13,6 +13,47 @@ export const chatApi = {
         const response = await api.post('/chat', { message, session_id: sessionId });
         return response.data;
     },
+    // Streams the answer over SSE: onSources(sources) fires after retrieval,
+    // onToken(text) for each chunk. Resolves with the full answer.
+    streamMessage: async (message, sessionId = null, { onSources, onToken } = {}) => {
+        const response = await fetch(`${API_URL}/chat/stream`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+            body: JSON.stringify({ message, session_id: sessionId }),
+        });
+        if (!response.ok || !response.body) throw new Error(`Stream failed: ${response.status}`);
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let answer = '';
+        let session = sessionId;
+        let sources = [];
+
+        for (;;) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            const frames = buffer.split('\n\n');
+            buffer = frames.pop();
+            for (const frame of frames) {
+                const event = frame.match(/^event: (.*)$/m)?.[1];
+                const data = JSON.parse(frame.match(/^data: (.*)$/m)?.[1] || '{}');
+                if (event === 'sources') {
+                    sources = data.sources;
+                    session = data.session_id;
+                    onSources?.(sources);
+                } else if (event === 'token') {
+                    answer += data.text;
+                    onToken?.(data.text);
+                } else if (event === 'error') {
+                    throw new Error(data.detail);
+                }
+            }
+        }
+        return { answer, sources, session_id: session };
+    },
     clearSession: async (sessionId) => {
         const response = await api.delete(`/session/${sessionId}`);
         return response.data;
@@ -28,8 +69,16 @@ export const documentsApi = {
             headers: { 'Content-Type': 'multipart/form-data' },
             onUploadProgress: (e) => onProgress?.(Math.round((e.loaded * 100) / e.total)),
         });
-        return response.data;
+        // The server processes the PDF in the background: poll the job until it finishes
+        const { job_id } = response.data;
+        for (;;) {
+            const job = await api.get(`/documents/jobs/${job_id}`).then(r => r.data);
+            if (job.status === 'completed') return job;
+            if (job.status === 'failed') throw new Error(job.error || 'Ingestion failed');
+            await new Promise((resolve) => setTimeout(resolve, 1000));
+        }
     },
+    getJob: async (jobId) => api.get(`/documents/jobs/${jobId}`).then(r => r.data),
     getStats: async () => api.get('/documents/stats').then(r => r.data),
     getSources: async () => api.get('/documents/sources').then(r => r.data),
     deleteDocument: async (name) => api.delete(`/documents/source/${encodeURIComponent(name)}`).then(r => r.data),
@@ -37,12 +37,60 @@ const useChatStore = create(
                 set({ messages: [...messages, userMessage], isLoading: true, error: null });
 
                 const startTime = Date.now();
+                const assistantId = Date.now() + 1;
+                const updateAssistant = (patch) => set((state) => ({
+                    messages: state.messages.map(m => m.id === assistantId ? { ...m, ...patch(m) } : m),
+                }));
+                let sources = null;
+                let streaming = false;
+
+                try {
+                    // Stream tokens into the bubble as Gemini produces them
+                    await chatApi.streamMessage(content, sessionId, {
+                        onSources: (found) => { sources = found || []; },
+                        onToken: (text) => {
+                            if (!streaming) {
+                                streaming = true;
+                                set((state) => ({
+                                    messages: [...state.messages, {
+                                        id: assistantId,
+                                        role: 'assistant',
+                                        content: text,
+                                        sources: sources || [],
+                                        timestamp: new Date().toISOString(),
+                                        streaming: true,
+                                        feedback: null, // null = no feedback, 'up' or 'down'
+                                    }],
+                                }));
+                            } else {
+                                updateAssistant(m => ({ content: m.content + text }));
+                            }
+                        },
+                    });
+                    if (streaming) {
+                        const elapsed = ((Date.now() - startTime) / 1000).toFixed(1);
+                        updateAssistant(() => ({ streaming: false, responseTime: elapsed }));
+                        set({ isLoading: false });
+                        return;
+                    }
+                } catch (error) {
+                    if (streaming) {
+                        // Keep the partial answer; don't ask the model twice
+                        updateAssistant(() => ({ streaming: false }));
+                    }
+                    if (streaming || sources !== null) {
+                        // The server answered with an error (e.g. rate limited): retrying won't help
+                        set({ isLoading: false, error: error?.message || 'The answer was interrupted.' });
+                        return;
+                    }
+                }
 
+                // Stream unavailable or empty (proxy, older backend): use the blocking endpoint
                 try {
                     const response = await chatApi.sendMessage(content, sessionId);
                     const elapsed = ((Date.now() - startTime) / 1000).toFixed(1);
                     const assistantMessage = {
-                        id: Date.now() + 1,
+                        id: assistantId,
                         role: 'assistant',
                         content: response.answer,
                         sources: response.sources || [],
@@ -119,6 +167,7 @@ const useChatStore = create(
             partialize: (state) => ({
                 messages: (state.messages || [])
                     .filter(m => !(m.role === 'assistant' && isTransientError(m.content)))
+                    .map(({ streaming, ...m }) => m)
                     .slice(-50),
                 sessionId: state.sessionId,
                 savedSessions: (state.savedSessions || []).slice(0, 10),